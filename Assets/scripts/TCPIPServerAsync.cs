@@ -69,6 +69,11 @@ public class CarData
     public bool turned;
     public string target_intersection;
     public int wait_time;
+
+    public CarData Clone()
+    {
+        return (CarData)MemberwiseClone();
+    }
 }
 
 [System.Serializable]
@@ -210,6 +215,9 @@ void networkCode()
 			
 
             // An incoming connection needs to be processed.
+            // pending: bytes recibidos aún sin procesar (modo stream con frames de longitud)
+            List<byte> pending = new List<byte>();
+            bool streaming = false;
             while (keepReading)
             {
                 bytes = new byte[4096];
@@ -222,7 +230,64 @@ void networkCode()
                     break;
                 }
 
-                data += System.Text.Encoding.ASCII.GetString(bytes, 0, bytesRec);
+                if (!streaming && data == null)
+                {
+                    // Decidir el protocolo por los primeros bytes del cliente
+                    for (int i = 0; i < bytesRec; i++) pending.Add(bytes[i]);
+                    int match = MatchStreamHeader(pending);
+                    if (match < 0)
+                    {
+                        // Protocolo original: JSON completo terminado en '$'
+                        data = System.Text.Encoding.ASCII.GetString(pending.ToArray());
+                        pending.Clear();
+                    }
+                    else if (match < StreamHeader.Length)
+                    {
+                        continue; // encabezado incompleto, esperar más bytes
+                    }
+                    else
+                    {
+                        streaming = true;
+                        pending.RemoveRange(0, StreamHeader.Length);
+                        Debug.Log("Streaming traffic simulation frames...");
+                        DispatchToMainThread(() => BeginStream());
+                    }
+                }
+                else if (streaming)
+                {
+                    for (int i = 0; i < bytesRec; i++) pending.Add(bytes[i]);
+                }
+                else
+                {
+                    data += System.Text.Encoding.ASCII.GetString(bytes, 0, bytesRec);
+                }
+
+                if (streaming)
+                {
+                    // Consumir todos los frames completos: longitud uint32 big-endian + JSON UTF-8
+                    bool ended = false;
+                    while (pending.Count >= 4)
+                    {
+                        int length = (pending[0] << 24) | (pending[1] << 16) | (pending[2] << 8) | pending[3];
+                        if (length == 0)
+                        {
+                            ended = true;
+                            break;
+                        }
+                        if (pending.Count < 4 + length) break;
+                        string frameJson = System.Text.Encoding.UTF8.GetString(pending.GetRange(4, length).ToArray());
+                        pending.RemoveRange(0, 4 + length);
+                        DispatchToMainThread(() => ProcessTrafficFrame(frameJson));
+                    }
+                    if (ended)
+                    {
+                        Debug.Log("Traffic simulation stream finished");
+                        DispatchToMainThread(() => EndStream());
+                        break;
+                    }
+                    continue;
+                }
+
                 Debug.Log("Received from Client: " + data);
                 
                 if (data.IndexOf("$") > -1)
@@ -241,17 +306,7 @@ void networkCode()
                             Debug.Log("Processing traffic simulation JSON data...");
                             
                             // Process the traffic data on the main thread
-                            var dispatcher = UnityMainThreadDispatcher.Instance();
-                            if (dispatcher != null)
-                            {
-                                dispatcher.Enqueue(() => {
-                                    ProcessTrafficData(jsonData);
-                                });
-                            }
-                            else
-                            {
-                                Debug.LogError("UnityMainThreadDispatcher not found! Cannot process traffic data.");
-                            }
+                            DispatchToMainThread(() => ProcessTrafficData(jsonData));
                         }
                     }
                     break;
@@ -269,6 +324,33 @@ void networkCode()
     }
 }
 
+// Encabezado que envía traffic_client.connect_to_unity antes de los frames por paso
+static readonly byte[] StreamHeader = System.Text.Encoding.ASCII.GetBytes("Three T-intersection stream v1\n");
+
+// Bytes del encabezado que coinciden con el inicio de buf, o -1 si no es un stream
+int MatchStreamHeader(List<byte> buf)
+{
+    int n = Math.Min(buf.Count, StreamHeader.Length);
+    for (int i = 0; i < n; i++)
+    {
+        if (buf[i] != StreamHeader[i]) return -1;
+    }
+    return n;
+}
+
+void DispatchToMainThread(Action action)
+{
+    var dispatcher = UnityMainThreadDispatcher.Instance();
+    if (dispatcher != null)
+    {
+        dispatcher.Enqueue(action);
+    }
+    else
+    {
+        Debug.LogError("UnityMainThreadDispatcher not found! Cannot process traffic data.");
+    }
+}
+
 void stopServer()
 {
     keepReading = false;
@@ -371,43 +453,8 @@ void ProcessTrafficData(string jsonData)
         int totalCars = 0;
         foreach (JObject timestep in timesteps)
         {
-            TimestepData stepData = new TimestepData();
-            stepData.timestep = timestep["timestep"].Value<int>();
-            
-            // Parse traffic lights
-            stepData.traffic_lights = new Dictionary<string, string>();
-            JObject lights = timestep["traffic_lights"] as JObject;
-            foreach (var light in lights)
-            {
-                stepData.traffic_lights[light.Key] = light.Value.ToString();
-            }
-            
-            // Parse cars
-            stepData.cars = new List<CarData>();
-            JArray cars = timestep["cars"] as JArray;
-            foreach (JObject car in cars)
-            {
-                CarData carData = new CarData();
-                carData.id = car["id"].ToString();
-                carData.origin = car["origin"].ToString();
-                carData.original_origin = car["original_origin"].ToString();
-                carData.position = new Vector2(
-                    car["position"]["x"].Value<float>(),
-                    car["position"]["y"].Value<float>()
-                );
-                carData.direction = new Vector2(
-                    car["direction"]["x"].Value<float>(),
-                    car["direction"]["y"].Value<float>()
-                );
-                carData.state = car["state"].ToString();
-                carData.turn = car["turn"].ToString();
-                carData.turned = car["turned"].Value<bool>();
-                carData.target_intersection = car["target_intersection"]?.ToString();
-                carData.wait_time = car["wait_time"].Value<int>();
-                
-                stepData.cars.Add(carData);
-                totalCars++;
-            }
+            TimestepData stepData = ParseTimestep(timestep);
+            totalCars += stepData.cars.Count;
             
             movementData.Add(stepData);
         }
@@ -426,10 +473,207 @@ void ProcessTrafficData(string jsonData)
     }
 }
 
+TimestepData ParseTimestep(JObject timestep)
+{
+    TimestepData stepData = new TimestepData();
+    stepData.timestep = timestep["timestep"].Value<int>();
+    
+    // Parse traffic lights
+    stepData.traffic_lights = new Dictionary<string, string>();
+    JObject lights = timestep["traffic_lights"] as JObject;
+    foreach (var light in lights)
+    {
+        stepData.traffic_lights[light.Key] = light.Value.ToString();
+    }
+    
+    // Parse cars
+    stepData.cars = new List<CarData>();
+    JArray cars = timestep["cars"] as JArray;
+    foreach (JObject car in cars)
+    {
+        stepData.cars.Add(ParseCar(car));
+    }
+    
+    return stepData;
+}
+
+CarData ParseCar(JObject car)
+{
+    CarData carData = new CarData();
+    ApplyCarFields(carData, car);
+    return carData;
+}
+
+// Copiar a carData los campos presentes en car (auto completo o campos cambiados de un delta)
+void ApplyCarFields(CarData carData, JObject car)
+{
+    foreach (var field in car)
+    {
+        JToken value = field.Value;
+        switch (field.Key)
+        {
+            case "id": carData.id = value.ToString(); break;
+            case "origin": carData.origin = value.ToString(); break;
+            case "original_origin": carData.original_origin = value.ToString(); break;
+            case "position":
+                carData.position = new Vector2(value["x"].Value<float>(), value["y"].Value<float>());
+                break;
+            case "direction":
+                carData.direction = new Vector2(value["x"].Value<float>(), value["y"].Value<float>());
+                break;
+            case "state": carData.state = value.ToString(); break;
+            case "turn": carData.turn = value.ToString(); break;
+            case "turned": carData.turned = value.Value<bool>(); break;
+            case "target_intersection": carData.target_intersection = value.ToString(); break;
+            case "wait_time": carData.wait_time = value.Value<int>(); break;
+        }
+    }
+}
+
+// Aplicar un delta (ver traffic_recorder.DeltaEncoder) sobre el último paso recibido.
+// Los índices k se refieren a la lista de autos del paso anterior.
+TimestepData ApplyDelta(JObject msg, TimestepData previous)
+{
+    TimestepData stepData = new TimestepData();
+    stepData.timestep = msg["timestep"].Value<int>();
+    stepData.traffic_lights = new Dictionary<string, string>(previous.traffic_lights);
+    JObject lights = msg["lights"] as JObject;
+    if (lights != null)
+    {
+        foreach (var light in lights)
+        {
+            stepData.traffic_lights[light.Key] = light.Value.ToString();
+        }
+    }
+    
+    // Los pasos ya guardados no se modifican: los autos que cambian se copian
+    List<CarData> cars = new List<CarData>(previous.cars);
+    JArray moved = msg["move"] as JArray;
+    if (moved != null)
+    {
+        foreach (JArray m in moved)
+        {
+            int k = m[0].Value<int>();
+            CarData car = cars[k].Clone();
+            car.position = new Vector2(m[1].Value<float>(), m[2].Value<float>());
+            cars[k] = car;
+        }
+    }
+    JArray updated = msg["update"] as JArray;
+    if (updated != null)
+    {
+        foreach (JArray u in updated)
+        {
+            int k = u[0].Value<int>();
+            CarData car = cars[k].Clone();
+            ApplyCarFields(car, u[1] as JObject);
+            cars[k] = car;
+        }
+    }
+    JArray removed = msg["remove"] as JArray;
+    if (removed != null)
+    {
+        HashSet<int> gone = new HashSet<int>();
+        foreach (JToken k in removed) gone.Add(k.Value<int>());
+        List<CarData> kept = new List<CarData>(cars.Count - gone.Count);
+        for (int k = 0; k < cars.Count; k++)
+        {
+            if (!gone.Contains(k)) kept.Add(cars[k]);
+        }
+        cars = kept;
+    }
+    JArray added = msg["add"] as JArray;
+    if (added != null)
+    {
+        foreach (JObject car in added) cars.Add(ParseCar(car));
+    }
+    stepData.cars = cars;
+    return stepData;
+}
+
+// Modo stream: los pasos llegan uno a uno mientras la simulación corre
+private bool streamLive = false;
+private TimestepData lastStreamStep = null;
+// Pasos guardados como máximo en modo stream: el hub puede encadenar episodios por la misma
+// conexión sin fin, así que los pasos ya reproducidos se descartan
+private const int maxStreamFrames = 1024;
+
+void BeginStream()
+{
+    movementData.Clear();
+    currentTimestep = 0;
+    streamLive = true;
+    lastStreamStep = null;
+    isPlaying = false;
+}
+
+void ProcessTrafficFrame(string frameJson)
+{
+    try
+    {
+        // Keyframe (paso completo) o delta respecto al paso anterior
+        JObject msg = JObject.Parse(frameJson);
+        TimestepData stepData;
+        if (msg["delta"] != null)
+        {
+            if (lastStreamStep == null) return; // delta sin keyframe previo
+            stepData = ApplyDelta(msg, lastStreamStep);
+        }
+        else
+        {
+            stepData = ParseTimestep(msg);
+            // Un keyframe con el reloj hacia atrás abre un episodio nuevo: lo ya reproducido sobra
+            if (lastStreamStep != null && stepData.timestep <= lastStreamStep.timestep)
+            {
+                DropPlayedFrames(currentTimestep);
+            }
+        }
+        lastStreamStep = stepData;
+        movementData.Add(stepData);
+        TrimStreamBuffer();
+        if (!isPlaying)
+        {
+            // Empezar a reproducir con el primer paso recibido
+            isPlaying = true;
+            lastTimestepTime = Time.time;
+        }
+    }
+    catch (Exception e)
+    {
+        Debug.LogError($"Error processing traffic frame: {e.Message}");
+    }
+}
+
+// Quitar los primeros ``count`` pasos de movementData manteniendo el paso en reproducción
+void DropPlayedFrames(int count)
+{
+    if (count <= 0) return;
+    movementData.RemoveRange(0, count);
+    currentTimestep = Math.Max(currentTimestep - count, 0);
+}
+
+// Anillo: con más de maxStreamFrames pasos se descartan primero los ya reproducidos y, si la
+// reproducción va muy atrasada, también los pendientes más viejos (se salta hacia adelante)
+void TrimStreamBuffer()
+{
+    int extra = movementData.Count - maxStreamFrames;
+    if (extra <= 0) return;
+    DropPlayedFrames(Math.Max(currentTimestep, extra));
+}
+
+void EndStream()
+{
+    streamLive = false;
+    Debug.Log($"Received {movementData.Count} streamed timesteps of traffic data");
+}
+
 void PlayNextTimestep()
 {
     if (currentTimestep >= movementData.Count)
     {
+        // Stream en curso: esperar el siguiente paso
+        if (streamLive) return;
+        
         // End of simulation
         isPlaying = false;
         Debug.Log("Traffic simulation playback completed");
@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+
+matplotlib.use('Agg')
+# Los módulos del simulador están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+import pytest
+
+from traffic_checkpoint import restore
+from traffic_sim_json import ThreeTIntersectionModel, params
+
+
+def _model(engine, steps):
+    return ThreeTIntersectionModel(dict(params, engine=engine, seed=4, steps=steps, recorder='null'))
+
+
+@pytest.mark.parametrize('engine', ['agents', 'vector'])
+def test_continuation_matches_uninterrupted_run(engine):
+    full = _model(engine, 400)
+    full.run(display=False)
+
+    # El modelo del checkpoint ya tiene el steps final y se detiene a la mitad
+    warm = _model(engine, 400)
+    warm.run(steps=200, display=False)
+    cont = restore(warm.checkpoint())
+    cont.run(display=False)
+    assert cont.get_summary_stats() == full.get_summary_stats()
+
+
+@pytest.mark.parametrize('engine', ['agents', 'vector'])
+def test_extending_a_finished_run_draws_another_block(engine):
+    full = _model(engine, 400)
+    full.run(display=False)
+
+    # Restricción documentada en restore(): alargar una corrida de 200 ticks sortea los arribos
+    # siguientes en otro bloque de 200, no en el de la corrida de 400
+    short = _model(engine, 200)
+    short.run(display=False)
+    ck = short.checkpoint()
+    assert ck.meta['arrivals']['horizon'] == 200
+    cont = restore(ck, steps=400)
+    cont.run(display=False)
+    assert cont.arrivals.horizon == 200
+    assert cont.t == full.t
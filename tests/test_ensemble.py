@@ -0,0 +1,22 @@
+import pytest
+
+from traffic_ensemble import Ensemble
+from traffic_network import corridor_spec
+from traffic_sim_json import ThreeTIntersectionModel, params
+
+
+@pytest.mark.parametrize('policy', ['adaptive', 'max_pressure'])
+def test_replicas_match_standalone_runs(policy):
+    p = dict(params, policy=policy, network=corridor_spec(6, signal_every=2), recorder='null', steps=300)
+    seeds = [1, 2, 3]
+    ens = Ensemble(p, seeds)
+    stats = ens.run()
+    engine = ens.engine
+    for r, seed in enumerate(seeds):
+        single = ThreeTIntersectionModel(dict(p, seed=seed, engine='vector'))
+        single.run(display=False)
+        assert stats[r] == dict(single.get_summary_stats(), seed=seed)
+        assert ens.models[r].ctrl.timeline == single.ctrl.timeline
+        # Mismos autos en la flota con los mismos car_id que la réplica sola
+        live = engine.car_id[:engine.n][engine.rep[:engine.n] == r].tolist()
+        assert live == single.fleet.car_id[:single.fleet.n].tolist()
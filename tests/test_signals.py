@@ -0,0 +1,53 @@
+import numpy as np
+
+from traffic_network import corridor_spec
+from traffic_sim_json import ThreeTIntersectionModel, params
+
+# Corredor de 12 intersecciones con semáforo en una de cada dos
+CORRIDOR = corridor_spec(12, signal_every=2)
+
+
+def _corridor_run(policy, seed, ticks=600):
+    """(autos de la calle principal que llegaron a su meta, fracción de ticks con la cabeza
+    principal en verde por intersección)"""
+    model = ThreeTIntersectionModel(dict(params, engine='vector', policy=policy, seed=seed, network=CORRIDOR,
+                                         recorder='null', trips=True, trips_path=None))
+    model.sim_setup()
+    green = np.zeros(len(model.ctrl))
+    for _ in range(ticks):
+        model.sim_step()
+        green += ~model.ctrl.not_green()[0::2]
+    code = model.network.origin_code
+    done = model.trips.columns()['original_origin']
+    main = int(np.isin(done, [code['main_E'], code['main_W']]).sum())
+    return main, green / ticks
+
+
+def test_each_junction_counts_its_own_main_queue():
+    model = ThreeTIntersectionModel(dict(params, engine='vector', network=CORRIDOR, recorder='null'))
+    model.sim_setup()
+    ctrl = model.ctrl
+    n = len(ctrl)
+    code = model.network.origin_code
+    # Tres autos detenidos al oeste en la cabeza principal de la segunda intersección y uno en
+    # la lateral de la primera
+    head = np.array([2, 2, 2, 1])
+    origin = np.array([code['main_E']] * 3 + [code[ctrl.ids[0]]])
+    counts = ctrl.counts(head, origin)
+    assert counts.shape == (n, 3)
+    assert counts[1].tolist() == [3, 0, 0]
+    assert counts[0].tolist() == [0, 0, 1]
+    assert counts.sum() == 4
+
+
+def test_max_pressure_keeps_main_road_moving_on_a_corridor():
+    fixed_main = max_main = 0
+    for seed in (1, 2, 3):
+        main, _ = _corridor_run('fixed', seed)
+        fixed_main += main
+        main, green = _corridor_run('max_pressure', seed)
+        max_main += main
+        # Con una sola cola principal para todo el corredor el verde principal caía a ~0.1 y la
+        # calle principal despachaba poco más de la mitad que con el plan fijo
+        assert green.min() > 0.3
+    assert max_main >= 0.85 * fixed_main
@@ -0,0 +1,195 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Rejilla por defecto: multiplicador de todas las tasas lambda_* × duración en ticks × motor
+DEFAULT_SCALES = (1, 5, 15)
+DEFAULT_STEPS = (300, 600)
+DEFAULT_ENGINES = ('agents', 'vector')
+
+# Métricas donde un valor mayor es peor (para --compare)
+LOWER_IS_BETTER = ('sim_s', 'json_s', 'stream_s', 'delta_s', 'peak_rss_mb')
+
+
+def _peak_rss_mb():
+    # ru_maxrss está en KB en Linux (en bytes en macOS)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == 'Darwin' else rss / 1024
+
+
+def loopback_stream(messages):
+    """Enviar ``messages`` por un socket TCP local con el protocolo de ``traffic_client``.
+
+    Un hilo recibe y cuenta los bytes. Devuelve ``(bytes de frames recibidos, segundos)``, sin
+    contar el frame de fin; el tiempo incluye serializar cada mensaje.
+    """
+    from traffic_client import send_frame, end_stream, FRAME_PREFIX
+
+    server = socket.create_server(('127.0.0.1', 0))
+    received = []
+
+    def drain():
+        conn, _ = server.accept()
+        with conn:
+            total = 0
+            while True:
+                chunk = conn.recv(1 << 16)
+                if not chunk:
+                    break
+                total += len(chunk)
+        received.append(total)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    t0 = time.perf_counter()
+    sock = socket.create_connection(server.getsockname())
+    for msg in messages:
+        send_frame(sock, msg)
+    end_stream(sock)
+    reader.join()
+    elapsed = time.perf_counter() - t0
+    server.close()
+    return received[0] - FRAME_PREFIX.size, elapsed
+
+
+def run_case(case):
+    """Un caso en un proceso nuevo (el pico de RSS es por proceso): simulación y exportaciones"""
+    from traffic_sim_json import ThreeTIntersectionModel, params
+    from traffic_recorder import DeltaEncoder, KEYFRAME_EVERY
+
+    scale, steps, engine, seed = case
+    p = dict(params, steps=steps, engine=engine, seed=seed, recorder='memory')
+    for k in p:
+        if k.startswith('lambda_'):
+            p[k] = params[k] * scale
+    rss_before = _peak_rss_mb()
+
+    model = ThreeTIntersectionModel(p)
+    t0 = time.perf_counter()
+    model.run(display=False)
+    sim_s = time.perf_counter() - t0
+    ticks = len(model.recorder)
+
+    # Exportación JSON completa (get_movement_json)
+    t0 = time.perf_counter()
+    data = model.get_movement_json().encode('utf-8')
+    json_s = time.perf_counter() - t0
+
+    # Stream por un socket local: un frame compacto con prefijo de longitud por paso, completo y
+    # con deltas
+    frames = model.movement_data
+    stream_bytes, stream_s = loopback_stream(frames)
+    encoder = DeltaEncoder(p.get('keyframe_every', KEYFRAME_EVERY))
+    delta_bytes, delta_s = loopback_stream(encoder.encode(f) for f in frames)
+
+    cars = model.frame_table().cars_per_tick()
+    row = {
+        'scale': scale, 'steps': steps, 'engine': engine, 'seed': seed,
+        'ticks': ticks,
+        'sim_s': sim_s,
+        'ticks_per_s': ticks / sim_s if sim_s else float('inf'),
+        'peak_cars': int(cars.max()) if len(cars) else 0,
+        'mean_cars': float(cars.mean()) if len(cars) else 0.0,
+        'throughput': model.metrics['throughput'],
+        'json_bytes': len(data), 'json_s': json_s,
+        'stream_bytes': stream_bytes, 'stream_s': stream_s,
+        'delta_bytes': delta_bytes, 'delta_s': delta_s,
+        'peak_rss_mb': _peak_rss_mb(),
+        'rss_before_mb': rss_before,
+    }
+    if model.profiler is not None:
+        row['phases_us'] = {name: v['mean_us'] for name, v in model.profiler.report()['phases'].items()}
+    return row
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, steps=DEFAULT_STEPS, engines=DEFAULT_ENGINES, seed=0, repeat=1):
+    """Correr la rejilla completa; cada caso en su propio proceso hijo"""
+    cases = [(sc, st, eng, seed + r) for sc, st, eng, r
+             in itertools.product(scales, steps, engines, range(repeat))]
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            row = pool.submit(run_case, case).result()
+        print(f"scale={row['scale']:>3} steps={row['steps']:>5} {row['engine']:>6}: "
+              f"{row['ticks_per_s']:8.1f} ticks/s, pico {row['peak_cars']:>5} autos, "
+              f"{row['peak_rss_mb']:7.1f} MB, JSON {row['json_bytes'] / 1e6:7.2f} MB en {row['json_s']:.2f}s")
+        results.append(row)
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.15):
+    """Casos donde ``current`` empeora más que ``tolerance`` respecto de ``baseline``"""
+    key = lambda r: (r['scale'], r['steps'], r['engine'], r['seed'])
+    base = {key(r): r for r in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        old = base.get(key(row))
+        if old is None:
+            continue
+        checks = [('ticks_per_s', old['ticks_per_s'] / max(row['ticks_per_s'], 1e-12) - 1)]
+        checks += [(m, row[m] / max(old[m], 1e-12) - 1) for m in LOWER_IS_BETTER if m in old]
+        for metric, worse in checks:
+            if worse > tolerance:
+                regressions.append({'case': key(row), 'metric': metric, 'before': old[metric],
+                                    'after': row[metric], 'worse_by': worse})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de simulación y exportación")
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='multiplicadores de las tasas de arribo, separados por coma')
+    parser.add_argument('--steps', default=','.join(map(str, DEFAULT_STEPS)))
+    parser.add_argument('--engines', default=','.join(DEFAULT_ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE.json', help='resultados previos con los que comparar')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    report = run_benchmarks([float(s) for s in args.scales.split(',')], [int(s) for s in args.steps.split(',')],
+                            args.engines.split(','), seed=args.seed, repeat=args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for r in regressions:
+            print(f"REGRESIÓN {r['case']} {r['metric']}: {r['before']:.3g} -> {r['after']:.3g} "
+                  f"(+{r['worse_by'] * 100:.0f}%)")
+        if regressions:
+            raise SystemExit(1)
+        print("Sin regresiones respecto de", args.compare)
@@ -0,0 +1,305 @@
+import json
+
+import numpy as np
+
+from traffic_engine import TURNS, TURN_CODE, STATES, STATE_CODE, NO_TARGET
+
+FORMAT = 2
+
+
+class Checkpoint:
+    """Estado completo de un ``ThreeTIntersectionModel`` al final de un tick.
+
+    ``params`` son los parámetros de la corrida (con la red como dict), ``meta`` los escalares y
+    diccionarios (reloj, contadores, métricas, estado de los generadores aleatorios) y ``arrays``
+    los arreglos NumPy: autos en columnas (las del motor vectorizado, también para el motor por
+    agentes), fases de los semáforos, el bloque de arribos pre-muestreado y las métricas en línea.
+    No incluye los pasos grabados, los registros de viaje ya escritos ni ``ctrl.timeline``: la
+    continuación los empieza de nuevo desde el tick del checkpoint.
+    """
+
+    def __init__(self, params, meta, arrays):
+        self.params = params
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def t(self):
+        return self.meta['t']
+
+    def __len__(self):
+        """Autos en la red"""
+        return len(self.arrays['car_serial'])
+
+    def save(self, path):
+        """Guardar en un ``.npz`` comprimido (arreglos + cabecera JSON); devuelve la ruta"""
+        header = json.dumps({'format': FORMAT, 'params': self.params, 'meta': self.meta})
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, header=np.array(header), **self.arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            if header.get('format') != FORMAT:
+                raise ValueError(f"Checkpoint con formato desconocido: {header.get('format')}")
+            arrays = {name: data[name] for name in data.files if name != 'header'}
+        return cls(header['params'], header['meta'], arrays)
+
+    def copy(self):
+        return Checkpoint(json.loads(json.dumps(self.params)), json.loads(json.dumps(self.meta)),
+                          {name: arr.copy() for name, arr in self.arrays.items()})
+
+
+# ---------------------------------------------------------------------- captura
+
+def _json_params(model):
+    p = {}
+    for key, value in dict(model.p).items():
+        if key == 'network':
+            value = model.network.spec      # ruta, dict o RoadNetwork: siempre como dict
+        elif isinstance(value, np.generic):
+            value = value.item()
+        p[key] = value
+    json.dumps(p)       # falla aquí (y no al guardar) si algún parámetro no es serializable
+    return p
+
+
+def _car_rows(model):
+    """Autos activos en las columnas de ``VectorCarEngine.rows`` (con cualquiera de los motores)"""
+    if model.fleet is not None:
+        fleet = model.fleet
+        rows = fleet.rows(np.arange(fleet.n))
+        rows['car_id'] = rows['car_id'].astype(str)
+        return rows
+    cars = list(model.cars)
+    origin_code, intersection_code = model.network.origin_code, model.network.intersection_code
+    m = len(cars)
+    return {
+        'pos': np.array([c.pos for c in cars], dtype=float).reshape(m, 2),
+        'dir': np.array([c.dir for c in cars], dtype=float).reshape(m, 2),
+        'stopline': np.array([c.stopline for c in cars], dtype=float).reshape(m, 2),
+        'goal': np.array([c.goal for c in cars], dtype=float).reshape(m, 2),
+        'state': np.array([STATE_CODE[c.state] for c in cars], dtype=np.int8),
+        'origin': np.array([origin_code[c.origin] for c in cars], dtype=np.int16),
+        'original_origin': np.array([origin_code[c.original_origin] for c in cars], dtype=np.int16),
+        'turn': np.array([TURN_CODE[c.turn] for c in cars], dtype=np.int8),
+        'target_intersection': np.array([NO_TARGET if c.target_intersection is None
+                                         else intersection_code[c.target_intersection] for c in cars],
+                                        dtype=np.int16),
+        'turned': np.array([c.turned for c in cars], dtype=bool),
+        'wait': np.array([c.wait for c in cars], dtype=np.int64),
+        'car_id': np.array([c.car_id for c in cars], dtype=str),
+        'serial': np.array([c.serial for c in cars], dtype=np.int64),
+        'route': np.array([c.route_id for c in cars], dtype=np.int16),
+        'spawn_t': np.array([c.spawn_t for c in cars], dtype=np.int64),
+        'rep': np.zeros(m, dtype=np.int32),
+        'stop_head': np.array([c.stop_head for c in cars], dtype=np.intp),
+    }
+
+
+def _arrival_arrays(model):
+    """Bloque de arribos pre-muestreado ('schedule') como códigos enteros"""
+    arrivals = model.arrivals
+    block = getattr(arrivals, 'block', None)
+    if block is None:
+        return {}
+    items, offsets = block
+    origin_code, intersection_code = model.network.origin_code, model.network.intersection_code
+    return {
+        'arr_origin': np.array([origin_code[o] for o, _, _ in items], dtype=np.int16),
+        'arr_turn': np.array([TURN_CODE[turn] for _, turn, _ in items], dtype=np.int8),
+        'arr_target': np.array([NO_TARGET if x is None else intersection_code[x] for _, _, x in items],
+                               dtype=np.int16),
+        'arr_offsets': np.array(offsets, dtype=np.int64),
+    }
+
+
+def snapshot(model):
+    """``Checkpoint`` del estado actual de ``model`` (entre ticks)"""
+    meta = {
+        't': int(model.t),
+        'n_spawned': int(model.n_spawned),
+        'spawn_counts': dict(model.spawn_counts),
+        'metrics': json.loads(json.dumps(model.metrics, default=int)),
+        'queues': {o: int(q) for o, q in model.queues_by_dir().items()},
+        'nprandom': model.nprandom.bit_generator.state,
+        'random': list(model.random.getstate()[1]),
+        'random_gauss': model.random.getstate()[2],
+        'arrivals': {'t': int(getattr(model.arrivals, 't', 0)),
+                     'horizon': int(getattr(model.arrivals, 'horizon', 0))},
+        'ctrl_version': int(model.ctrl.version),
+        'origins': list(model.network.origins),
+        'n_routes': len(model.routes.routes),
+    }
+    arrays = {f'car_{name}': col for name, col in _car_rows(model).items()}
+    arrays.update(ctrl_phase=model.ctrl.phase.copy(), ctrl_sub=model.ctrl.sub.copy(),
+                  ctrl_t_in=model.ctrl.t_in.copy())
+    arrays.update(_arrival_arrays(model))
+
+    if getattr(model.p, 'arrivals', 'schedule') == 'legacy':
+        # Los arribos 'legacy' usan el RNG global de NumPy
+        name, keys, pos, has_gauss, cached = np.random.get_state()
+        meta['legacy_random'] = [name, int(pos), int(has_gauss), float(cached)]
+        arrays['legacy_keys'] = keys.copy()
+
+    online = model.online
+    if online is not None:
+        k = online.ticks
+        phases = online.phases
+        meta['online'] = {
+            'ticks': k,
+            'delays': {'count': online.delays.count, 'total': online.delays.total,
+                       'max': online.delays.max, 'max_value': online.delays.max_value},
+            'phases': {'current': phases.current, 'since': phases.since, 'stats': phases.stats},
+        }
+        arrays.update(online_timesteps=online.timesteps[:k].copy(), online_queues=online.queues[:k].copy(),
+                      online_delays=online.delays.counts.copy(), online_by_origin=online.by_origin.copy(),
+                      online_by_intersection=online.by_intersection.copy())
+    # Copia por JSON: el checkpoint no comparte diccionarios con el modelo que sigue corriendo
+    return Checkpoint(_json_params(model), json.loads(json.dumps(meta)), arrays)
+
+
+# ---------------------------------------------------------------------- restauración
+
+def _restore_cars(model, rows):
+    m = len(rows['serial'])
+    if model.fleet is not None:
+        fleet = model.fleet
+        fleet._grow(m)
+        for name in fleet._fields:
+            col = rows[name].astype(object) if name == 'car_id' else rows[name]
+            getattr(fleet, name)[:m] = col
+        fleet.n = m
+        return
+    from traffic_sim_json import Car
+
+    routes = model.routes.routes
+    origins = model.network.origins
+    for i in range(m):
+        r = routes[int(rows['route'][i])]
+        car = Car(model, origin=r.origin, turn=r.turn, target=r.target)
+        car.pos = rows['pos'][i].copy()
+        car.dir = rows['dir'][i].copy()
+        car.turned = bool(rows['turned'][i])
+        car.wait = int(rows['wait'][i])
+        car.car_id = str(rows['car_id'][i])
+        car.serial = int(rows['serial'][i])
+        car.spawn_t = int(rows['spawn_t'][i])
+        car.stop_head = int(rows['stop_head'][i])
+        car.origin = origins[rows['origin'][i]]
+        car.state = STATES[rows['state'][i]]       # actualiza model.queue_counts
+        model.cars.append(car)
+
+
+def _restore_arrivals(model, meta, arrays):
+    arrivals = model.arrivals
+    if not hasattr(arrivals, 'block'):
+        return
+    arrivals.horizon = meta['arrivals']['horizon']
+    arrivals.t = meta['arrivals']['t']
+    if 'arr_offsets' not in arrays:
+        arrivals.block = None
+        return
+    origins, ids = model.network.origins, model.network.ids
+    items = [(origins[o], TURNS[turn], None if x == NO_TARGET else ids[x])
+             for o, turn, x in zip(arrays['arr_origin'].tolist(), arrays['arr_turn'].tolist(),
+                                   arrays['arr_target'].tolist())]
+    arrivals.block = (items, arrays['arr_offsets'].tolist())
+
+
+def _restore_online(model, meta, arrays):
+    online = model.online
+    if online is None or 'online' not in meta:
+        return
+    saved = meta['online']
+    k = saved['ticks']
+    if k > len(online.timesteps):
+        online.timesteps = np.zeros(k, dtype=online.timesteps.dtype)
+        online.queues = np.zeros((k, online.queues.shape[1]), dtype=online.queues.dtype)
+    online.timesteps[:k] = arrays['online_timesteps']
+    online.queues[:k] = arrays['online_queues']
+    online.ticks = k
+    delays = online.delays
+    delays.counts[:] = arrays['online_delays']
+    delays.count, delays.total, delays.max = (saved['delays'][key] for key in ('count', 'total', 'max'))
+    online.by_origin[:] = arrays['online_by_origin']
+    online.by_intersection[:] = arrays['online_by_intersection']
+    phases = online.phases
+    phases.current, phases.since, phases.stats = (saved['phases'][key] for key in ('current', 'since', 'stats'))
+    phases.last = None      # la próxima instantánea de luces se compara por contenido
+
+
+def restore_into(model, checkpoint):
+    """Aplicar ``checkpoint`` a un modelo recién preparado (lo llama ``setup(checkpoint=...)``)"""
+    meta, arrays = checkpoint.meta, checkpoint.arrays
+    network = model.network
+    if list(network.origins) != meta['origins'] or len(model.routes.routes) != meta['n_routes']:
+        raise ValueError("El checkpoint es de otra red vial")
+
+    model.t = meta['t']
+    model.n_spawned = meta['n_spawned']
+    model.spawn_counts = dict(meta['spawn_counts'])
+    model.metrics = json.loads(json.dumps(meta['metrics']))
+    if 'nprandom' in meta:
+        model.nprandom.bit_generator.state = meta['nprandom']
+        model.random.setstate((3, tuple(meta['random']), meta['random_gauss']))
+    if 'legacy_random' in meta:
+        name, pos, has_gauss, cached = meta['legacy_random']
+        np.random.set_state((name, arrays['legacy_keys'], pos, has_gauss, cached))
+
+    _restore_cars(model, {name[4:]: arr for name, arr in arrays.items() if name.startswith('car_')})
+    if model.fleet is not None:
+        # Colas del final del tick guardado: las leen los semáforos al empezar el siguiente
+        model.fleet.queues = {o: meta['queues'][o] for o in network.origins}
+        model.fleet.rep_queues = np.array([[meta['queues'][o] for o in network.origins]], dtype=np.int64)
+
+    ctrl = model.ctrl
+    ctrl.phase = arrays['ctrl_phase'].astype(np.int8)
+    ctrl.sub = arrays['ctrl_sub'].astype(np.int8)
+    ctrl.t_in = arrays['ctrl_t_in'].astype(np.int32)
+    ctrl.version = meta['ctrl_version'] + 1     # reconstruir la instantánea de luces
+    _restore_arrivals(model, meta, arrays)
+    _restore_online(model, meta, arrays)
+
+
+def _reseeded(checkpoint):
+    """Sin estado aleatorio ni arribos ya sorteados: la continuación sortea con su propia semilla"""
+    meta = {k: v for k, v in checkpoint.meta.items()
+            if k not in ('nprandom', 'random', 'random_gauss', 'legacy_random')}
+    meta['arrivals'] = dict(meta['arrivals'], t=0)
+    arrays = {k: v for k, v in checkpoint.arrays.items() if not k.startswith('arr_') and k != 'legacy_keys'}
+    return Checkpoint(checkpoint.params, meta, arrays)
+
+
+def restore(checkpoint, **overrides):
+    """Modelo nuevo que continúa desde ``checkpoint`` (o la ruta a uno) con ``overrides`` de params.
+
+    ``steps`` sigue siendo la duración total: ``model.run()`` avanza desde ``checkpoint.t``
+    hasta ``steps``. Se puede cambiar de política, tiempos de semáforo, grabador o motor; la red
+    tiene que ser la misma. Con la misma semilla la continuación sigue el mismo flujo aleatorio
+    (números aleatorios comunes entre escenarios); con otra ``seed`` los arribos desde el
+    checkpoint se sortean de nuevo (réplicas desde un mismo estado de arranque en caliente).
+
+    La continuación coincide con la corrida sin interrumpir solo si el modelo del checkpoint ya
+    tenía el ``steps`` final (p. ej. se detuvo con ``run(steps=k)``). Con ``'arrivals':
+    'schedule'`` los arribos se sortean en bloques del ``steps`` del checkpoint: si se guardó al
+    final de una corrida más corta y se alarga con ``steps``, los arribos siguientes salen de
+    otro bloque de esa duración y no del que habría sorteado la corrida larga.
+    """
+    from traffic_sim_json import ThreeTIntersectionModel
+
+    if isinstance(checkpoint, str):
+        checkpoint = Checkpoint.load(checkpoint)
+    if 'seed' in overrides and overrides['seed'] != checkpoint.params.get('seed'):
+        checkpoint = _reseeded(checkpoint)
+    p = dict(checkpoint.params)
+    p.update(overrides)
+    return ThreeTIntersectionModel(p, checkpoint=checkpoint)
+
+
+def fork(model, scenarios):
+    """Un modelo por escenario (dict de overrides), todos desde el estado actual de ``model``"""
+    checkpoint = snapshot(model)
+    return [restore(checkpoint.copy(), **scenario) for scenario in scenarios]
@@ -1,7 +1,18 @@
 import socket
 import json
+import struct
 import time
 
+UNITY_HOST = "127.0.0.1"
+UNITY_PORT = 1101
+
+# Protocolo de streaming: tras el saludo de Unity el cliente envía STREAM_HEADER y luego un
+# frame por paso: longitud (uint32 big-endian) + JSON UTF-8 del paso. Un frame de longitud 0
+# marca el fin de la simulación. Los pasos pueden ser completos (keyframes) o deltas
+# (ver traffic_recorder.DeltaEncoder).
+STREAM_HEADER = b"Three T-intersection stream v1\n"
+FRAME_PREFIX = struct.Struct('>I')
+
 def send_traffic_data_to_unity(json_data):
     """Enviar datos JSON de simulación de tráfico al servidor Unity"""
     try:
@@ -14,14 +25,14 @@ def send_traffic_data_to_unity(json_data):
         print("Recibido del servidor Unity:", from_server.decode("ascii"))
         
         # Enviar confirmación
-        s.send(b"Traffic simulation data ready")
+        s.sendall(b"Traffic simulation data ready")
         
         # Enviar datos JSON
         print("Enviando datos de movimiento a Unity...")
-        s.send(json_data.encode('utf-8'))
+        s.sendall(json_data.encode('utf-8'))
         
         # Enviar marcador de fin
-        s.send(b"$")
+        s.sendall(b"$")
         
         print("¡Datos enviados exitosamente!")
         s.close()
@@ -31,6 +42,85 @@ def send_traffic_data_to_unity(json_data):
         print(f"Error conectando a Unity: {e}")
         return False
 
+def connect_to_unity(host=UNITY_HOST, port=UNITY_PORT):
+    """Conectar con el servidor Unity y abrir un stream de frames por paso"""
+    print("Conectando al servidor Unity...")
+    s = socket.create_connection((host, port))
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # cada paso sale sin esperar al siguiente
+    
+    # Recibir mensaje inicial de Unity
+    from_server = s.recv(4096)
+    print("Recibido del servidor Unity:", from_server.decode("ascii", errors="replace"))
+    
+    s.sendall(STREAM_HEADER)
+    return s
+
+def send_frame(s, frame):
+    """Enviar un paso como frame con prefijo de longitud (``frame`` dict o bytes JSON)"""
+    if not isinstance(frame, (bytes, bytearray)):
+        frame = json.dumps(frame, separators=(',', ':')).encode('utf-8')
+    s.sendall(FRAME_PREFIX.pack(len(frame)) + frame)
+
+def end_stream(s):
+    """Enviar el frame vacío de fin de stream y cerrar la conexión"""
+    try:
+        s.sendall(FRAME_PREFIX.pack(0))
+    finally:
+        s.close()
+
+def recv_frames(s):
+    """Leer frames con prefijo de longitud hasta el frame de fin (lado receptor, para pruebas)"""
+    def recv_exact(n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = s.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada a mitad de un frame")
+            buf += chunk
+        return bytes(buf)
+    while True:
+        (length,) = FRAME_PREFIX.unpack(recv_exact(FRAME_PREFIX.size))
+        if length == 0:
+            return
+        yield json.loads(recv_exact(length))
+
+def stream_file_to_unity(filename, keyframe_every=None):
+    """Enviar a Unity, frame por frame, un archivo JSON o NDJSON ya generado.
+
+    Las líneas NDJSON se reenvían tal cual (pueden ser deltas). Con ``keyframe_every`` los pasos
+    de un arreglo JSON se envían como deltas con keyframes cada ``keyframe_every`` pasos.
+    """
+    try:
+        s = connect_to_unity()
+    except OSError as e:
+        print(f"Error conectando a Unity: {e}")
+        return False
+    count = 0
+    try:
+        with open(filename, 'r') as f:
+            if filename.endswith('.ndjson'):
+                frames = (line.strip().encode('utf-8') for line in f if line.strip())
+            else:
+                frames = json.load(f)
+                if keyframe_every:
+                    from traffic_recorder import DeltaEncoder
+                    encoder = DeltaEncoder(keyframe_every)
+                    frames = (encoder.encode(frame) for frame in frames)
+            for frame in frames:
+                send_frame(s, frame)
+                count += 1
+    except (OSError, ValueError) as e:
+        print(f"Error enviando {filename} a Unity (tras {count} pasos): {e}")
+        return False
+    finally:
+        # El frame de fin y el cierre siempre: Unity no queda esperando pasos que no llegarán
+        try:
+            end_stream(s)       # cierra el socket aunque el envío falle
+        except OSError:
+            pass
+    print(f"¡{count} pasos enviados a Unity!")
+    return True
+
 def load_and_send_from_file(filename):
     """Cargar datos JSON desde archivo y enviar a Unity"""
     try:
@@ -0,0 +1,623 @@
+import numpy as np
+
+# Códigos enteros para el motor vectorizado (struct-of-arrays). ORIGINS e INTERSECTIONS son
+# los de la red por defecto; con otra red los códigos salen de ``model.network``.
+ORIGINS = ('main_E', 'main_W', 'north_center', 'south_left', 'south_right')
+TURNS = ('S', 'L', 'R')
+INTERSECTIONS = ('north', 'south_left', 'south_right')
+STATES = ('approach', 'stop', 'go', 'done')
+
+ME, MW, NC, SL, SR = range(len(ORIGINS))
+S, L, R = range(len(TURNS))
+APPROACH, STOP, GO, DONE = range(len(STATES))
+NO_TARGET = -1
+# Autos por delante que se revisan en cada cubeta y vista antes de recurrir al barrido de pares
+LEADER_STEPS = 3
+# Con hasta estos autos en movimiento el barrido de pares completo es más rápido que la búsqueda
+PAIR_SCAN_MAX = 128
+
+ORIGIN_CODE = {o: i for i, o in enumerate(ORIGINS)}
+TURN_CODE = {t: i for i, t in enumerate(TURNS)}
+INTERSECTION_CODE = {x: i for i, x in enumerate(INTERSECTIONS)}
+STATE_CODE = {s: i for i, s in enumerate(STATES)}
+
+
+def _dir_code(dirs):
+    """Código entero por dirección unitaria (los autos solo se mueven sobre los ejes)"""
+    return np.rint(dirs[:, 0] + 1).astype(np.int8) * 3 + np.rint(dirs[:, 1] + 1).astype(np.int8)
+
+
+def _ranges(starts, lengths):
+    """Concatenación de ``arange(s, s + l)`` para cada par (sin recorrerlos en Python)"""
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class VectorCarEngine:
+    """Flota completa en arreglos NumPy contiguos; avanza todos los autos con operaciones por lote.
+
+    Reproduce las reglas de ``Car.step`` pero con actualización síncrona: todos los autos
+    ven las posiciones del inicio del tick al calcular headway y conflictos.
+    """
+
+    def __init__(self, model, capacity=256):
+        self.model = model
+        p = model.p
+        self.v = float(p.v_free)
+        self.w = float(p.w)
+        self.headway = float(p.headway)
+        self.origins = model.network.origins
+        self.intersections = model.network.ids
+
+        self.n = 0
+        self.pos = np.zeros((capacity, 2))
+        self.dir = np.zeros((capacity, 2))
+        self.stopline = np.zeros((capacity, 2))
+        self.goal = np.zeros((capacity, 2))
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.origin = np.zeros(capacity, dtype=np.int16)
+        self.original_origin = np.zeros(capacity, dtype=np.int16)
+        self.turn = np.zeros(capacity, dtype=np.int8)
+        self.target_intersection = np.full(capacity, NO_TARGET, dtype=np.int16)
+        self.turned = np.zeros(capacity, dtype=bool)
+        self.wait = np.zeros(capacity, dtype=np.int64)
+        self.car_id = np.empty(capacity, dtype=object)
+        self.serial = np.zeros(capacity, dtype=np.int64)   # orden global de aparición
+        self.route = np.zeros(capacity, dtype=np.int16)     # id en model.routes
+        self.spawn_t = np.zeros(capacity, dtype=np.int64)   # model.t al aparecer
+        self.rep = np.zeros(capacity, dtype=np.int32)       # réplica (traffic_ensemble); 0 en corridas simples
+        self.stop_head = np.full(capacity, -1, dtype=np.intp)  # cabeza de semáforo donde está detenido
+        self.n_reps = 1
+
+        # Colas por dirección (autos en 'stop'), recalculadas una vez al final de cada paso
+        self.queues = {o: 0 for o in self.origins}
+        self.rep_queues = np.zeros((1, len(self.origins)), dtype=np.int64)   # réplicas × direcciones
+        self.finished = np.zeros(0, dtype=np.intp)  # índices de los autos que terminaron en el último paso
+        self.finished_waits = self.wait[:0]         # y sus esperas
+
+    _fields = ('pos', 'dir', 'stopline', 'goal', 'state', 'origin', 'original_origin',
+               'turn', 'target_intersection', 'turned', 'wait', 'car_id', 'serial', 'route', 'spawn_t', 'rep',
+               'stop_head')
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self, needed):
+        cap = len(self.state)
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        for name in self._fields:
+            old = getattr(self, name)
+            new = np.empty((cap,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    # ------------------------------------------------------------------ arribos
+    def spawn(self, origin, turn, target=None, rep=0, model=None, index=None):
+        """Agregar un auto con la misma geometría que ``Car.setup`` (tabla de rutas del modelo).
+
+        En un ensamble, ``rep`` es la réplica, ``model`` el modelo de esa réplica (reloj y serial)
+        e ``index`` cuántos autos tiene esa réplica en la flota, que es el índice que tendría el
+        auto corriendo la réplica sola (y forma parte de su ``car_id``).
+        """
+        model = self.model if model is None else model
+        routes = self.model.routes
+        r = routes.lookup(origin, turn, target).id
+        i = self.n
+        self._grow(i + 1)
+        self.route[i] = r
+        self.pos[i] = routes.spawn_pos[r]
+        self.dir[i] = routes.spawn_dir[r]
+        self.stopline[i] = routes.stopline[r]
+        self.goal[i] = routes.goal[r]
+        self.state[i] = APPROACH
+        self.origin[i] = self.original_origin[i] = routes.origin[r]
+        self.turn[i] = routes.turn[r]
+        self.target_intersection[i] = routes.target[r]
+        self.turned[i] = False
+        self.wait[i] = 0
+        self.car_id[i] = f"{origin}_{model.t}_{i if index is None else index}"
+        self.serial[i] = model.n_spawned
+        self.spawn_t[i] = model.t
+        self.rep[i] = rep
+        self.stop_head[i] = -1
+        self.n = i + 1
+
+    # ------------------------------------------------------------------ intercambio de filas
+    #
+    # Para la simulación por regiones (traffic_partition): los autos que cruzan el borde de una
+    # región se mueven como filas completas. Los fantasmas (copias de autos vecinos cerca del
+    # borde) se agregan al final en estado 'done' con serial -1: no avanzan, no cuentan en colas
+    # ni se graban, pero los autos propios (de índice menor) los ven como líderes y como
+    # tráfico de la calle principal en su posición del inicio del tick.
+
+    def rows(self, idx):
+        """Copia de todos los campos de las filas ``idx``"""
+        return {name: getattr(self, name)[idx].copy() for name in self._fields}
+
+    def remove(self, idx):
+        """Quitar las filas ``idx`` conservando el orden de las demás"""
+        n = self.n
+        keep = np.ones(n, dtype=bool)
+        keep[idx] = False
+        k = int(keep.sum())
+        if k == n:
+            return
+        keep = np.flatnonzero(keep)
+        for name in self._fields:
+            arr = getattr(self, name)
+            arr[:k] = arr[keep]
+        self.n = k
+
+    def insert(self, rows):
+        """Agregar filas en orden de ``serial`` (el orden de la lista es el de aparición)"""
+        m = len(rows['serial'])
+        if m == 0:
+            return
+        n = self.n
+        order = np.argsort(rows['serial'], kind='stable')
+        at = np.searchsorted(self.serial[:n], rows['serial'][order], side='right')
+        self._grow(n + m)
+        # Posición final de las filas nuevas y de las existentes en el arreglo combinado
+        new_slots = at + np.arange(m)
+        old_slots = np.arange(n) + np.searchsorted(at, np.arange(n), side='right')
+        for name in self._fields:
+            arr = getattr(self, name)
+            arr[old_slots] = arr[:n].copy()
+            arr[new_slots] = rows[name][order]
+        self.n = n + m
+
+    def append_ghosts(self, rows):
+        """Agregar copias de solo lectura de autos vecinos al final de la flota"""
+        m = len(rows['serial'])
+        if m == 0:
+            return
+        n = self.n
+        self._grow(n + m)
+        for name in self._fields:
+            getattr(self, name)[n:n + m] = rows[name]
+        self.state[n:n + m] = DONE
+        self.serial[n:n + m] = -1
+        self.n = n + m
+
+    def drop_ghosts(self):
+        self.remove(np.flatnonzero(self.serial[:self.n] < 0))
+
+    # ------------------------------------------------------------------ paso
+    #
+    # ``Car.step`` corre auto por auto en orden de lista: el auto i ve a los autos j < i ya
+    # movidos en este tick y a los j > i todavía en su estado anterior. Solo el headway y la
+    # revisión de conflictos acoplan autos entre sí; el resto (meta, luces, giro, carril) depende
+    # únicamente del propio auto. Por eso ``step`` calcula lo propio una vez y resuelve el
+    # acoplamiento como punto fijo sobre esa vista mixta, que converge a la misma salida.
+
+    def _maneuver(self, alive):
+        """Giro y ajuste de carril que aplicaría cada auto si avanza este tick"""
+        n, routes = self.n, self.model.routes
+        pos, dirs = self.pos[:n].copy(), self.dir[:n].copy()
+        origin, turned = self.origin[:n].copy(), self.turned[:n].copy()
+        route = self.route[:n]
+
+        # --- Giros ---
+        pending = alive & ~turned & (self.target_intersection[:n] != NO_TARGET)
+        if pending.any():
+            center = routes.center[route]
+            center_dist = np.sqrt((pos[:, 0] - center[:, 0]) ** 2 + (pos[:, 1] - center[:, 1]) ** 2)
+            turn_distance = np.where(np.abs(pos[:, 1]) < 5.0,
+                                     routes.turn_distance_main[route], routes.turn_distance[route])
+            go_turn = pending & (center_dist < turn_distance)
+
+            turn_dir = routes.turn_dir[route]
+            m = go_turn & ~np.isnan(turn_dir[:, 0])
+            dirs[m] = turn_dir[m]
+            axis, value = routes.snap_axis[route], routes.snap_value[route]
+            for k in (0, 1):
+                m = go_turn & (axis == k)
+                pos[m, k] = value[m]
+            turned[go_turn] = True
+            # Actualizar origen después del giro
+            origin[go_turn] = routes.leg_origin[route[go_turn], 1]
+
+        # --- Seguir las calles: restricciones de carril lejos de las intersecciones ---
+        lane = alive & ~routes.near_intersection_mask(pos)
+
+        leg = turned.astype(np.int8)
+        on_main = lane & (np.abs(pos[:, 1]) < 2.0)
+        target_y = np.where(on_main, routes.leg_main_y[route, leg], np.nan)
+        snap = ~np.isnan(target_y) & (np.abs(pos[:, 1] - target_y) > 0.5)
+        pos[snap, 1] = target_y[snap]
+
+        target_x = np.where(lane & ~on_main, routes.leg_street_x[route, leg], np.nan)
+        snap = ~np.isnan(target_x) & (np.abs(pos[:, 0] - target_x) > 0.5)
+        pos[snap, 0] = target_x[snap]
+
+        return pos, dirs, origin, turned
+
+    def _conflicts(self, me, excluded, new_pos, new_origin):
+        """Para cada auto en ``me`` (calles laterales que ceden el paso): ¿hay tráfico de la calle principal acercándose?"""
+        n = self.n
+        pos, origin = self.pos[:n], self.origin[:n]
+        # Solo importan los autos en la calle principal (|y| < 2) en la vista anterior o en la nueva
+        main0 = (np.abs(pos[:, 1]) < 2.0) & ((origin == ME) | (origin == MW))
+        main1 = (np.abs(new_pos[:, 1]) < 2.0) & ((new_origin == ME) | (new_origin == MW))
+        cand = np.flatnonzero(main0 | main1)
+        if len(cand) == 0:
+            return np.zeros(len(me), dtype=bool)
+        # Pares (auto que cede, auto de la calle principal) de la misma réplica
+        cand = cand[np.argsort(self.rep[cand], kind='stable')]
+        rep = self.rep[cand]
+        start = np.searchsorted(rep, self.rep[me], side='left')
+        count = np.searchsorted(rep, self.rep[me], side='right') - start
+        k = np.repeat(np.arange(len(me)), count)
+        c = cand[_ranges(start, count)]
+        i = me[k]
+        lower = c < i
+        x = np.where(lower, new_pos[c, 0], pos[c, 0])
+        y = np.where(lower, new_pos[c, 1], pos[c, 1])
+        o = np.where(lower, new_origin[c], origin[c])
+        valid = ~(lower & excluded[c]) & (c != i) & (np.abs(y) < 2.0)
+        ix = self.model.routes.leg_yield_x[self.route[me], self.turned[me].astype(np.int8)][k]
+        east = (o == ME) & (x > ix - 15) & (x < ix + 5)
+        west = (o == MW) & (x < ix + 15) & (x > ix - 5)
+        return np.bincount(k[valid & (east | west)], minlength=len(me)) > 0
+
+    def _gaps(self, movers, excluded, new_pos, new_dir):
+        """Distancia al líder en el mismo carril y sentido (inf si no hay).
+
+        Como ``LaneIndex``: cubetas por sentido y carril (ancho = tolerancia lateral) ordenadas
+        por proyección sobre la dirección de viaje; el líder solo puede estar en la cubeta del
+        auto o en una adyacente. Por cada cubeta y vista (anterior para los autos de índice mayor,
+        nueva para los de índice menor) se busca con ``searchsorted`` el primer auto por delante y
+        se recorren unos pocos hacia adelante; los autos que quedan sin resolver (el líder está
+        más lejos en la lista, detrás de autos de la otra vista) pasan por el barrido de pares,
+        igual que la flota entera cuando hay pocos autos en movimiento.
+        """
+        n = self.n
+        pos, dirs = self.pos[:n], self.dir[:n]
+        lim = self.w * 0.7
+        gap = np.full(n, np.inf)
+        mv = np.flatnonzero(movers)
+        if len(mv) == 0:
+            return gap
+        code0, code1 = _dir_code(dirs), _dir_code(new_dir)
+        if self.n_reps > 1:
+            # La réplica entra en el código de sentido: autos de otra réplica nunca son líderes
+            rep = self.rep[:n] * 9
+            code0, code1 = code0 + rep, code1 + rep
+        along0 = self._lane_coords(pos, dirs)
+        along1 = self._lane_coords(new_pos, new_dir)
+        lane0 = np.floor(along0[1] / lim).astype(np.int64)
+        lane1 = np.floor(along1[1] / lim).astype(np.int64)
+        # Clave entera (sentido, cubeta) con margen de una cubeta a cada lado: las cubetas
+        # adyacentes son las claves vecinas
+        low = min(lane0.min(), lane1.min()) - 1
+        span = max(lane0.max(), lane1.max()) - low + 2
+        key0 = code0.astype(np.int64) * span + (lane0 - low)
+        key1 = code1.astype(np.int64) * span + (lane1 - low)
+
+        # Sentido de referencia de cada auto: el del primero con su misma clave
+        mv = mv[np.argsort(key0[mv], kind='stable')]
+        keys, starts, counts = np.unique(key0[mv], return_index=True, return_counts=True)
+        D = dirs[mv[starts]][np.repeat(np.arange(len(keys)), counts)]
+        if len(mv) <= PAIR_SCAN_MAX:
+            self._gaps_pairs(mv, D, excluded, new_pos, new_dir, gap)
+            return gap
+        lateral = np.abs(D[:, 0]) > 0.5
+        m = len(mv)
+        best_p, best_j = np.full(m, np.inf), np.full(m, n)
+        best_d = np.zeros((m, 2))
+        pending = []
+        for view, (key, along, P) in enumerate(((key0, along0[0], pos), (key1, along1[0], new_pos))):
+            # Ordenar por (clave, proyección, índice) y ubicar a la vez la consulta de cada auto
+            # en la cubeta propia y en las adyacentes. Los que no le sacan casi 2 m nunca son
+            # líderes (proj > 2.0): la consulta va justo después de ellos
+            q_key = (key0[mv][None, :] + np.array([[-1], [0], [1]])).ravel()
+            q_along = np.tile(along0[0][mv] + 1.999, 3)
+            order = np.lexsort((np.r_[np.zeros(n, bool), np.ones(len(q_key), bool)],
+                                np.r_[along, q_along], np.r_[key, q_key]))
+            is_q = order >= n
+            data = order[~is_q]
+            first = np.cumsum(~is_q)[is_q]
+            slot = order[is_q] - n
+            start = np.empty(len(q_key), dtype=np.int64)
+            start[slot] = first
+            sorted_key, sorted_along = key[data], along[data]
+            end = np.searchsorted(sorted_key, q_key, side='right')
+            # Fin del tramo de autos con igual clave y proyección que cada posición de la lista
+            new_run = np.r_[True, (sorted_key[1:] != sorted_key[:-1]) | (sorted_along[1:] != sorted_along[:-1])]
+            run_end = np.r_[np.flatnonzero(new_run)[1:], n][np.cumsum(new_run) - 1]
+            k = np.tile(np.arange(m), 3)
+            for _ in range(LEADER_STEPS):
+                live = np.flatnonzero(start < end)
+                if len(live) == 0:
+                    break
+                self._offer(live, k, data[start[live]], view, mv, D, lateral, lim, excluded,
+                            P, best_p, best_j, best_d)
+                start[live] += 1
+            pending.append((k, start, end, data, run_end, P))
+        # Sin resolver: autos con candidatos sin revisar que todavía podrían ganarle al mejor de
+        # las dos vistas. La proyección no decrece a lo largo de la lista; si el siguiente empata
+        # con el mejor, los de su tramo tienen índice mayor y hay que mirar el primero después
+        unresolved = []
+        for k, start, end, data, run_end, P in pending:
+            rest = np.flatnonzero(start < end)
+            kr = k[rest]
+            proj = self._proj(data[start[rest]], P, mv[kr], D[kr])
+            tie = proj == best_p[kr]
+            open_ = (proj < best_p[kr]) | (tie & (data[start[rest]] < best_j[kr]))
+            after = run_end[start[rest]]
+            tie &= ~open_ & (after < end[rest])
+            t = np.flatnonzero(tie)
+            open_[t] = self._proj(data[after[t]], P, mv[kr[t]], D[kr[t]]) <= best_p[kr[t]]
+            unresolved.append(kr[open_])
+        hit = np.isfinite(best_p)
+        gap[mv[hit]] = np.sqrt((best_d[hit] ** 2).sum(axis=1))
+        unresolved = np.unique(np.concatenate(unresolved))
+        if len(unresolved):
+            self._gaps_pairs(mv[unresolved], D[unresolved], excluded, new_pos, new_dir, gap)
+        return gap
+
+    def _proj(self, J, P, I, D):
+        """Proyección de ``P[J]`` sobre ``D`` desde la posición de ``I`` (como en el barrido de pares)"""
+        delta = P[J] - self.pos[I]
+        return delta[:, 0] * D[:, 0] + delta[:, 1] * D[:, 1]
+
+    @staticmethod
+    def _lane_coords(pos, dirs):
+        """(proyección sobre el sentido de viaje, coordenada lateral) de cada auto"""
+        along_x = np.abs(dirs[:, 0]) > 0.5
+        sign = np.where(along_x, np.sign(dirs[:, 0]), np.sign(dirs[:, 1]))
+        return (np.where(along_x, pos[:, 0], pos[:, 1]) * sign,
+                np.where(along_x, pos[:, 1], pos[:, 0]))
+
+    def _offer(self, live, k, J, view, mv, D, lateral, lim, excluded, P, best_p, best_j, best_d):
+        """Proponer el candidato ``J`` a cada auto ``mv[k[live]]``; queda el de menor proyección y,
+        a igualdad, el de menor índice (como argmin sobre los candidatos)"""
+        kk = k[live]
+        I = mv[kk]
+        # Un candidato vale en la vista que le toca: anterior si su índice es mayor, nueva si es menor
+        ok = (J > I) if view == 0 else ((J < I) & ~excluded[J])
+        delta = P[J] - self.pos[I]
+        Dk = D[kk]
+        proj = delta[:, 0] * Dk[:, 0] + delta[:, 1] * Dk[:, 1]
+        side = np.where(lateral[kk], delta[:, 1], delta[:, 0])
+        ok &= (np.abs(side) < lim) & (proj > 2.0)
+        ok &= (proj < best_p[kk]) | ((proj == best_p[kk]) & (J < best_j[kk]))
+        # Un auto puede recibir hasta tres candidatos (uno por cubeta): queda el mejor
+        kk, ok_idx = kk[ok], np.flatnonzero(ok)
+        if len(kk) == 0:
+            return
+        order = np.lexsort((J[ok_idx], proj[ok_idx], kk))
+        kk, ok_idx = kk[order], ok_idx[order]
+        first = np.r_[True, kk[1:] != kk[:-1]]
+        kk, ok_idx = kk[first], ok_idx[first]
+        best_p[kk], best_j[kk], best_d[kk] = proj[ok_idx], J[ok_idx], delta[ok_idx]
+
+    def _gaps_pairs(self, mv, D, excluded, new_pos, new_dir, gap):
+        """Barrido de pares (auto, candidato) para los autos ``mv`` con sentido de referencia
+        ``D``; escribe la distancia al líder en ``gap``"""
+        n = self.n
+        pos, dirs = self.pos[:n], self.dir[:n]
+        lim = self.w * 0.7
+        # Cubetas por sentido y carril (ancho = tolerancia lateral): el líder solo puede estar
+        # en la misma cubeta o en una adyacente, tanto en la vista anterior como en la nueva
+        code0, code1 = _dir_code(dirs), _dir_code(new_dir)
+        if self.n_reps > 1:
+            # La réplica entra en el código de sentido: autos de otra réplica nunca son líderes
+            rep = self.rep[:n] * 9
+            code0, code1 = code0 + rep, code1 + rep
+        lane0 = np.floor(np.where(np.abs(dirs[:, 0]) > 0.5, pos[:, 1], pos[:, 0]) / lim).astype(np.int64)
+        lane1 = np.floor(np.where(np.abs(new_dir[:, 0]) > 0.5, new_pos[:, 1], new_pos[:, 0]) / lim).astype(np.int64)
+        # Clave entera (sentido, cubeta) con margen de una cubeta a cada lado: las cubetas
+        # adyacentes son las claves vecinas, así que los candidatos de cada grupo son dos tramos
+        # contiguos de las claves ordenadas (vista anterior y vista nueva)
+        low = min(lane0.min(), lane1.min()) - 1
+        span = max(lane0.max(), lane1.max()) - low + 2
+        key0 = code0.astype(np.int64) * span + (lane0 - low)
+        key1 = code1.astype(np.int64) * span + (lane1 - low)
+        order0, order1 = np.argsort(key0, kind='stable'), np.argsort(key1, kind='stable')
+        sorted0, sorted1 = key0[order0], key1[order1]
+
+        # Grupos de autos con la misma clave
+        sort = np.argsort(key0[mv], kind='stable')
+        mv, D = mv[sort], D[sort]
+        keys, starts, counts = np.unique(key0[mv], return_index=True, return_counts=True)
+        group = np.repeat(np.arange(len(keys)), counts)
+        lateral = np.where(np.abs(D[:, 0]) > 0.5, 1, 0)
+        a0 = np.searchsorted(sorted0, keys - 1, side='left')[group]
+        len0 = np.searchsorted(sorted0, keys + 1, side='right')[group] - a0
+        a1 = np.searchsorted(sorted1, keys - 1, side='left')[group]
+        len1 = np.searchsorted(sorted1, keys + 1, side='right')[group] - a1
+
+        # Todos los pares (auto, candidato) por lote, por bloques para acotar memoria
+        pairs = np.cumsum(len0 + len1)
+        cuts = np.searchsorted(pairs, np.arange(1 << 16, pairs[-1], 1 << 16), side='right')
+        for s, e in zip(np.r_[0, cuts], np.r_[cuts, len(mv)]):
+            if s == e:
+                continue
+            m = np.arange(s, e)
+            # Los autos de índice mayor se ven en la vista anterior y los de índice menor ya
+            # movidos: un líder válido siempre cae en el tramo de su vista
+            k0 = np.repeat(m, len0[s:e])
+            J0 = order0[_ranges(a0[s:e], len0[s:e])]
+            upper = J0 > mv[k0]
+            k1 = np.repeat(m, len1[s:e])
+            J1 = order1[_ranges(a1[s:e], len1[s:e])]
+            lower = (J1 < mv[k1]) & ~excluded[J1]
+            k = np.concatenate([k0[upper], k1[lower]])
+            J = np.concatenate([J0[upper], J1[lower]])
+            delta = np.concatenate([pos[J0[upper]], new_pos[J1[lower]]]) - pos[mv[k]]
+            Dk = D[k]
+            proj = delta[:, 0] * Dk[:, 0] + delta[:, 1] * Dk[:, 1]
+            side = np.where(lateral[k] == 1, delta[:, 1], delta[:, 0])
+            ok = (np.abs(side) < lim) & (proj > 2.0)
+            k, J, proj, delta = k[ok], J[ok], proj[ok], delta[ok]
+            if len(k) == 0:
+                continue
+            # Líder: menor proyección y, a igualdad, menor índice (como argmin sobre los candidatos)
+            local = k - s
+            best_proj = np.full(e - s, np.inf)
+            np.minimum.at(best_proj, local, proj)
+            tie = proj == best_proj[local]
+            best_j = np.full(e - s, n)
+            np.minimum.at(best_j, local[tie], J[tie])
+            first = np.flatnonzero(tie & (J == best_j[local]))
+            lead = delta[first]
+            gap[mv[k[first]]] = np.sqrt((lead ** 2).sum(axis=1))
+
+    def _speeds(self, movers, excluded, new_pos, new_dir):
+        h, v = self.headway, self.v
+        gap = self._gaps(movers, excluded, new_pos, new_dir)
+        vmax = np.where(movers, v, 0.0)
+        vmax[movers & (gap < h * 0.8)] = 0.0
+        slow = movers & (gap >= h * 0.8) & (gap < h * 1.2)
+        vmax[slow] = v * (gap[slow] - h * 0.8) / (h * 0.4)
+        # Velocidad mínima para evitar que se atoren
+        vmax[(vmax < 0.5) & (vmax > 0)] = 0.5
+        return vmax
+
+    def step(self, not_green):
+        """Avanzar la flota completa un tick con las cabezas de semáforo que no están en verde
+        (``SignalController.not_green()``; en un ensamble, una fila por réplica)"""
+        n = self.n
+        if n == 0:
+            self.queues = {o: 0 for o in self.origins}
+            self.rep_queues = np.zeros((self.n_reps, len(self.origins)), dtype=np.int64)
+            self.finished = self.finished[:0]
+            self.finished_waits = self.wait[:0]
+            return
+        pos, dirs = self.pos[:n], self.dir[:n]
+        state, origin = self.state[:n], self.origin[:n]
+
+        alive = state != DONE
+        # Si llegó a la meta, termina (los de índice menor ya no cuentan como líderes)
+        done = alive & (np.sqrt(((pos - self.goal[:n]) ** 2).sum(axis=1)) < 8.0)
+        alive &= ~done
+
+        near = np.sqrt(((pos - self.stopline[:n]) ** 2).sum(axis=1)) < 8.0
+        # Reglas de luz: cada auto obedece la cabeza de la stopline donde está (ver RouteTable)
+        routes, leg = self.model.routes, self.turned[:n].astype(np.int8)
+        idx = np.flatnonzero(alive)
+        if not_green.ndim > 1:
+            not_green = not_green[self.rep[idx]]
+        heads = np.full(n, -1, dtype=np.intp)
+        heads[idx] = routes.red_stops(2 * self.route[idx].astype(np.int64) + leg[idx], pos[idx], not_green)
+        signal_stop = heads >= 0
+        # Las calles laterales sin semáforo ceden al tráfico de la calle principal
+        yielding = np.flatnonzero(alive & near & ~np.isnan(routes.leg_yield_x[self.route[:n], leg]))
+
+        moved_pos, moved_dir, moved_origin, moved_turned = self._maneuver(alive)
+
+        excluded = done | (state == DONE)
+        new_pos, new_dir, new_origin = pos, dirs, origin
+        stop = vmax = None
+        for _ in range(n + 1):
+            stop_k = signal_stop.copy()
+            if len(yielding):
+                stop_k[yielding] |= self._conflicts(yielding, excluded, new_pos, new_origin)
+            movers = alive & ~stop_k
+            vmax_k = self._speeds(movers, excluded, new_pos, new_dir)
+            if stop is not None and np.array_equal(stop, stop_k) and np.array_equal(vmax, vmax_k):
+                break
+            stop, vmax = stop_k, vmax_k
+            new_pos = np.where(movers[:, None], moved_pos + moved_dir * vmax[:, None], pos)
+            new_dir = np.where(movers[:, None], moved_dir, dirs)
+            new_origin = np.where(movers, moved_origin, origin)
+
+        movers = alive & ~stop
+        state[done] = DONE
+        state[stop] = STOP
+        state[movers] = GO
+        self.wait[:n][stop] += 1
+        self.finished = np.flatnonzero(done)
+        self.finished_waits = self.wait[self.finished]
+        pos[:] = new_pos
+        dirs[:] = new_dir
+        origin[:] = new_origin
+        self.turned[:n] = np.where(movers, moved_turned, self.turned[:n])
+        self.stop_head[:n] = heads
+        k = len(self.origins)
+        counts = np.bincount(self.rep[:n][stop] * k + origin[stop], minlength=self.n_reps * k)
+        self.rep_queues = counts.reshape(self.n_reps, k)
+        self.queues = {o: int(c) for o, c in zip(self.origins, self.rep_queues[0])}
+
+    # ------------------------------------------------------------------ consultas
+    def stopped(self, rep=None):
+        """(cabeza de semáforo, origen) de los autos detenidos (de la réplica ``rep`` en un ensamble)"""
+        n = self.n
+        stop = self.state[:n] == STOP
+        if rep is not None:
+            stop &= self.rep[:n] == rep
+        return self.stop_head[:n][stop], self.origin[:n][stop]
+
+    def stopped_reps(self):
+        """(réplica, cabeza de semáforo, origen) de los autos detenidos de todas las réplicas"""
+        n = self.n
+        stop = self.state[:n] == STOP
+        return self.rep[:n][stop], self.stop_head[:n][stop], self.origin[:n][stop]
+
+    def frame_cars(self):
+        """Lista de autos activos con el mismo formato que la exportación por agentes"""
+        n = self.n
+        idx = np.flatnonzero(self.state[:n] != DONE)
+        pos, dirs = self.pos[idx].tolist(), self.dir[idx].tolist()
+        ids = self.car_id[idx]
+        origin, original = self.origin[idx], self.original_origin[idx]
+        state, turn, target = self.state[idx], self.turn[idx], self.target_intersection[idx]
+        turned, wait = self.turned[idx].tolist(), self.wait[idx].tolist()
+        origins, intersections = self.origins, self.intersections
+        cars = []
+        for k in range(len(idx)):
+            cars.append({
+                'id': ids[k],
+                'origin': origins[origin[k]],
+                'original_origin': origins[original[k]],
+                'position': {'x': pos[k][0], 'y': pos[k][1]},
+                'direction': {'x': dirs[k][0], 'y': dirs[k][1]},
+                'state': STATES[state[k]],
+                'turn': TURNS[turn[k]],
+                'turned': turned[k],
+                'target_intersection': None if target[k] == NO_TARGET else intersections[target[k]],
+                'wait_time': wait[k]
+            })
+        return cars
+
+    def columns(self):
+        """Autos activos como columnas codificadas (para grabadores columnares)"""
+        idx = np.flatnonzero(self.state[:self.n] != DONE)
+        return {
+            'car': self.serial[idx], 'id': self.car_id[idx],
+            'x': self.pos[idx, 0], 'y': self.pos[idx, 1],
+            'dx': self.dir[idx, 0], 'dy': self.dir[idx, 1],
+            'state': self.state[idx], 'origin': self.origin[idx],
+            'original_origin': self.original_origin[idx], 'turn': self.turn[idx],
+            'target_intersection': self.target_intersection[idx],
+            'turned': self.turned[idx], 'wait': self.wait[idx],
+        }
+
+    def finished_columns(self):
+        """Autos que terminaron en el último paso como columnas codificadas (registros de viaje)"""
+        idx = self.finished
+        return {
+            'car_id': self.car_id[idx], 'original_origin': self.original_origin[idx],
+            'origin': self.origin[idx], 'turn': self.turn[idx],
+            'target_intersection': self.target_intersection[idx],
+            'spawn_t': self.spawn_t[idx], 'wait': self.wait[idx],
+        }
+
+    def retire(self):
+        """Compactar los arreglos eliminando autos terminados (conserva el orden)"""
+        n = self.n
+        if not len(self.finished):
+            return      # nadie terminó en este tick
+        keep = np.flatnonzero(self.state[:n] != DONE)
+        k = len(keep)
+        if k == n:
+            return
+        for name in self._fields:
+            arr = getattr(self, name)
+            arr[:k] = arr[keep]
+        self.n = k
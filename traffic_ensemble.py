@@ -0,0 +1,160 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from traffic_engine import VectorCarEngine
+from traffic_signals import SignalBatch
+
+
+class FleetView:
+    """Lo que un ``ThreeTIntersectionModel`` usa de ``model.fleet``, para una réplica del motor
+    compartido: arribos con su reloj y serial, colas y autos terminados de esa réplica.
+
+    El ensamble fija ``finished`` y ``finished_waits`` después de cada paso del motor y ``n``
+    (autos de la réplica en la flota) después de la limpieza de autos terminados, que hace una
+    vez para todas las réplicas.
+    """
+
+    def __init__(self, engine, rep, model):
+        self.engine = engine
+        self.rep = rep
+        self.model = model
+        self.n = 0
+        self.finished = np.zeros(0, dtype=np.intp)
+        self.finished_waits = engine.wait[:0]
+
+    def __len__(self):
+        return self.n
+
+    def spawn(self, origin, turn, target=None):
+        # El car_id usa el índice que el auto tendría en la flota de la réplica sola
+        self.engine.spawn(origin, turn, target, rep=self.rep, model=self.model, index=self.n)
+        self.n += 1
+
+    @property
+    def queues(self):
+        return dict(zip(self.engine.origins, self.engine.rep_queues[self.rep].tolist()))
+
+    def stopped(self):
+        return self.engine.stopped(self.rep)
+
+    def finished_columns(self):
+        e, idx = self.engine, self.finished
+        return {
+            'car_id': e.car_id[idx], 'original_origin': e.original_origin[idx],
+            'origin': e.origin[idx], 'turn': e.turn[idx],
+            'target_intersection': e.target_intersection[idx],
+            'spawn_t': e.spawn_t[idx], 'wait': e.wait[idx],
+        }
+
+    def retire(self):
+        pass
+
+
+class Ensemble:
+    """K réplicas (una semilla cada una) avanzadas al mismo tiempo con un solo motor vectorizado.
+
+    Cada réplica es un ``ThreeTIntersectionModel`` completo (calendario de arribos, semáforos y
+    métricas propios), pero los autos de todas viven en los mismos arreglos con una columna
+    ``rep``: un paso del motor avanza todas las réplicas y headway, conflictos, luces y colas se
+    evalúan solo dentro de cada réplica. Los semáforos de todas se avanzan juntos con un
+    ``SignalBatch`` (fases en arreglos réplicas × intersecciones). Los resultados por réplica son los mismos que los de
+    correrla sola con ``'engine': 'vector'``. No se graban pasos ni registros de viaje.
+    """
+
+    def __init__(self, p, seeds):
+        from traffic_sim_json import ThreeTIntersectionModel
+
+        if p.get('arrivals', 'schedule') != 'schedule':
+            raise ValueError("El ensamble necesita 'arrivals': 'schedule' (un Generator por réplica)")
+        self.seeds = list(seeds)
+        self.models = []
+        for seed in self.seeds:
+            m = ThreeTIntersectionModel(dict(p, seed=seed, engine='vector', recorder='null',
+                                             trips=False, profile=False))
+            m.sim_setup()
+            self.models.append(m)
+        self.engine = VectorCarEngine(self.models[0])
+        self.engine.n_reps = len(self.models)
+        self.engine.rep_queues = np.zeros((len(self.models), len(self.engine.origins)), dtype=np.int64)
+        self.views = [FleetView(self.engine, r, m) for r, m in enumerate(self.models)]
+        for m, view in zip(self.models, self.views):
+            m.fleet = view
+        self.signals = SignalBatch([m.ctrl for m in self.models], self.engine)
+
+    @property
+    def running(self):
+        return any(m.running for m in self.models)
+
+    def step(self):
+        """Un tick de todas las réplicas"""
+        engine, models = self.engine, self.models
+        for m in models:
+            m.t += 1        # lo que hace ap.Model.sim_step antes de step()
+            m.spawn_arrivals()      # begin_tick sin perfil; los semáforos van en lote
+        self.signals.step()
+        engine.step(self.signals.not_green())
+
+        # Autos terminados por réplica (ordenados por réplica, conservando el orden de la flota)
+        finished = engine.finished
+        reps = engine.rep[finished]
+        order = np.argsort(reps, kind='stable')
+        cuts = np.searchsorted(reps[order], np.arange(len(models) + 1))
+        for r, view in enumerate(self.views):
+            view.finished = finished[order[cuts[r]:cuts[r + 1]]]
+            view.finished_waits = engine.wait[view.finished]
+
+        for m in models:
+            m.end_tick()
+            if m.t >= m._steps:
+                m.running = False
+        engine.retire()
+        if len(finished):
+            live = np.bincount(engine.rep[:engine.n], minlength=len(models))
+            for view, count in zip(self.views, live.tolist()):
+                view.n = count
+
+    def run(self):
+        while self.running:
+            self.step()
+        for m in self.models:
+            m.end()
+        return self.summary()
+
+    def summary(self):
+        """``get_summary_stats`` de cada réplica, con su semilla"""
+        return [dict(m.get_summary_stats(), seed=seed) for seed, m in zip(self.seeds, self.models)]
+
+
+def run_ensemble(p, seeds, batch=256):
+    """Correr todas las semillas en ensambles de hasta ``batch`` réplicas; una lista de resúmenes"""
+    seeds = list(seeds)
+    stats = []
+    for start in range(0, len(seeds), batch):
+        stats.extend(Ensemble(p, seeds[start:start + batch]).run())
+    return stats
+
+
+if __name__ == "__main__":
+    from traffic_sim_json import params
+
+    parser = argparse.ArgumentParser(description="Réplicas en lote con un solo motor vectorizado")
+    parser.add_argument('--seeds', type=int, default=100)
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--policy', default=params['policy'])
+    parser.add_argument('--steps', type=int, default=params['steps'])
+    parser.add_argument('--out', default='ensemble_stats.json')
+    args = parser.parse_args()
+
+    p = dict(params, policy=args.policy, steps=args.steps)
+    t0 = time.perf_counter()
+    stats = run_ensemble(p, range(args.first_seed, args.first_seed + args.seeds), batch=args.batch)
+    elapsed = time.perf_counter() - t0
+    delays = np.array([s['average_delay'] for s in stats])
+    print(f"{len(stats)} réplicas en {elapsed:.1f}s; demora promedio {delays.mean():.2f} ± {delays.std(ddof=1):.2f}s")
+    with open(args.out, 'w') as f:
+        json.dump(stats, f, indent=2)
+    print(f"Resúmenes guardados en {args.out}")
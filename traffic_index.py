@@ -0,0 +1,143 @@
+from bisect import bisect_left, insort
+import math
+
+
+class LaneIndex:
+    """Autos agrupados por sentido y carril, ordenados por proyección sobre su dirección de viaje.
+
+    Sustituye el barrido O(n²) de ``headway_ahead``: el líder de un auto es el primer vecino
+    hacia adelante en su carril (o en los carriles adyacentes dentro de la tolerancia lateral).
+    Se reconstruye al inicio de cada tick y se actualiza cada vez que un auto se mueve, así que
+    refleja las mismas posiciones que vería el barrido secuencial original.
+    """
+
+    def __init__(self, lane_width):
+        self.tol = lane_width * 0.7     # misma tolerancia lateral que headway_ahead
+        self.buckets = {}               # (dx, dy, carril) -> [(proyección, id, auto), ...] ordenada
+        self.slots = {}                 # id del auto -> (bucket, proyección)
+
+    def _slot(self, car):
+        dx, dy = int(round(car.dir[0])), int(round(car.dir[1]))
+        lane = car.pos[1] if abs(car.dir[0]) > 0.5 else car.pos[0]
+        key = float(car.pos[0]) * dx + float(car.pos[1]) * dy
+        return (dx, dy, math.floor(lane / self.tol)), key
+
+    def rebuild(self, cars):
+        self.buckets, self.slots = {}, {}
+        for c in cars:
+            if c.state == 'done':
+                continue
+            bucket, key = self._slot(c)
+            self.buckets.setdefault(bucket, []).append((key, c.id, c))
+            self.slots[c.id] = (bucket, key)
+        for entries in self.buckets.values():
+            entries.sort(key=lambda e: e[:2])
+
+    def discard(self, car):
+        slot = self.slots.pop(car.id, None)
+        if slot is None:
+            return
+        bucket, key = slot
+        entries = self.buckets[bucket]
+        del entries[bisect_left(entries, (key, car.id))]
+
+    def move(self, car):
+        """Reubicar un auto después de que cambió su posición o dirección"""
+        bucket, key = self._slot(car)
+        if self.slots.get(car.id) == (bucket, key):
+            return
+        self.discard(car)
+        insort(self.buckets.setdefault(bucket, []), (key, car.id, car), key=lambda e: e[:2])
+        self.slots[car.id] = (bucket, key)
+
+    def leader(self, me):
+        """Auto más cercano adelante en el mismo carril y sentido, o None"""
+        (dx, dy, lane), key = self._slot(me)
+        axis = 1 if abs(me.dir[0]) > 0.5 else 0
+        best = None
+        for b in (lane - 1, lane, lane + 1):
+            entries = self.buckets.get((dx, dy, b))
+            if not entries:
+                continue
+            # Recorre hacia adelante desde la propia proyección; el primero que cumple es el más cercano
+            for i in range(bisect_left(entries, (key,)), len(entries)):
+                _, cid, c = entries[i]
+                if c is me or abs(c.pos[axis] - me.pos[axis]) >= self.tol:
+                    continue
+                proj = (c.pos[0] - me.pos[0]) * me.dir[0] + (c.pos[1] - me.pos[1]) * me.dir[1]
+                if proj > 2.0:  # Solo autos significativamente adelante
+                    if best is None or (proj, cid) < best[:2]:
+                        best = (proj, cid, c)
+                    break
+        return None if best is None else best[2]
+
+
+class MainStreetIndex:
+    """Ocupación de la calle principal (|y| < 2) por sentido, ordenada por x.
+
+    Sustituye el barrido de toda la flota en ``_check_incoming_main_street_traffic``: cada
+    intersección sin semáforo consulta una ventana en x con búsqueda binaria, y el resultado se
+    memoriza hasta que la ocupación cambia, así que toda la cola de la calle lateral comparte
+    la misma consulta dentro de un tick.
+    """
+
+    # Ventanas (desde, hasta) relativas a la intersección por sentido de la calle principal
+    windows = {'main_E': (-15, 5), 'main_W': (-5, 15)}
+
+    def __init__(self):
+        self.lanes = {origin: [] for origin in self.windows}   # origen -> [(x, id), ...] ordenada
+        self.slots = {}                                        # id del auto -> (origen, x)
+        self.version = 0
+        self.memo = {}                                         # x intersección -> (versión, resultado)
+
+    def _slot(self, car):
+        if car.state == 'done' or car.origin not in self.lanes or abs(car.pos[1]) >= 2.0:
+            return None
+        return car.origin, float(car.pos[0])
+
+    def rebuild(self, cars):
+        self.lanes = {origin: [] for origin in self.windows}
+        self.slots = {}
+        for c in cars:
+            slot = self._slot(c)
+            if slot is not None:
+                self.lanes[slot[0]].append((slot[1], c.id))
+                self.slots[c.id] = slot
+        for entries in self.lanes.values():
+            entries.sort()
+        self.version += 1
+
+    def discard(self, car):
+        slot = self.slots.pop(car.id, None)
+        if slot is None:
+            return
+        origin, x = slot
+        entries = self.lanes[origin]
+        del entries[bisect_left(entries, (x, car.id))]
+        self.version += 1
+
+    def move(self, car):
+        """Actualizar la ocupación después de que un auto cambió posición u origen"""
+        slot = self._slot(car)
+        if self.slots.get(car.id) == slot:
+            return
+        self.discard(car)
+        if slot is not None:
+            insort(self.lanes[slot[0]], (slot[1], car.id))
+            self.slots[car.id] = slot
+            self.version += 1
+
+    def incoming(self, intersection_x):
+        """¿Hay tráfico de la calle principal acercándose a la intersección en ``intersection_x``?"""
+        memo = self.memo.get(intersection_x)
+        if memo is not None and memo[0] == self.version:
+            return memo[1]
+        hit = False
+        for origin, (lo, hi) in self.windows.items():
+            entries = self.lanes[origin]
+            i = bisect_left(entries, (intersection_x + lo, math.inf))  # primer x > desde
+            if i < len(entries) and entries[i][0] < intersection_x + hi:
+                hit = True
+                break
+        self.memo[intersection_x] = (self.version, hit)
+        return hit
@@ -0,0 +1,144 @@
+import numpy as np
+
+from traffic_engine import ORIGINS, INTERSECTIONS, NO_TARGET
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class DelayHistogram:
+    """Histograma de esperas enteras (segundos) con memoria fija.
+
+    Un contador por segundo hasta ``max_value`` y uno de desborde: los cuantiles son exactos
+    mientras las esperas no superen ``max_value`` (las mayores se reportan como ``max_value``).
+    """
+
+    def __init__(self, max_value=3600):
+        self.max_value = int(max_value)
+        self.counts = np.zeros(self.max_value + 2, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) == 0:
+            return
+        self.counts += np.bincount(np.minimum(values, self.max_value + 1), minlength=len(self.counts))
+        self.count += len(values)
+        self.total += int(values.sum())
+        self.max = max(self.max, int(values.max()))
+
+    def merge(self, other):
+        """Sumar otro histograma con el mismo ``max_value`` (p. ej. de otra región o réplica)"""
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Menor espera con al menos una fracción ``q`` de los autos por debajo o igual (rango más cercano)"""
+        if self.count == 0:
+            return 0
+        rank = max(int(np.ceil(q * self.count)), 1)
+        value = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(value, self.max_value)
+
+    def summary(self):
+        out = {f'p{round(q * 100)}': self.quantile(q) for q in QUANTILES}
+        out.update(mean=self.total / max(self.count, 1), max=self.max, count=self.count)
+        return out
+
+
+class PhaseDurations:
+    """Duración (en ticks) de cada estado de luz por dirección: conteo, suma, mínimo y máximo"""
+
+    def __init__(self):
+        self.current = None
+        self.last = None        # la instantánea de luces solo cambia de objeto cuando cambia una fase
+        self.since = {}
+        self.stats = {}
+
+    def update(self, tick, lights):
+        if lights is self.last:
+            return
+        self.last = lights
+        if self.current is None:
+            self.current, self.since = dict(lights), {d: tick for d in lights}
+            return
+        for d, state in lights.items():
+            prev = self.current.get(d)
+            if state != prev:
+                self._close(d, prev, tick - self.since[d])
+                self.current[d], self.since[d] = state, tick
+
+    def _close(self, direction, state, duration):
+        s = self.stats.setdefault(direction, {}).setdefault(
+            state, {'count': 0, 'total': 0, 'min': duration, 'max': duration})
+        s['count'] += 1
+        s['total'] += duration
+        s['min'] = min(s['min'], duration)
+        s['max'] = max(s['max'], duration)
+
+    def summary(self):
+        """Solo fases completas (la fase en curso al terminar la corrida no cuenta)"""
+        return {d: {state: dict(s, mean=s['total'] / s['count']) for state, s in by_state.items()}
+                for d, by_state in self.stats.items()}
+
+
+class OnlineMetrics:
+    """Métricas que se actualizan dentro de ``ThreeTIntersectionModel.step`` sin grabar pasos.
+
+    Por tick: serie de colas por aproximación, histograma de esperas de los autos que
+    terminaron, throughput por origen y por intersección de giro ('through' si sigue recto) y
+    duración de cada fase de luz. La serie de colas crece con los ticks (un int32 por dirección);
+    todo lo demás ocupa memoria fija.
+    """
+
+    def __init__(self, horizon=600, max_delay=3600, origins=ORIGINS, intersections=INTERSECTIONS):
+        capacity = max(int(horizon), 1)
+        self.origins = tuple(origins)
+        self.intersections = tuple(intersections)
+        self.timesteps = np.zeros(capacity, dtype=np.int64)
+        self.queues = np.zeros((capacity, len(self.origins)), dtype=np.int32)
+        self.ticks = 0
+        self.delays = DelayHistogram(max_delay)
+        self.by_origin = np.zeros(len(self.origins), dtype=np.int64)
+        self.by_intersection = np.zeros(len(self.intersections) + 1, dtype=np.int64)   # último: 'through'
+        self.phases = PhaseDurations()
+
+    def update(self, t, queues, lights, finished):
+        """Registrar un tick: colas por dirección, luces y columnas de los autos que terminaron"""
+        k = self.ticks
+        if k == len(self.timesteps):
+            self.timesteps = np.concatenate([self.timesteps, np.zeros_like(self.timesteps)])
+            self.queues = np.concatenate([self.queues, np.zeros_like(self.queues)])
+        self.timesteps[k] = t
+        self.queues[k] = [queues[o] for o in self.origins]
+        self.ticks = k + 1
+
+        if len(finished['wait']):
+            self.delays.add(finished['wait'])
+            self.by_origin += np.bincount(np.asarray(finished['original_origin'], dtype=np.intp),
+                                          minlength=len(self.origins))
+            target = np.asarray(finished['target_intersection'], dtype=np.intp)
+            target = np.where(target == NO_TARGET, len(self.intersections), target)
+            self.by_intersection += np.bincount(target, minlength=len(self.intersections) + 1)
+
+        self.phases.update(k, lights)
+
+    def queue_series(self):
+        """Serie de colas: dict con 'timestep' y una columna por dirección"""
+        n = self.ticks
+        out = {'timestep': self.timesteps[:n]}
+        out.update({o: self.queues[:n, i] for i, o in enumerate(self.origins)})
+        return out
+
+    def summary(self):
+        q = self.queues[:self.ticks]
+        return {
+            'delay': self.delays.summary(),
+            'mean_queues': {o: float(q[:, i].mean()) if len(q) else 0.0 for i, o in enumerate(self.origins)},
+            'throughput_by_origin': dict(zip(self.origins, self.by_origin.tolist())),
+            'throughput_by_intersection': dict(zip(self.intersections + ('through',), self.by_intersection.tolist())),
+            'phase_durations': self.phases.summary(),
+        }
@@ -0,0 +1,197 @@
+import json
+
+MAIN_ORIGINS = ('main_E', 'main_W')
+CONTROLS = ('signal', 'yield', 'free')
+# Cabezas de semáforo de cada intersección con semáforo: la de la calle principal (ambos
+# sentidos) y la de su calle lateral. Código de cabeza = 2 * fila del semáforo + tipo
+MAIN_HEAD, SIDE_HEAD = 0, 1
+
+# Red por defecto: las tres intersecciones en T del diagrama. Los textos son nombres de
+# parámetros que se resuelven contra ``params``; también se aceptan números.
+DEFAULT_SPEC = {
+    'geometry': {'L_main': 'L_main', 'L_vertical': 'L_vertical', 'w': 'w',
+                 'radius': 'intersection_radius'},
+    'main': {
+        # main_E sigue recto o gira a la derecha hacia una calle norte
+        'main_E': {'rate': 'lambda_main_east', 'p_straight': 'p_main_east_straight',
+                   'p_turn': 'p_main_east_to_north'},
+        # main_W sigue recto o gira a la izquierda hacia una calle sur
+        'main_W': {'rate': 'lambda_main_west', 'p_straight': 'p_main_west_straight',
+                   'p_turn': 'p_main_west_to_south'},
+    },
+    'intersections': [
+        {'id': 'north', 'x': 'intersection_north_x', 'side': 'north', 'origin': 'north_center',
+         'control': 'yield', 'rate': 'lambda_north_center',
+         'p_left': 'p_north_left', 'p_right': 'p_north_right'},
+        {'id': 'south_left', 'x': 'intersection_south_left_x', 'side': 'south', 'origin': 'south_left',
+         'control': 'yield', 'rate': 'lambda_south_left',
+         'p_left': 'p_south_left', 'p_right': 'p_south_right'},
+        {'id': 'south_right', 'x': 'intersection_south_right_x', 'side': 'south', 'origin': 'south_right',
+         'control': 'signal', 'rate': 'lambda_south_right',
+         'p_left': 'p_south_left', 'p_right': 'p_south_right'},
+    ],
+}
+
+# Valores por defecto de las probabilidades si ``params`` no las define
+DEFAULT_PROBS = {'p_straight': 0.6, 'p_turn': 0.4, 'p_left': 0.5, 'p_right': 0.5}
+
+
+class Intersection:
+    """Una intersección en T: calle lateral al norte o al sur de la calle principal"""
+
+    __slots__ = ('id', 'x', 'side', 'origin', 'control', 'rate', 'p_left', 'p_right')
+
+    @property
+    def north(self):
+        return self.side == 'north'
+
+
+class RoadNetwork:
+    """Calle principal este-oeste con N intersecciones en T, descrita por datos.
+
+    Se construye desde un dict (o archivo JSON) con la geometría, las tasas y probabilidades de
+    la calle principal y la lista de intersecciones (``id``, ``x``, ``side``, ``origin``,
+    ``control`` y tasa/probabilidades de la calle lateral). ``RouteTable`` la compila en
+    arreglos de rutas; los orígenes son ``main_E``, ``main_W`` y el de cada calle lateral, en
+    el orden de la lista (ese orden define sus códigos enteros).
+    """
+
+    def __init__(self, spec, p=None):
+        self.spec = spec
+        value = lambda v, default=None: self._value(v, p, default)
+
+        geo = spec['geometry']
+        self.L_main = float(value(geo['L_main']))
+        self.L_vertical = float(value(geo['L_vertical']))
+        self.w = float(value(geo['w']))
+        self.radius = float(value(geo['radius']))
+
+        self.main = {}
+        for origin in MAIN_ORIGINS:
+            m = spec['main'][origin]
+            self.main[origin] = {'rate': float(value(m['rate'])),
+                                 'p_straight': value(m.get('p_straight'), DEFAULT_PROBS['p_straight']),
+                                 'p_turn': value(m.get('p_turn'), DEFAULT_PROBS['p_turn'])}
+
+        self.intersections = []
+        for item in spec['intersections']:
+            node = Intersection()
+            node.id = item['id']
+            node.x = float(value(item['x']))
+            node.side = item['side']
+            node.origin = item.get('origin', node.id)
+            node.control = item.get('control', 'yield')
+            node.rate = float(value(item.get('rate', 0.0)))
+            node.p_left = value(item.get('p_left'), DEFAULT_PROBS['p_left'])
+            node.p_right = value(item.get('p_right'), DEFAULT_PROBS['p_right'])
+            if node.side not in ('north', 'south'):
+                raise ValueError(f"Intersección {node.id}: 'side' debe ser 'north' o 'south'")
+            if node.control not in CONTROLS:
+                raise ValueError(f"Intersección {node.id}: 'control' debe ser uno de {CONTROLS}")
+            self.intersections.append(node)
+
+        self.ids = tuple(node.id for node in self.intersections)
+        self.origins = MAIN_ORIGINS + tuple(node.origin for node in self.intersections)
+        if len(set(self.ids)) != len(self.ids) or len(set(self.origins)) != len(self.origins):
+            raise ValueError("Los ids y orígenes de las intersecciones deben ser únicos")
+        self.origin_code = {o: i for i, o in enumerate(self.origins)}
+        self.intersection_code = {x: i for i, x in enumerate(self.ids)}
+        self.by_id = {node.id: node for node in self.intersections}
+        self.by_origin = {node.origin: node for node in self.intersections}
+        self.signalized = [node for node in self.intersections if node.control == 'signal']
+        self.signal_row = {node.id: i for i, node in enumerate(self.signalized)}
+
+    @staticmethod
+    def _value(v, p, default=None):
+        """Número tal cual; texto = nombre de parámetro en ``p``"""
+        if v is None:
+            return default
+        if isinstance(v, str):
+            if p is None or v not in p:
+                if default is not None:
+                    return default
+                raise ValueError(f"Parámetro de red sin valor: {v}")
+            return p[v]
+        return v
+
+    @classmethod
+    def from_params(cls, p):
+        """Red de tres intersecciones en T definida por ``params`` (el diagrama original)"""
+        return cls(DEFAULT_SPEC, p)
+
+    @classmethod
+    def load(cls, path, p=None):
+        with open(path) as f:
+            return cls(json.load(f), p)
+
+    # ------------------------------------------------------------------ consultas
+    def head(self, node, kind):
+        """Código de la cabeza ``kind`` (MAIN_HEAD o SIDE_HEAD) de una intersección con semáforo"""
+        return 2 * self.signal_row[node.id] + kind
+
+    def nearest_signal(self, node):
+        """La intersección con semáforo más cercana a ``node`` (ella misma si lo tiene), o None"""
+        if not self.signalized:
+            return None
+        return min(self.signalized, key=lambda s: (abs(s.x - node.x), s.x))
+
+    def north_targets(self):
+        """Intersecciones donde main_E puede girar a la derecha (calles al norte)"""
+        return tuple(node.id for node in self.intersections if node.north)
+
+    def south_targets(self):
+        """Intersecciones donde main_W puede girar a la izquierda (calles al sur)"""
+        return tuple(node.id for node in self.intersections if not node.north)
+
+    def arrivals(self):
+        """Por origen (en orden de código): (tasa, giros posibles, probabilidades, destinos posibles)"""
+        north, south = self.north_targets(), self.south_targets()
+        out = []
+        for origin in MAIN_ORIGINS:
+            m = self.main[origin]
+            turn, targets = ('R', north) if origin == 'main_E' else ('L', south)
+            probs = [m['p_straight'], m['p_turn']] if targets else [1.0, 0.0]
+            out.append((origin, m['rate'], ('S', turn), probs, targets))
+        for node in self.intersections:
+            out.append((node.origin, node.rate, ('L', 'R'), [node.p_left, node.p_right], (node.id,)))
+        return out
+
+
+def make_network(p):
+    """Red según ``p.network``: None (tres intersecciones de params), ruta a JSON o dict"""
+    spec = p.get('network') if hasattr(p, 'get') else None
+    if spec is None:
+        return RoadNetwork.from_params(p)
+    if isinstance(spec, RoadNetwork):
+        return spec
+    if isinstance(spec, str):
+        return RoadNetwork.load(spec, p)
+    return RoadNetwork(spec, p)
+
+
+def corridor_spec(n, spacing=60.0, signal_every=3, margin=70.0, rate=0.03, main_rate=0.06):
+    """Especificación de un corredor de ``n`` intersecciones alternando norte y sur.
+
+    Cada ``signal_every``-ésima intersección lleva semáforo y las demás ceden el paso; la
+    geometría (carril, radio, largo de calles laterales) se toma de ``params``.
+    """
+    half = spacing * (n - 1) / 2
+    intersections = []
+    for k in range(n):
+        side = 'north' if k % 2 == 0 else 'south'
+        intersections.append({
+            'id': f'{side}_{k}', 'x': -half + k * spacing, 'side': side, 'origin': f'{side}_{k}',
+            'control': 'signal' if signal_every and k % signal_every == signal_every - 1 else 'yield',
+            'rate': rate,
+            'p_left': 'p_north_left' if side == 'north' else 'p_south_left',
+            'p_right': 'p_north_right' if side == 'north' else 'p_south_right',
+        })
+    return {
+        'geometry': {'L_main': half + margin, 'L_vertical': 'L_vertical', 'w': 'w',
+                     'radius': 'intersection_radius'},
+        'main': {
+            'main_E': {'rate': main_rate, 'p_straight': 'p_main_east_straight', 'p_turn': 'p_main_east_to_north'},
+            'main_W': {'rate': main_rate, 'p_straight': 'p_main_west_straight', 'p_turn': 'p_main_west_to_south'},
+        },
+        'intersections': intersections,
+    }
@@ -0,0 +1,158 @@
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from traffic_sweep import run_replication
+
+# Rangos enteros (inclusive) de los tiempos de semáforo que busca el optimizador
+SPACE = {
+    'green_main': (10, 45), 'green_side': (8, 30),
+    'gmin_main': (5, 20), 'gmax_main': (25, 60),
+    'gmin_side': (4, 15), 'gmax_side': (12, 40),
+    'theta': (0, 8),
+}
+
+# Parámetros que usa cada política (los demás no cambian la corrida)
+POLICY_PARAMS = {
+    'fixed': ('green_main', 'green_side'),
+    'adaptive': ('gmin_main', 'gmax_main', 'gmin_side', 'gmax_side', 'theta'),
+    'max_pressure': ('gmin_main', 'gmax_main', 'gmin_side', 'gmax_side'),
+}
+
+# Sentido de cada objetivo: 1 = minimizar, -1 = maximizar
+OBJECTIVES = {'average_delay': 1, 'qmax': 1, 'throughput': -1}
+
+
+def space_for(policy):
+    """Sub-espacio de ``SPACE`` con los parámetros que usa ``policy``"""
+    return {k: SPACE[k] for k in POLICY_PARAMS[policy]}
+
+
+def sample_candidates(space, n, seed=0):
+    """``n`` planes de tiempos al azar (enteros uniformes en cada rango), sin repetir.
+
+    Si un muestreo deja ``gmin_*`` por encima de ``gmax_*`` se intercambian.
+    """
+    rng = np.random.default_rng(seed)
+    keys = list(space)
+    out, seen = [], set()
+    for _ in range(n * 20):
+        if len(out) == n:
+            break
+        plan = {k: int(rng.integers(space[k][0], space[k][1] + 1)) for k in keys}
+        for road in ('main', 'side'):
+            lo, hi = f'gmin_{road}', f'gmax_{road}'
+            if lo in plan and hi in plan and plan[lo] > plan[hi]:
+                plan[lo], plan[hi] = plan[hi], plan[lo]
+        key = tuple(plan[k] for k in keys)
+        if key not in seen:
+            seen.add(key)
+            out.append(plan)
+    return out
+
+
+def horizons(min_steps, max_steps, eta):
+    """Duraciones de cada ronda: ``min_steps`` multiplicado por ``eta`` hasta ``max_steps``"""
+    steps = [int(min_steps)]
+    while steps[-1] < max_steps:
+        steps.append(min(int(steps[-1] * eta), int(max_steps)))
+    return steps
+
+
+def successive_halving(candidates, seeds=5, base=None, min_steps=300, max_steps=2700, eta=3,
+                       objective='average_delay', processes=None, first_seed=0):
+    """Evaluar ``candidates`` (lista de overrides de ``params``) con descarte por rondas.
+
+    En cada ronda todos los candidatos vivos corren con las mismas semillas (números aleatorios
+    comunes) y la misma duración, en un pool de procesos; pasa a la ronda siguiente, ``eta``
+    veces más larga, la mejor fracción ``1/eta`` según la media de ``objective``. La última
+    ronda corre ``max_steps``; ``min_steps`` debe dejar que la red se cargue (con pocos ticks
+    todos los planes empatan con la red casi vacía). Devuelve ``(mejor, tabla)``: el override
+    ganador y un DataFrame con una fila por candidato y ronda (media y desviación por métrica).
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objetivo desconocido: {objective} (opciones: {tuple(OBJECTIVES)})")
+    sense = OBJECTIVES[objective]
+    seed_list = list(range(first_seed, first_seed + seeds)) if isinstance(seeds, int) else list(seeds)
+    alive = list(range(len(candidates)))
+    rows = []
+
+    processes = processes or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    try:
+        rungs = horizons(min_steps, max_steps, eta)
+        for rung, steps in enumerate(rungs):
+            jobs = [(i, dict(candidates[i], steps=steps), seed, base) for i in alive for seed in seed_list]
+            if pool is None:
+                runs = [run_replication(job) for job in jobs]
+            else:
+                chunksize = max(1, len(jobs) // (processes * 4))
+                runs = list(pool.map(run_replication, jobs, chunksize=chunksize))
+            runs = pd.DataFrame(runs)
+
+            scores = {}
+            for i in alive:
+                group = runs[runs['config'] == i]
+                row = dict(candidate=i, rung=rung, steps=steps, n=len(group), **candidates[i])
+                for metric in OBJECTIVES:
+                    row[metric] = float(group[metric].mean())
+                    row[f'{metric}_std'] = float(group[metric].std(ddof=1)) if len(group) > 1 else math.nan
+                rows.append(row)
+                scores[i] = sense * row[objective]
+
+            if rung == len(rungs) - 1:
+                break
+            keep = max(1, math.ceil(len(alive) / eta))
+            alive = sorted(alive, key=lambda i: (scores[i], i))[:keep]
+            print(f"Ronda {rung}: {steps} ticks, {len(scores)} candidatos -> {len(alive)}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    table = pd.DataFrame(rows)
+    best = min(alive, key=lambda i: (scores[i], i))
+    return dict(candidates[best]), table
+
+
+def optimize(policy='adaptive', n_candidates=27, seeds=5, base=None, min_steps=300, max_steps=2700,
+             eta=3, objective='average_delay', processes=None, sample_seed=0):
+    """Buscar el mejor plan de tiempos para ``policy`` con muestreo al azar y descarte por rondas"""
+    from traffic_sim_json import params
+
+    base = dict(params if base is None else base, policy=policy)
+    candidates = sample_candidates(space_for(policy), n_candidates, seed=sample_seed)
+    # El plan actual de base también compite
+    candidates.insert(0, {k: base[k] for k in POLICY_PARAMS[policy]})
+    return successive_halving(candidates, seeds=seeds, base=base, min_steps=min_steps,
+                              max_steps=max_steps, eta=eta, objective=objective, processes=processes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimización de tiempos de semáforo por rondas")
+    parser.add_argument('--policy', default='adaptive', choices=list(POLICY_PARAMS))
+    parser.add_argument('--candidates', type=int, default=27)
+    parser.add_argument('--seeds', type=int, default=5)
+    parser.add_argument('--min-steps', type=int, default=300)
+    parser.add_argument('--max-steps', type=int, default=2700)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--objective', default='average_delay', choices=list(OBJECTIVES))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default='timing_plan.json')
+    args = parser.parse_args()
+
+    best, table = optimize(args.policy, args.candidates, args.seeds, min_steps=args.min_steps,
+                           max_steps=args.max_steps, eta=args.eta, objective=args.objective,
+                           processes=args.processes)
+    final = table[table['rung'] == table['rung'].max()].sort_values(args.objective,
+                                                                    ascending=OBJECTIVES[args.objective] > 0)
+    pd.set_option('display.width', 160)
+    print(final[[c for c in final.columns if not c.endswith('_std')]].to_string(index=False))
+    with open(args.out, 'w') as f:
+        json.dump(dict(best, policy=args.policy), f, indent=2)
+    table.to_csv(args.out.replace('.json', '_candidates.csv'), index=False)
+    print(f"Mejor plan: {best} (guardado en {args.out})")
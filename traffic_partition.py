@@ -0,0 +1,254 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from traffic_network import make_network, corridor_spec
+
+
+def region_bounds(network, regions):
+    """Dividir la calle principal en ``regions`` tramos con igual número de intersecciones.
+
+    Los bordes quedan a mitad de camino entre intersecciones vecinas (lejos de líneas de parada
+    y zonas de conflicto); el primer tramo empieza en -inf y el último termina en +inf.
+    """
+    xs = sorted(node.x for node in network.intersections)
+    regions = max(1, min(int(regions), len(xs)))
+    cuts = [round(k * len(xs) / regions) for k in range(1, regions)]
+    edges = [(xs[c - 1] + xs[c]) / 2 for c in cuts]
+    lows = [-math.inf] + edges
+    highs = edges + [math.inf]
+    return list(zip(lows, highs))
+
+
+def _region_path(path, k):
+    root, ext = os.path.splitext(path)
+    return f"{root}.region{k}{ext}"
+
+
+def _make_region_model():
+    # La clase se arma al usarla: traffic_sim_json importa agentpy (y con él pandas)
+    from traffic_sim_json import ThreeTIntersectionModel
+
+    class RegionModel(ThreeTIntersectionModel):
+        """Modelo de una región: solo simula los autos con x en [lo, hi).
+
+        Sortea el calendario de arribos completo (misma semilla en todas las regiones) y crea
+        solo los que aparecen en su tramo; antes de los arribos inserta los autos que entran
+        desde las regiones vecinas y después agrega los fantasmas del borde. Los semáforos ven
+        las colas de toda la red (sumadas por el coordinador al final del tick anterior, también
+        las cuentas por semáforo de 'max_pressure'), así que todas las regiones llevan el mismo
+        estado de luces.
+        """
+
+        def setup(self):
+            super().setup()
+            self.lo, self.hi = self.p['region_bounds']
+            self.incoming = None
+            self.ghosts = None
+            self.shared_queues = None
+            self.shared_counts = None
+
+        def spawn_arrivals(self):
+            fleet, routes = self.fleet, self.routes
+            if self.incoming is not None:
+                fleet.insert(self.incoming)
+            for origin, turn, target in self.arrivals.tick():
+                x = routes.spawn_pos[routes.lookup(origin, turn, target).id][0]
+                if self.lo <= x < self.hi:
+                    fleet.spawn(origin, turn, target)
+                    # El índice en el arreglo no es único entre regiones; el serial global sí
+                    fleet.car_id[fleet.n - 1] = f"{origin}_{self.t}_{self.n_spawned}"
+                    self.spawn_counts[origin] += 1
+                self.n_spawned += 1
+            if self.ghosts is not None:
+                fleet.append_ghosts(self.ghosts)
+
+        def queues_by_dir(self):
+            if self.shared_queues is not None:
+                return dict(self.shared_queues)
+            return super().queues_by_dir()
+
+        def signal_counts(self):
+            if self.shared_counts is not None:
+                return self.shared_counts
+            return super().signal_counts()
+
+    return RegionModel
+
+
+def _region_worker(conn, p, k, halo):
+    """Proceso de una región: un tick por mensaje del coordinador"""
+    if 'seed' in p:
+        np.random.seed(p['seed'])     # solo lo usa 'arrivals': 'legacy'
+    model = _make_region_model()(p)
+    model.sim_setup()
+    fleet = model.fleet
+    lo, hi = p['region_bounds']
+    busy = 0.0
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        model.incoming, model.ghosts, model.shared_queues, model.shared_counts = msg
+        t0 = time.perf_counter()
+        model.sim_step()
+        fleet.drop_ghosts()
+        # Cuentas por semáforo de los autos propios, antes de pasar los que cruzaron el borde
+        counts = model.ctrl.counts(*model.stopped_cars()) if model.ctrl.policy == 'max_pressure' else None
+
+        n = fleet.n
+        x = fleet.pos[:n, 0]
+        left, right = np.flatnonzero(x < lo), np.flatnonzero(x >= hi)
+        out_left, out_right = fleet.rows(left), fleet.rows(right)
+        fleet.remove(np.concatenate([left, right]))
+        n = fleet.n
+        x = fleet.pos[:n, 0]
+        halo_left = fleet.rows(np.flatnonzero(x < lo + halo)) if lo > -math.inf else None
+        halo_right = fleet.rows(np.flatnonzero(x >= hi - halo)) if hi < math.inf else None
+        busy += time.perf_counter() - t0
+        conn.send((out_left, out_right, halo_left, halo_right, fleet.queues, counts))
+    model.end()
+    conn.send({
+        'bounds': (lo, hi),
+        'metrics': {key: model.metrics[key] for key in ('throughput', 'delay_sum', 'delay_count')},
+        'spawn_counts': model.spawn_counts,
+        'delays': model.online.delays if model.online is not None else None,
+        'by_intersection': model.online.by_intersection if model.online is not None else None,
+        'busy_s': busy,
+        't': model.t,
+    })
+    conn.close()
+
+
+def _merge(parts):
+    parts = [r for r in parts if r is not None and len(r['serial'])]
+    if not parts:
+        return None
+    return {name: np.concatenate([r[name] for r in parts]) for name in parts[0]}
+
+
+def run_partitioned(p, regions=None, halo=None):
+    """Simular la red de ``p`` repartida en regiones a lo largo de la calle principal.
+
+    Cada región corre en su propio proceso con el motor vectorizado y sin grabar pasos. Por
+    tick, el coordinador recibe de cada región los autos que cruzaron sus bordes y los que están
+    a menos de ``halo`` metros de ellos, y los reparte: los primeros pasan a la región vecina y
+    los segundos se le agregan como fantasmas para el headway y la revisión de conflictos.
+
+    Con una sola región el resultado es el del motor vectorizado en un proceso. Con varias, los
+    autos de un lado del borde ven a los del otro en su posición del inicio del tick (no la ya
+    avanzada), así que las cifras pueden diferir levemente. Devuelve el resumen de la corrida con
+    el formato de ``get_summary_stats`` más el detalle por región.
+    """
+    p = dict(p, engine='vector', recorder='null')
+    network = make_network(p)
+    p['network'] = network.spec
+    origins = network.origins
+    bounds = region_bounds(network, regions or os.cpu_count() or 1)
+    if halo is None:
+        # Avance de un tick más la ventana de conflicto de la calle principal (15 m)
+        halo = 2 * float(p['v_free']) + 15.0
+
+    workers = []
+    for k, b in enumerate(bounds):
+        q = dict(p, region_bounds=b)
+        if q.get('trips'):
+            q['trips_path'] = _region_path(q.get('trips_path', 'three_t_intersection_trips.csv'), k)
+        parent, child = mp.Pipe()
+        proc = mp.Process(target=_region_worker, args=(child, q, k, halo), daemon=True)
+        proc.start()
+        # Solo el proceso hijo usa su extremo: si muere, recv() del coordinador da EOFError
+        child.close()
+        workers.append((parent, proc))
+
+    steps = int(p.get('steps', 600))
+    n = len(workers)
+    incoming, ghosts = [None] * n, [None] * n
+    shared = {o: 0 for o in origins}
+    counts = None
+    qmax = {o: 0 for o in origins}
+    migrations = 0
+    t0 = time.perf_counter()
+    try:
+        # agentpy avanza t de a 2 por tick (sim_step y step), igual que en ThreeTIntersectionModel.run
+        for _ in range(math.ceil(steps / 2)):
+            for k, (conn, _) in enumerate(workers):
+                conn.send((incoming[k], ghosts[k], shared, counts))
+            replies = [conn.recv() for conn, _ in workers]
+            shared = {o: sum(r[4][o] for r in replies) for o in origins}
+            if replies[0][5] is not None:
+                counts = sum(r[5] for r in replies)
+            for o in origins:
+                qmax[o] = max(qmax[o], shared[o])
+            for k in range(n):
+                left = replies[k + 1] if k + 1 < n else None
+                right = replies[k - 1] if k > 0 else None
+                incoming[k] = _merge([left and left[0], right and right[1]])
+                # Fantasmas: autos vecinos cerca del borde y los propios que recién lo cruzaron
+                ghosts[k] = _merge([left and left[2], right and right[3], replies[k][0], replies[k][1]])
+                migrations += 0 if incoming[k] is None else len(incoming[k]['serial'])
+        for conn, _ in workers:
+            conn.send(None)
+        results = [conn.recv() for conn, _ in workers]
+    finally:
+        for conn, proc in workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+    wall = time.perf_counter() - t0
+
+    throughput = sum(r['metrics']['throughput'] for r in results)
+    delay_sum = sum(r['metrics']['delay_sum'] for r in results)
+    delay_count = sum(r['metrics']['delay_count'] for r in results)
+    stats = {
+        'total_timesteps': results[0]['t'],
+        'total_cars_processed': throughput,
+        'average_delay': delay_sum / max(delay_count, 1),
+        'max_queues': qmax,
+        'spawn_counts': {o: sum(r['spawn_counts'][o] for r in results) for o in origins},
+    }
+    if results[0]['delays'] is not None:
+        delays = results[0]['delays']
+        for r in results[1:]:
+            delays.merge(r['delays'])
+        summary = delays.summary()
+        stats['delay_quantiles'] = {key: summary[key] for key in ('p50', 'p95', 'p99')}
+        by_intersection = sum(r['by_intersection'] for r in results)
+        stats['throughput_by_intersection'] = dict(zip(network.ids + ('through',), by_intersection.tolist()))
+    stats['partition'] = {
+        'regions': [{'bounds': list(r['bounds']), 'throughput': r['metrics']['throughput'],
+                     'busy_s': r['busy_s']} for r in results],
+        'halo': halo,
+        'migrations': migrations,
+        'wall_s': wall,
+    }
+    return stats
+
+
+if __name__ == "__main__":
+    from traffic_sim_json import params
+
+    parser = argparse.ArgumentParser(description="Corredor de intersecciones en T repartido en procesos")
+    parser.add_argument('--network', help='red en JSON (por defecto un corredor de --corridor intersecciones)')
+    parser.add_argument('--corridor', type=int, default=48)
+    parser.add_argument('--regions', type=int, default=None)
+    parser.add_argument('--steps', type=int, default=params['steps'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--halo', type=float, default=None)
+    parser.add_argument('--out', default='partition_stats.json')
+    args = parser.parse_args()
+
+    p = dict(params, steps=args.steps, seed=args.seed,
+             network=args.network or corridor_spec(args.corridor))
+    stats = run_partitioned(p, regions=args.regions, halo=args.halo)
+    part = stats['partition']
+    print(f"{len(part['regions'])} regiones, {part['migrations']} cruces de borde, {part['wall_s']:.2f}s")
+    print(f"Autos procesados: {stats['total_cars_processed']}, demora promedio: {stats['average_delay']:.2f}s")
+    with open(args.out, 'w') as f:
+        json.dump(stats, f, indent=2)
+    print(f"Resumen guardado en {args.out}")
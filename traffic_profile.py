@@ -0,0 +1,95 @@
+import json
+from time import perf_counter_ns
+
+# Fases de ThreeTIntersectionModel.step, en orden
+STEP_PHASES = ('spawn', 'signals', 'index', 'cars', 'metrics', 'capture', 'cleanup')
+
+
+class PhaseProfiler:
+    """Tiempos acumulados por fase de cada tick, con contadores enteros.
+
+    ``start()`` al inicio del tick y ``mark(fase)`` al terminar cada fase: cada marca es una
+    lectura de ``perf_counter_ns`` y una suma, así que puede quedar activo en corridas normales.
+    ``wrap()`` mide sub-fases reemplazando un método de una instancia (solo con detalle activo,
+    porque agrega una llamada por auto).
+    """
+
+    def __init__(self):
+        self.phases = {}        # fase -> [llamadas, ns]
+        self.subphases = {}     # sub-fase -> [llamadas, ns]
+        self.ticks = 0
+        self.last = 0
+
+    def start(self):
+        self.ticks += 1
+        self.last = perf_counter_ns()
+
+    def mark(self, name):
+        now = perf_counter_ns()
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = [0, 0]
+        entry[0] += 1
+        entry[1] += now - self.last
+        self.last = now
+
+    def wrap(self, obj, attr, name):
+        """Medir cada llamada a ``obj.attr`` como la sub-fase ``name``"""
+        fn = getattr(obj, attr)
+        entry = self.subphases.setdefault(name, [0, 0])
+
+        def timed(*args, **kwargs):
+            t0 = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                entry[0] += 1
+                entry[1] += perf_counter_ns() - t0
+
+        setattr(obj, attr, timed)
+
+    def report(self):
+        """Resumen por fase: llamadas, segundos totales, µs por llamada y fracción del tick"""
+        total = sum(ns for _, ns in self.phases.values())
+
+        def rows(table, reference):
+            return {name: {'calls': calls,
+                           'total_s': ns / 1e9,
+                           'mean_us': ns / 1e3 / max(calls, 1),
+                           'share': ns / reference if reference else 0.0}
+                    for name, (calls, ns) in table.items()}
+
+        ordered = {name: self.phases[name] for name in STEP_PHASES if name in self.phases}
+        ordered.update({k: v for k, v in self.phases.items() if k not in ordered})
+        report = {
+            'ticks': self.ticks,
+            'total_s': total / 1e9,
+            'tick_mean_us': total / 1e3 / max(self.ticks, 1),
+            'phases': rows(ordered, total),
+        }
+        if self.subphases:
+            # Fracción respecto de la fase 'cars', que las contiene
+            report['subphases'] = rows(self.subphases, self.phases.get('cars', [0, 0])[1])
+        return report
+
+
+def instrument_cars(profiler, model):
+    """Sub-fases del avance de autos: headway, conflictos y actualización de índices (o las
+    etapas del motor vectorizado)"""
+    if model.fleet is not None:
+        for attr, name in (('_maneuver', 'maneuver'), ('_conflicts', 'conflicts'), ('_gaps', 'headway')):
+            profiler.wrap(model.fleet, attr, name)
+        return
+    profiler.wrap(model.lanes, 'leader', 'headway')
+    profiler.wrap(model.main_street, 'incoming', 'conflicts')
+    profiler.wrap(model.lanes, 'move', 'lane_index')
+    profiler.wrap(model.main_street, 'move', 'main_street_index')
+
+
+def write_profile_report(model, path='three_t_intersection_profile.json'):
+    """Guardar el perfil de la corrida junto a las estadísticas (si el modelo lo tiene activo)"""
+    if getattr(model, 'profiler', None) is None:
+        return None
+    with open(path, 'w') as f:
+        json.dump(model.profiler.report(), f, indent=2)
+    return path
@@ -0,0 +1,702 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+from traffic_engine import ORIGINS, TURNS, INTERSECTIONS, STATES, NO_TARGET, TURN_CODE, STATE_CODE
+from traffic_client import send_frame, end_stream, connect_to_unity
+
+# Pasos entre keyframes completos de DeltaEncoder (default de 'keyframe_every' en params)
+KEYFRAME_EVERY = 50
+
+
+class MemoryRecorder:
+    """Conserva todos los pasos en memoria (comportamiento original de movement_data)"""
+
+    columnar = False
+
+    def __init__(self, network=None):
+        self.frames = []
+        self.network = network
+
+    def __len__(self):
+        return len(self.frames)
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        pass
+
+    def to_json(self):
+        return json.dumps(self.frames, indent=2)
+
+    def table(self):
+        """Pasos grabados como columnas (``FrameTable``), sin pasar por JSON"""
+        return FrameTable.from_frames(self.frames, self.network)
+
+
+class DeltaEncoder:
+    """Codifica pasos como keyframes completos cada ``keyframe_every`` pasos y deltas entre ellos.
+
+    Un keyframe es el paso tal cual (mismo esquema que la exportación JSON). Un delta lleva
+    ``"delta": 1`` y solo lo que cambió respecto al paso anterior: ``lights`` (semáforos que
+    cambiaron), ``move`` (``[k, x, y]`` de autos que solo cambiaron de posición), ``update``
+    (``[k, {campos cambiados}]``), ``remove`` (``[k, ...]`` retirados) y ``add`` (autos nuevos
+    completos, al final de la lista). ``k`` es el índice del auto en la lista del paso anterior.
+    """
+
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = max(int(keyframe_every), 1)
+        self.count = 0
+        self.lights = None
+        self.cars = {}      # id -> (índice en el paso anterior, auto)
+
+    def encode(self, frame):
+        keyframe = self.count % self.keyframe_every == 0
+        self.count += 1
+        if keyframe:
+            msg = frame
+        else:
+            msg = {'timestep': frame['timestep'], 'delta': 1}
+            lights = {d: s for d, s in frame['traffic_lights'].items() if self.lights.get(d) != s}
+            if lights:
+                msg['lights'] = lights
+            seen, added, moved, updated = set(), [], [], []
+            for car in frame['cars']:
+                prev = self.cars.get(car['id'])
+                if prev is None:
+                    added.append(car)
+                    continue
+                k, prev = prev
+                seen.add(k)
+                changed = {f: v for f, v in car.items() if prev[f] != v}
+                pos = changed.pop('position', None)
+                if changed:
+                    if pos is not None:
+                        changed['position'] = pos
+                    updated.append([k, changed])
+                elif pos is not None:
+                    moved.append([k, pos['x'], pos['y']])
+            if len(seen) < len(self.cars):
+                msg['remove'] = [k for k in range(len(self.cars)) if k not in seen]
+            if moved:
+                msg['move'] = moved
+            if updated:
+                msg['update'] = updated
+            if added:
+                msg['add'] = added
+        self.lights = dict(frame['traffic_lights'])
+        self.cars = {car['id']: (k, car) for k, car in enumerate(frame['cars'])}
+        return msg
+
+
+class DeltaDecoder:
+    """Reconstruye pasos completos a partir de keyframes y deltas de ``DeltaEncoder``"""
+
+    def __init__(self):
+        self.lights = {}
+        self.cars = []
+
+    def decode(self, msg):
+        if not msg.get('delta'):
+            self.lights = dict(msg['traffic_lights'])
+            self.cars = list(msg['cars'])
+            return msg
+        self.lights.update(msg.get('lights', {}))
+        cars = list(self.cars)
+        for k, x, y in msg.get('move', ()):
+            cars[k] = dict(cars[k], position={'x': x, 'y': y})
+        for k, changed in msg.get('update', ()):
+            cars[k] = dict(cars[k], **changed)
+        if 'remove' in msg:
+            removed = set(msg['remove'])
+            cars = [c for k, c in enumerate(cars) if k not in removed]
+        cars.extend(msg.get('add', ()))
+        self.cars = cars
+        return {'timestep': msg['timestep'], 'traffic_lights': dict(self.lights), 'cars': list(cars)}
+
+
+def make_encoder(p):
+    """DeltaEncoder si ``p.delta_frames`` está activo, si no None (pasos completos)"""
+    if getattr(p, 'delta_frames', False):
+        return DeltaEncoder(getattr(p, 'keyframe_every', KEYFRAME_EVERY))
+    return None
+
+
+class NullRecorder:
+    """Descarta los pasos (corridas por lotes que solo necesitan las métricas)"""
+
+    columnar = False
+    discard = True      # el modelo ni siquiera arma los pasos
+
+    def __init__(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def write(self, frame):
+        self.count += 1
+
+    def close(self):
+        pass
+
+    def to_json(self):
+        raise RuntimeError("Corrida sin grabación de pasos ('recorder': 'null')")
+
+    def table(self):
+        raise RuntimeError("Corrida sin grabación de pasos ('recorder': 'null'): no hay tabla de pasos; "
+                           "usa 'recorder': 'columns', 'memory' o 'binary'")
+
+
+class NDJSONRecorder:
+    """Escribe cada paso a disco como una línea JSON en cuanto se produce.
+
+    La memoria queda acotada por ``buffer_frames`` sin importar la duración de la corrida;
+    el archivo se vacía al sistema operativo cada ``flush_every`` pasos.
+    """
+
+    columnar = False
+
+    def __init__(self, path, buffer_frames=64, flush_every=256, encoder=None, network=None):
+        self.path = path
+        self.encoder = encoder
+        self.network = network
+        self.buffer_frames = max(int(buffer_frames), 1)
+        self.flush_every = max(int(flush_every), 1)
+        self.file = open(path, 'w', encoding='utf-8')
+        self.buffer = []
+        self.count = 0
+        self.bytes_written = 0
+
+    def __len__(self):
+        return self.count
+
+    def write(self, frame):
+        if self.encoder is not None:
+            frame = self.encoder.encode(frame)
+        self.buffer.append(json.dumps(frame, separators=(',', ':')))
+        self.count += 1
+        if len(self.buffer) >= self.buffer_frames:
+            self._drain()
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+    def _drain(self):
+        if self.buffer:
+            data = '\n'.join(self.buffer) + '\n'
+            self.file.write(data)
+            self.bytes_written += len(data)
+            self.buffer.clear()
+
+    def close(self):
+        if not self.file.closed:
+            self._drain()
+            self.file.close()
+
+    def to_json(self):
+        """Arreglo JSON con todos los pasos, armado desde el archivo sin volver a parsearlo"""
+        if not self.file.closed:
+            self._drain()
+            self.file.flush()
+        if self.encoder is not None:
+            return json.dumps(list(read_frames(self.path)), indent=2)
+        with open(self.path, encoding='utf-8') as f:
+            return '[' + ','.join(line.rstrip('\n') for line in f if line.strip()) + ']'
+
+    def table(self):
+        if not self.file.closed:
+            self._drain()
+            self.file.flush()
+        return FrameTable.from_frames(read_frames(self.path), self.network)
+
+
+class StreamRecorder:
+    """Envía cada paso a Unity como frame con prefijo de longitud en cuanto se produce.
+
+    No conserva los pasos; si se pasa ``sink`` (otro grabador) también se graban ahí,
+    para poder exportar la corrida al terminar. Con ``encoder`` se envían deltas.
+    """
+
+    columnar = False
+
+    def __init__(self, sock, sink=None, encoder=None):
+        self.sock = sock
+        self.sink = sink
+        self.encoder = encoder
+        self.count = 0
+        self.bytes_sent = 0
+        self.closed = False
+
+    def __len__(self):
+        return self.count
+
+    def write(self, frame):
+        msg = frame if self.encoder is None else self.encoder.encode(frame)
+        data = json.dumps(msg, separators=(',', ':')).encode('utf-8')
+        send_frame(self.sock, data)
+        self.bytes_sent += len(data) + 4
+        self.count += 1
+        if self.sink is not None:
+            self.sink.write(frame)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            end_stream(self.sock)
+        if self.sink is not None:
+            self.sink.close()
+
+    def to_json(self):
+        if self.sink is None:
+            raise RuntimeError("El stream a Unity no conserva los pasos; usa 'stream_keep': True")
+        return self.sink.to_json()
+
+    def table(self):
+        if self.sink is None:
+            raise RuntimeError("El stream a Unity no conserva los pasos; usa 'stream_keep': True")
+        return self.sink.table()
+
+
+def read_frames(path, raw=False):
+    """Iterar los pasos de un archivo NDJSON uno a uno (los deltas se expanden salvo ``raw``)"""
+    decoder = DeltaDecoder()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                msg = json.loads(line)
+                yield msg if raw else decoder.decode(msg)
+
+
+# Formato binario columnar: un archivo crudo por columna más meta.json con el esquema.
+# Columnas por auto y paso (una fila por auto activo):
+ROW_COLUMNS = {
+    'car': 'int32',                 # índice del auto en car_ids.txt (orden de aparición)
+    'x': 'float32', 'y': 'float32',
+    'dx': 'int8', 'dy': 'int8',
+    'state': 'int8', 'origin': 'int8', 'original_origin': 'int8',
+    'turn': 'int8', 'target_intersection': 'int8', 'turned': 'int8',
+    'wait': 'int32',
+}
+LIGHT_STATES = ('R', 'G', 'Y', 'AR')
+LIGHT_CODE = {s: i for i, s in enumerate(LIGHT_STATES)}
+
+
+def network_codes(network=None):
+    """Vocabularios de los códigos grabados; orígenes e intersecciones salen de la red si se pasa"""
+    return {'origin': tuple(network.origins) if network is not None else ORIGINS,
+            'state': STATES, 'turn': TURNS,
+            'target_intersection': tuple(network.ids) if network is not None else INTERSECTIONS,
+            'light': LIGHT_STATES}
+
+# En memoria las posiciones se conservan en float64 (reconstrucción exacta del JSON)
+TABLE_DTYPES = {'x': 'float64', 'y': 'float64'}
+
+
+class BinaryRecorder:
+    """Escribe cada paso en columnas binarias de ancho fijo, legibles con ``numpy.memmap``.
+
+    Por paso: ``timestep`` (int32), ``offsets`` (int64, fila inicial del paso) y ``lights``
+    (int8 por dirección). Por fila: las columnas de ``ROW_COLUMNS``. Las posiciones se guardan
+    en float32; los textos (origen, estado, giro...) como códigos cuyo vocabulario va en meta.json.
+    """
+
+    columnar = True
+
+    def __init__(self, path, buffer_frames=64, network=None):
+        self.path = path
+        self.buffer_frames = max(int(buffer_frames), 1)
+        self.codes = network_codes(network)
+        if max(len(self.codes['origin']), len(self.codes['target_intersection'])) > 127:
+            raise ValueError("El formato binario guarda orígenes e intersecciones en int8 (máximo 127)")
+        os.makedirs(path, exist_ok=True)
+        self.files = {name: open(os.path.join(path, f'{name}.bin'), 'wb')
+                      for name in list(ROW_COLUMNS) + ['timestep', 'offsets', 'lights']}
+        self.ids_file = open(os.path.join(path, 'car_ids.txt'), 'w', encoding='utf-8')
+        self.pending = {name: [] for name in self.files}
+        self.count = 0
+        self.n_rows = 0
+        self.n_cars = 0
+        self.bytes_written = 0
+        self.pending['offsets'].append(np.zeros(1, dtype='int64'))
+
+    def __len__(self):
+        return self.count
+
+    def write_columns(self, timestep, lights, cols):
+        car = np.asarray(cols['car'], dtype='int32')
+        # Registrar los autos nuevos (los índices crecen en orden de aparición)
+        new = np.flatnonzero(car >= self.n_cars)
+        if len(new):
+            ids = {int(car[k]): str(cols['id'][k]) for k in new}
+            last = max(ids)
+            self.ids_file.write(''.join(ids.get(i, '') + '\n' for i in range(self.n_cars, last + 1)))
+            self.n_cars = last + 1
+
+        for name, dtype in ROW_COLUMNS.items():
+            self.pending[name].append(np.asarray(cols[name]).astype(dtype))
+        self.n_rows += len(car)
+        self.pending['timestep'].append(np.array([timestep], dtype='int32'))
+        self.pending['offsets'].append(np.array([self.n_rows], dtype='int64'))
+        self.pending['lights'].append(np.array([LIGHT_CODE[lights.get(o, 'G')] for o in self.codes['origin']],
+                                               dtype='int8'))
+        self.count += 1
+        if self.count % self.buffer_frames == 0:
+            self._drain()
+
+    def _drain(self):
+        for name, chunks in self.pending.items():
+            if chunks:
+                data = np.concatenate(chunks).tobytes()
+                self.files[name].write(data)
+                self.bytes_written += len(data)
+                chunks.clear()
+
+    def close(self):
+        if self.ids_file.closed:
+            return
+        self._drain()
+        for f in self.files.values():
+            f.close()
+        self.ids_file.close()
+        meta = {
+            'format': 'three_t_traj', 'version': 1,
+            'n_ticks': self.count, 'n_rows': self.n_rows, 'n_cars': self.n_cars,
+            'columns': dict(ROW_COLUMNS, timestep='int32', offsets='int64', lights='int8'),
+            'codes': self.codes,
+            'light_dirs': self.codes['origin'],
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def to_json(self):
+        return json.dumps(list(self.table().frames()), indent=2)
+
+    def table(self):
+        self.close()
+        return Trajectory(self.path)
+
+
+class ColumnRecorder:
+    """Graba cada paso como columnas NumPy en memoria, sin armar los dicts por auto.
+
+    ``table()`` entrega los pasos como ``FrameTable`` para análisis por lote; ``to_json()``
+    reconstruye el mismo JSON que ``MemoryRecorder`` solo si se pide.
+    """
+
+    columnar = True
+
+    def __init__(self, network=None):
+        self.codes = network_codes(network)
+        self.chunks = {name: [] for name in ROW_COLUMNS}
+        self.timesteps, self.offsets, self.lights = [], [0], []
+        self.car_ids = []
+        self.count = 0
+        self._table = None
+
+    def __len__(self):
+        return self.count
+
+    def write_columns(self, timestep, lights, cols):
+        car = np.asarray(cols['car'], dtype='int32')
+        new = np.flatnonzero(car >= len(self.car_ids))
+        if len(new):
+            ids = {int(car[k]): str(cols['id'][k]) for k in new}
+            self.car_ids.extend(ids.get(i, '') for i in range(len(self.car_ids), max(ids) + 1))
+        for name, dtype in ROW_COLUMNS.items():
+            self.chunks[name].append(np.asarray(cols[name]).astype(TABLE_DTYPES.get(name, dtype)))
+        self.timesteps.append(timestep)
+        self.offsets.append(self.offsets[-1] + len(car))
+        self.lights.append([LIGHT_CODE[lights.get(o, 'G')] for o in self.codes['origin']])
+        self.count += 1
+
+    def close(self):
+        pass
+
+    def table(self):
+        if self._table is None or len(self._table) != self.count:
+            columns = {name: np.concatenate(chunks) if chunks else np.zeros(0, TABLE_DTYPES.get(name, dtype))
+                       for (name, dtype), chunks in zip(ROW_COLUMNS.items(), self.chunks.values())}
+            self._table = FrameTable(self.timesteps, self.offsets, self.lights, columns, self.car_ids, self.codes)
+        return self._table
+
+    def to_json(self):
+        return json.dumps(list(self.table().frames()), indent=2)
+
+
+class FrameColumns:
+    """Pasos en columnas: ``timesteps``, ``offsets`` (fila inicial de cada paso), ``lights``
+    (pasos × direcciones, códigos) y una columna por campo de ``ROW_COLUMNS``.
+
+    Base común de ``Trajectory`` (memmap en disco) y ``FrameTable`` (en memoria); los análisis
+    trabajan sobre estas columnas con operaciones por lote en lugar de recorrer los pasos.
+    """
+
+    codes = network_codes()
+    light_dirs = ORIGINS
+
+    def __len__(self):
+        return len(self.timesteps)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def cars_per_tick(self):
+        return np.diff(self.offsets)
+
+    def tick_index(self):
+        """Índice de paso de cada fila"""
+        return np.repeat(np.arange(len(self)), self.cars_per_tick())
+
+    def counts_by(self, column):
+        """Matriz (pasos × códigos) con autos por código de ``column`` en cada paso"""
+        k = len(self.codes[column])
+        flat = np.bincount(self.tick_index() * k + self.columns[column], minlength=len(self) * k)
+        return flat.reshape(len(self), k)
+
+    def frame(self, i):
+        """Columnas (vistas) de las filas del paso ``i``"""
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return {name: col[a:b] for name, col in self.columns.items()}
+
+    def frames(self):
+        """Reconstruir los pasos con el mismo esquema que la exportación JSON"""
+        origins, states = self.codes['origin'], self.codes['state']
+        turns, targets, light_states = self.codes['turn'], self.codes['target_intersection'], self.codes['light']
+        ids = self.car_ids
+        for i in range(len(self)):
+            c = {name: col.tolist() for name, col in self.frame(i).items()}
+            yield {
+                'timestep': int(self.timesteps[i]),
+                'traffic_lights': {d: light_states[s] for d, s in zip(self.light_dirs, self.lights[i].tolist())},
+                'cars': [{
+                    'id': ids[c['car'][k]],
+                    'origin': origins[c['origin'][k]],
+                    'original_origin': origins[c['original_origin'][k]],
+                    'position': {'x': c['x'][k], 'y': c['y'][k]},
+                    'direction': {'x': float(c['dx'][k]), 'y': float(c['dy'][k])},
+                    'state': states[c['state'][k]],
+                    'turn': turns[c['turn'][k]],
+                    'turned': bool(c['turned'][k]),
+                    'target_intersection': None if c['target_intersection'][k] == NO_TARGET
+                                           else targets[c['target_intersection'][k]],
+                    'wait_time': c['wait'][k]
+                } for k in range(len(c['car']))]
+            }
+
+    def dataframe(self):
+        """Una fila por auto y paso con los códigos ya traducidos (pandas se importa aquí)"""
+        import pandas as pd
+        c = self.columns
+        tick = self.tick_index()
+        df = pd.DataFrame({
+            'timestep': np.asarray(self.timesteps)[tick],
+            'id': np.asarray(self.car_ids, dtype=object)[np.asarray(c['car'], dtype=np.intp)],
+            'x': np.asarray(c['x'], dtype=float), 'y': np.asarray(c['y'], dtype=float),
+            'dx': np.asarray(c['dx'], dtype=float), 'dy': np.asarray(c['dy'], dtype=float),
+            'turned': np.asarray(c['turned'], dtype=bool), 'wait_time': np.asarray(c['wait']),
+        })
+        # Categóricas sobre los mismos códigos (NO_TARGET = -1 queda como NaN)
+        for name, vocab in (('origin', 'origin'), ('original_origin', 'origin'), ('state', 'state'),
+                            ('turn', 'turn'), ('target_intersection', 'target_intersection')):
+            df[name] = pd.Categorical.from_codes(np.asarray(c[name], dtype=np.int64), self.codes[vocab])
+        return df
+
+
+class Trajectory(FrameColumns):
+    """Trayectorias binarias abiertas con ``numpy.memmap``: carga inmediata, sin parseo"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.codes = self.meta['codes']
+        self.light_dirs = self.meta['light_dirs']
+        cols = self.meta['columns']
+        self.timesteps = self._column('timestep', cols['timestep'])
+        self.offsets = self._column('offsets', cols['offsets'])
+        self.lights = self._column('lights', cols['lights']).reshape(-1, len(self.light_dirs))
+        self.columns = {name: self._column(name, cols[name]) for name in ROW_COLUMNS}
+        self._car_ids = None
+
+    def _column(self, name, dtype):
+        file = os.path.join(self.path, f'{name}.bin')
+        if os.path.getsize(file) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file, dtype=dtype, mode='r')
+
+    @property
+    def car_ids(self):
+        if self._car_ids is None:
+            with open(os.path.join(self.path, 'car_ids.txt'), encoding='utf-8') as f:
+                self._car_ids = f.read().splitlines()
+        return self._car_ids
+
+
+class FrameTable(FrameColumns):
+    """Pasos en columnas NumPy en memoria (misma interfaz que ``Trajectory``)"""
+
+    def __init__(self, timesteps, offsets, lights, columns, car_ids, codes=None):
+        if codes is not None:
+            self.codes, self.light_dirs = codes, codes['origin']
+        self.timesteps = np.asarray(timesteps, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lights = np.asarray(lights, dtype=np.int8).reshape(-1, len(self.light_dirs))
+        self.columns = columns
+        self.car_ids = car_ids
+
+    @classmethod
+    def from_frames(cls, frames, network=None):
+        """Armar las columnas recorriendo una sola vez los pasos con el esquema de la exportación"""
+        codes = network_codes(network)
+        origin_code = {o: i for i, o in enumerate(codes['origin'])}
+        intersection_code = {x: i for i, x in enumerate(codes['target_intersection'])}
+        index, car_ids = {}, []
+        timesteps, offsets, lights = [], [0], []
+        rows = {name: [] for name in ROW_COLUMNS}
+        car, x, y, dx, dy = rows['car'], rows['x'], rows['y'], rows['dx'], rows['dy']
+        state, origin, original = rows['state'], rows['origin'], rows['original_origin']
+        turn, target, turned, wait = rows['turn'], rows['target_intersection'], rows['turned'], rows['wait']
+        for frame in frames:
+            timesteps.append(frame['timestep'])
+            L = frame['traffic_lights']
+            lights.append([LIGHT_CODE[L.get(o, 'G')] for o in codes['origin']])
+            for c in frame['cars']:
+                k = index.get(c['id'])
+                if k is None:
+                    k = index[c['id']] = len(car_ids)
+                    car_ids.append(c['id'])
+                car.append(k)
+                pos, d = c['position'], c['direction']
+                x.append(pos['x']); y.append(pos['y'])
+                dx.append(d['x']); dy.append(d['y'])
+                state.append(STATE_CODE[c['state']])
+                origin.append(origin_code[c['origin']])
+                original.append(origin_code[c.get('original_origin', c['origin'])])
+                turn.append(TURN_CODE[c['turn']])
+                t = c.get('target_intersection')
+                target.append(NO_TARGET if t is None else intersection_code[t])
+                turned.append(c['turned'])
+                wait.append(c['wait_time'])
+            offsets.append(len(car))
+        columns = {name: np.asarray(rows[name], dtype=TABLE_DTYPES.get(name, dtype))
+                   for name, dtype in ROW_COLUMNS.items()}
+        return cls(timesteps, offsets, np.asarray(lights, dtype=np.int8), columns, car_ids, codes)
+
+
+# Registros de viaje: una fila por auto cuando se retira (tamaño O(autos), no O(autos × ticks))
+TRIP_COLUMNS = ('car_id', 'original_origin', 'origin', 'turn', 'target_intersection',
+                'spawn_t', 'exit_t', 'wait')
+
+
+class TripRecorder:
+    """Escribe un registro por auto al llegar a su meta, por bloques a CSV.
+
+    Las filas llegan como columnas codificadas (una llamada por tick con todos los autos que
+    terminaron) y se decodifican y escriben de a ``buffer_rows``. Sin ``path`` se conservan en
+    memoria. ``count`` y ``wait_sum`` se acumulan al registrar cada fila, así el resumen de la
+    corrida sale de los viajes sin releer el archivo.
+    """
+
+    def __init__(self, path=None, buffer_rows=4096, network=None):
+        self.path = path
+        self.codes = network_codes(network)
+        self.buffer_rows = max(int(buffer_rows), 1)
+        self.pending = {name: [] for name in TRIP_COLUMNS}
+        self.n_pending = 0
+        self.count = 0
+        self.wait_sum = 0
+        self.file = None
+        if path is not None:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(TRIP_COLUMNS)
+
+    def __len__(self):
+        return self.count
+
+    def write(self, cols):
+        n = len(cols['car_id'])
+        if n == 0:
+            return
+        for name in TRIP_COLUMNS:
+            self.pending[name].append(np.asarray(cols[name]))
+        self.n_pending += n
+        self.count += n
+        self.wait_sum += int(np.sum(cols['wait']))
+        if self.file is not None and self.n_pending >= self.buffer_rows:
+            self._drain()
+
+    def columns(self):
+        """Columnas pendientes concatenadas (todos los viajes si no hay ``path``)"""
+        out = {}
+        for name in TRIP_COLUMNS:
+            chunks = self.pending[name]
+            out[name] = np.concatenate(chunks) if chunks else np.empty(0, dtype=object if name == 'car_id' else int)
+        return out
+
+    def _drain(self):
+        if not self.n_pending:
+            return
+        cols = self.columns()
+        origins, turns = np.array(self.codes['origin']), np.array(TURNS)
+        targets = np.array(self.codes['target_intersection'] + ('',))     # NO_TARGET (-1) -> ''
+        self.writer.writerows(zip(
+            cols['car_id'].tolist(),
+            origins[cols['original_origin']].tolist(),
+            origins[cols['origin']].tolist(),
+            turns[cols['turn']].tolist(),
+            targets[cols['target_intersection']].tolist(),
+            cols['spawn_t'].tolist(), cols['exit_t'].tolist(), cols['wait'].tolist()))
+        for chunks in self.pending.values():
+            chunks.clear()
+        self.n_pending = 0
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self._drain()
+            self.file.close()
+
+    def summary(self):
+        return {'total_cars_processed': self.count,
+                'average_delay': self.wait_sum / max(self.count, 1)}
+
+
+def read_trips(path):
+    """Leer un CSV de viajes como dict de columnas (texto tal cual, enteros convertidos)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    header, rows = rows[0], rows[1:]
+    cols = {name: [r[k] for r in rows] for k, name in enumerate(header)}
+    for name in ('spawn_t', 'exit_t', 'wait'):
+        cols[name] = np.array(cols[name], dtype=np.int64)
+    cols['target_intersection'] = [x or None for x in cols['target_intersection']]
+    return cols
+
+
+def make_recorder(p, network=None):
+    """Crear el grabador de pasos según ``p.recorder`` ('memory', 'columns', 'null', 'ndjson', 'binary' o 'unity')"""
+    kind = getattr(p, 'recorder', 'memory')
+    if not isinstance(kind, str):
+        return kind     # grabador ya construido (p. ej. traffic_server.HubRecorder)
+    if kind == 'memory':
+        return MemoryRecorder(network)
+    if kind == 'columns':
+        return ColumnRecorder(network)
+    if kind == 'null':
+        return NullRecorder()
+    if kind == 'ndjson':
+        return NDJSONRecorder(getattr(p, 'frames_path', 'three_t_intersection_data.ndjson'),
+                              buffer_frames=getattr(p, 'frame_buffer', 64),
+                              flush_every=getattr(p, 'flush_every', 256),
+                              encoder=make_encoder(p), network=network)
+    if kind == 'binary':
+        return BinaryRecorder(getattr(p, 'traj_path', 'three_t_intersection_data.traj'),
+                              buffer_frames=getattr(p, 'frame_buffer', 64), network=network)
+    if kind == 'unity':
+        sock = connect_to_unity(getattr(p, 'unity_host', '127.0.0.1'), getattr(p, 'unity_port', 1101))
+        return StreamRecorder(sock, sink=MemoryRecorder(network) if getattr(p, 'stream_keep', False) else None,
+                              encoder=make_encoder(p))
+    raise ValueError(f"Grabador desconocido: {kind}")
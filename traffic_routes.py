@@ -0,0 +1,302 @@
+import bisect
+
+import numpy as np
+
+from traffic_engine import TURN_CODE, NO_TARGET
+from traffic_network import MAIN_ORIGINS, MAIN_HEAD, SIDE_HEAD, RoadNetwork
+
+# Distancia a una stopline a la que el auto obedece su semáforo
+STOP_RADIUS = 8.0
+
+
+class Leg:
+    """Reglas de un tramo de la ruta (antes o después de girar)"""
+
+    __slots__ = ('origin', 'stops', 'stop_x', 'yield_x', 'main_y', 'street_x')
+
+    def __init__(self, origin, stops, yield_x, main_y, street_x):
+        self.origin = origin        # origen efectivo en este tramo
+        # Semáforos que obedece: (stopline, código de cabeza) ordenados por x
+        self.stops = tuple(sorted(stops, key=lambda s: s[0][0]))
+        self.stop_x = [s[0][0] for s in self.stops]
+        self.yield_x = yield_x      # x de la intersección donde cede el paso, o None
+        self.main_y = main_y        # carril (y) a mantener en la calle principal, o None
+        self.street_x = street_x    # carril (x) a mantener en una calle vertical, o None
+
+    def red_stop(self, pos, not_green):
+        """Cabeza de la primera stopline (por x) a menos de ``STOP_RADIUS`` de ``pos`` cuyo
+        semáforo no está en verde, o None"""
+        i = bisect.bisect_left(self.stop_x, pos[0] - STOP_RADIUS - 0.5)
+        for stop, head in self.stops[i:]:
+            if stop[0] > pos[0] + STOP_RADIUS + 0.5:
+                break
+            if np.linalg.norm(pos - stop) < STOP_RADIUS and not_green[head]:
+                return head
+        return None
+
+
+class Route:
+    """Constantes de una ruta: aparición, stopline, meta, giro y carriles de cada tramo"""
+
+    __slots__ = ('id', 'origin', 'turn', 'target', 'pos', 'dir', 'stopline', 'goal', 'center',
+                 'turn_distance', 'turn_distance_main', 'turn_dir', 'snap', 'legs')
+
+
+class RouteTable:
+    """Tabla de rutas compilada una vez por modelo a partir de la red (``RoadNetwork``).
+
+    Reemplaza las cadenas if/elif sobre origen, giro e intersección de ``Car.setup`` y
+    ``Car.step``: cada auto guarda su ``Route`` y en cada paso solo consulta
+    ``route.legs[turned]``. Las mismas constantes están en arreglos indexados por id de ruta
+    para el motor vectorizado. Las reglas dependen del lado (norte/sur) y del control de cada
+    intersección, no de su nombre, así que sirven para cualquier número de intersecciones.
+
+    Cada intersección con semáforo tiene su propia stopline en la calle principal, en los dos
+    sentidos: los autos de main_E y main_W obedecen la cabeza principal de cada intersección con
+    semáforo que cruzan (hasta la de su giro). Donde la red original usaba el único semáforo para
+    autos que no pasan por él (main_W que gira en una intersección sin semáforo, y los de una
+    calle norte recién llegados a la principal) se usa el semáforo más cercano.
+    """
+
+    def __init__(self, network):
+        if not isinstance(network, RoadNetwork):
+            network = RoadNetwork.from_params(network)     # params
+        self.network = net = network
+        L_main, L_vertical, w, R = net.L_main, net.L_vertical, net.w, net.radius
+        self.centers = [np.array([node.x, 0.0]) for node in net.intersections]
+        self.near_radius = R + 5
+        # Centros ordenados por x para buscar la intersección más cercana con bisect
+        self.center_x = sorted(node.x for node in net.intersections)
+        self._sorted_centers = [np.array([x, 0.0]) for x in self.center_x]
+
+        # Semáforos ordenados por x: main_E (hacia el oeste) se detiene en x + R/2 de cada uno,
+        # main_W (hacia el este) en x - R/2
+        signals = sorted(net.signalized, key=lambda s: s.x)
+
+        self.routes = []
+        self.index = {}
+        for origin, turn, target in self.route_keys(net):
+            r = Route()
+            r.id = len(self.routes)
+            r.origin, r.turn, r.target = origin, turn, target
+            node = net.by_origin.get(origin)                # calle lateral de origen, o None
+            t_node = None if target is None else net.by_id[target]
+
+            # Aparición, stopline y meta (mismos carriles que el diagrama). En la calle principal,
+            # las stoplines de los semáforos que cruza hasta su giro; ``stopline`` es la primera
+            main_stops = []
+            if origin == 'main_E':
+                r.pos, r.dir = np.array([+L_main, w/4]), np.array([-1, 0])
+                main_stops = [(np.array([s.x + R/2, 0]), net.head(s, MAIN_HEAD)) for s in signals
+                              if turn == 'S' or s.x >= t_node.x]
+                r.stopline = main_stops[-1][0] if main_stops else np.array([-L_main, 0])
+                r.goal = np.array([-L_main, 0]) if turn == 'S' else np.array([t_node.x, +L_vertical])
+            elif origin == 'main_W':
+                r.pos, r.dir = np.array([-L_main, -w/4]), np.array([+1, 0])
+                main_stops = [(np.array([s.x - R/2, 0]), net.head(s, MAIN_HEAD)) for s in signals
+                              if turn == 'S' or s.x <= t_node.x]
+                if turn == 'S':
+                    r.stopline = main_stops[0][0] if main_stops else np.array([+L_main, 0])
+                    r.goal = np.array([+L_main, 0])
+                else:
+                    r.stopline = np.array([t_node.x - R/2, 0])
+                    r.goal = np.array([t_node.x - w/4, -L_vertical])
+                    governing = net.nearest_signal(t_node)
+                    if t_node.control != 'signal' and governing is not None:
+                        # Gira en una intersección sin semáforo: espera en ella con la luz
+                        # principal del semáforo más cercano
+                        main_stops.append((r.stopline, net.head(governing, MAIN_HEAD)))
+            elif node.north:
+                r.pos, r.dir = np.array([node.x - w/4, +L_vertical + 10]), np.array([0, -1])
+                r.stopline = np.array([node.x, +R/2])
+                r.goal = np.array([-L_main, 0]) if turn == 'L' else np.array([+L_main, 0])
+            else:  # calle sur
+                r.pos, r.dir = np.array([node.x + w/4, -L_vertical - 10]), np.array([0, +1])
+                r.stopline = np.array([node.x, -R/2])
+                r.goal = np.array([-L_main, w/4]) if turn == 'L' else np.array([+L_main, -w/4])
+
+            # Giro: distancia al centro de la intersección a la que se ejecuta
+            r.center = None if target is None else np.array([t_node.x, 0])
+            r.turn_distance = r.turn_distance_main = R * 0.8
+            if node is not None and not node.north:
+                r.turn_distance, r.turn_distance_main = 3.0, 12.0   # 12 si |y| < 5 (ya en la calle principal)
+            elif node is not None:
+                r.turn_distance = r.turn_distance_main = 6.0
+            elif turn in ('L', 'R'):
+                r.turn_distance = r.turn_distance_main = 3.0
+
+            # Giro: nueva dirección, carril al que se ajusta y origen efectivo después
+            after = origin
+            r.turn_dir, r.snap = None, None
+            if turn == 'L':
+                if node is None:
+                    r.turn_dir = np.array([0, -1])
+                    if origin == 'main_W':
+                        r.snap = (0, t_node.x - w/4)     # carril izquierdo de la calle sur
+                    after = t_node.origin
+                else:
+                    r.turn_dir, r.snap = np.array([-1, 0]), (1, w/4)
+                    after = 'main_W' if node.north else origin
+            elif turn == 'R':
+                if origin == 'main_E':
+                    r.turn_dir = np.array([0, +1])
+                elif origin == 'main_W':
+                    r.turn_dir = np.array([0, -1])
+                    after = t_node.origin
+                else:
+                    r.turn_dir, r.snap = np.array([+1, 0]), (1, -w/4)
+                    after = 'main_E' if node.north else origin
+
+            r.legs = (self._leg(net, r, origin, origin, turn, False, main_stops),
+                      self._leg(net, r, after, origin, turn, True, main_stops))
+            self.routes.append(r)
+            self.index[(origin, turn, target)] = r
+            self.index.setdefault((origin, turn, None), r)
+
+        self._compile_arrays()
+
+    @staticmethod
+    def route_keys(net):
+        """Rutas posibles (origen, giro, intersección donde gira o None si sigue recto)"""
+        keys = [('main_E', 'S', None)]
+        keys += [('main_E', 'R', x) for x in net.north_targets()]
+        keys += [('main_W', 'S', None)]
+        keys += [('main_W', 'L', x) for x in net.south_targets()]
+        for node in net.intersections:
+            keys += [(node.origin, 'L', node.id), (node.origin, 'R', node.id)]
+        return keys
+
+    @staticmethod
+    def _leg(net, route, origin, original_origin, turn, turned, main_stops):
+        w = net.w
+        node = net.by_origin.get(origin)
+        home = net.by_origin.get(original_origin)
+        stops = ()
+        if node is not None:
+            # Calle lateral: su propio semáforo, en la stopline de la ruta
+            if node.control == 'signal':
+                stops = ((route.stopline, net.head(node, SIDE_HEAD)),)
+        elif home is None:
+            # Calle principal antes de girar (main_E que ya giró al norte no cruza más semáforos)
+            stops = () if turned else tuple(main_stops)
+        else:
+            # Lateral recién llegada a la calle principal: luz principal del semáforo más cercano
+            governing = net.nearest_signal(home)
+            if governing is not None:
+                stops = ((route.stopline, net.head(governing, MAIN_HEAD)),)
+        yield_x = node.x if node is not None and node.control == 'yield' else None
+        south = node is not None and not node.north
+
+        # Carril en la calle principal (|y| < 2)
+        main_y = None
+        if turned and south:
+            main_y = w/4 if turn == 'L' else -w/4
+        elif origin == 'main_E' and turn == 'S':
+            main_y = w/4
+        elif origin == 'main_W' and turn == 'S':
+            main_y = -w/4
+        elif turn in ('L', 'R') and not turned and origin in MAIN_ORIGINS:
+            main_y = w/4 if origin == 'main_E' else -w/4
+
+        # Carril en una calle vertical: las del norte solo usan el izquierdo; en las del sur los
+        # que vienen del oeste usan el izquierdo y los del sur el derecho
+        street_x = None
+        if node is not None and node.north:
+            street_x = node.x - w/4
+        elif south:
+            street_x = node.x - w/4 if original_origin == 'main_W' else node.x + w/4
+        return Leg(origin, stops, yield_x, main_y, street_x)
+
+    def _compile_arrays(self):
+        """Las mismas constantes como arreglos (ruta,) o (ruta, tramo) para el motor vectorizado"""
+        n = len(self.routes)
+        nan2 = (np.nan, np.nan)
+        self.spawn_pos = np.array([r.pos for r in self.routes], dtype=float)
+        self.spawn_dir = np.array([r.dir for r in self.routes], dtype=float)
+        self.stopline = np.array([r.stopline for r in self.routes], dtype=float)
+        self.goal = np.array([r.goal for r in self.routes], dtype=float)
+        origin_code, intersection_code = self.network.origin_code, self.network.intersection_code
+        self.origin = np.array([origin_code[r.origin] for r in self.routes], dtype=np.int16)
+        self.turn = np.array([TURN_CODE[r.turn] for r in self.routes], dtype=np.int8)
+        self.target = np.array([NO_TARGET if r.target is None else intersection_code[r.target]
+                                for r in self.routes], dtype=np.int16)
+        self.center = np.array([nan2 if r.center is None else r.center for r in self.routes], dtype=float)
+        self.turn_distance = np.array([r.turn_distance for r in self.routes])
+        self.turn_distance_main = np.array([r.turn_distance_main for r in self.routes])
+        self.turn_dir = np.array([nan2 if r.turn_dir is None else r.turn_dir for r in self.routes], dtype=float)
+        self.snap_axis = np.array([-1 if r.snap is None else r.snap[0] for r in self.routes])
+        self.snap_value = np.array([np.nan if r.snap is None else r.snap[1] for r in self.routes])
+
+        def legs(get, missing, dtype=float):
+            return np.array([[missing if get(leg) is None else get(leg) for leg in r.legs]
+                             for r in self.routes], dtype=dtype).reshape(n, 2)
+        self.leg_origin = legs(lambda l: origin_code[l.origin], -1, np.int16)
+        self._compile_stops()
+        self.leg_yield_x = legs(lambda l: l.yield_x, np.nan)
+        self.leg_main_y = legs(lambda l: l.main_y, np.nan)
+        self.leg_street_x = legs(lambda l: l.street_x, np.nan)
+
+    def _compile_stops(self):
+        """Stoplines de todos los tramos en un arreglo ordenado por (tramo, x), con tramo = 2 *
+        ruta + girado; ``stop_key`` = tramo * ``stop_stride`` + x permite buscarlas por lote"""
+        rows = [(2 * r.id + k, stop[0], stop[1], head)
+                for r in self.routes for k, leg in enumerate(r.legs) for stop, head in leg.stops]
+        rows.sort(key=lambda row: (row[0], row[1]))
+        self.stop_leg = np.array([row[0] for row in rows], dtype=np.int64)
+        self.stop_pos = np.array([(row[1], row[2]) for row in rows], dtype=float).reshape(-1, 2)
+        self.stop_head = np.array([row[3] for row in rows], dtype=np.intp)
+        span = max([abs(x) for x in self.stop_pos[:, 0]] + [self.network.L_main]) + 4 * STOP_RADIUS
+        self.stop_stride = 4 * span
+        self.stop_key = self.stop_leg * self.stop_stride + self.stop_pos[:, 0]
+
+    def red_stops(self, leg_id, pos, not_green):
+        """Versión por lote de ``Leg.red_stop``: cabeza (o -1) para cada auto, con ``leg_id`` =
+        2 * ruta + girado y ``not_green`` por cabeza (o (n, cabezas), una fila por auto)"""
+        head = np.full(len(pos), -1, dtype=np.intp)
+        if len(self.stop_key) == 0 or len(pos) == 0:
+            return head
+        base = leg_id * self.stop_stride
+        j = np.searchsorted(self.stop_key, base + pos[:, 0] - STOP_RADIUS - 0.5, side='left')
+        cars = np.arange(len(pos))
+        while len(cars):
+            k = j[cars]
+            ok = k < len(self.stop_key)
+            cars, k = cars[ok], k[ok]
+            ok = self.stop_key[k] <= base[cars] + pos[cars, 0] + STOP_RADIUS + 0.5
+            cars, k = cars[ok], k[ok]
+            if len(cars) == 0:
+                break
+            sp = self.stop_pos[k]
+            near = np.sqrt((pos[cars, 0] - sp[:, 0]) ** 2 + (pos[cars, 1] - sp[:, 1]) ** 2) < STOP_RADIUS
+            h = self.stop_head[k]
+            red = not_green[h] if not_green.ndim == 1 else not_green[cars, h]
+            hit = near & red
+            head[cars[hit]] = h[hit]
+            cars = cars[~hit]
+            j[cars] += 1
+        return head
+
+    def near_intersection(self, pos):
+        """¿Está ``pos`` a menos de ``near_radius`` de algún centro? Todos los centros están en
+        y = 0, así que basta mirar los dos vecinos en x (búsqueda binaria, no un recorrido)"""
+        i = bisect.bisect_left(self.center_x, pos[0])
+        for c in self._sorted_centers[max(i - 1, 0):i + 1]:
+            if np.linalg.norm(pos - c) < self.near_radius:
+                return True
+        return False
+
+    def near_intersection_mask(self, pos):
+        """Versión por lote de ``near_intersection`` para un arreglo (n, 2) de posiciones"""
+        xs = np.asarray(self.center_x)
+        near = np.zeros(len(pos), dtype=bool)
+        if len(xs) == 0:
+            return near
+        i = np.searchsorted(xs, pos[:, 0])
+        for j in (np.maximum(i - 1, 0), np.minimum(i, len(xs) - 1)):
+            cx = xs[j]
+            near |= np.sqrt((pos[:, 0] - cx) ** 2 + (pos[:, 1] - 0.0) ** 2) < self.near_radius
+        return near
+
+    def lookup(self, origin, turn, target=None):
+        """Ruta para un arribo; ``target`` solo hace falta cuando el origen tiene varias opciones"""
+        return self.index[(origin, turn, target)]
@@ -0,0 +1,91 @@
+import numpy as np
+
+from traffic_network import RoadNetwork
+
+
+def _arrival_table(p, network):
+    """(origen, tasa, giros, probabilidades, destinos) por origen; red de params si no se pasa"""
+    if network is None:
+        network = RoadNetwork.from_params(p)
+    return network.arrivals()
+
+
+class LegacyArrivals:
+    """Sorteos originales con el RNG global de NumPy, un auto a la vez (reproduce corridas viejas)"""
+
+    def __init__(self, p, network=None):
+        self.table = _arrival_table(p, network)
+
+    def tick(self):
+        arrivals = []
+        for origin, rate, turns, probs, targets in self.table:
+            for _ in range(np.random.poisson(rate)):
+                turn = str(np.random.choice(turns, p=probs))
+                target = None
+                if turn != 'S':
+                    target = targets[0]
+                    if len(targets) > 1:
+                        # Varias intersecciones posibles (p. ej. main_W -> calles sur): sorteo uniforme
+                        target = str(np.random.choice(targets, p=[1 / len(targets)] * len(targets)))
+                arrivals.append((origin, turn, target))
+        return arrivals
+
+
+class ArrivalSchedule:
+    """Arribos, giros e intersección destino de todo el horizonte, muestreados por adelantado.
+
+    Cada bloque de ``horizon`` ticks sale de tres sorteos vectorizados del ``Generator`` del
+    modelo (conteos Poisson por tick y origen, y dos uniformes por auto para giro e intersección
+    destino, elegida uniformemente entre las posibles del origen);
+    luego ``tick()`` solo recorta la porción del tick actual. Si la corrida se extiende más allá
+    del horizonte se sortea otro bloque.
+    """
+
+    def __init__(self, p, rng, horizon=None, network=None):
+        self.rng = rng
+        self.horizon = max(int(horizon or getattr(p, 'steps', 600)), 1)
+        table = _arrival_table(p, network)
+        self.rates = np.array([rate for _, rate, _, _, _ in table], dtype=float)
+        self.origins = [origin for origin, _, _, _, _ in table]
+        self.turn_options = [turns for _, _, turns, _, _ in table]
+        self.targets = [targets for _, _, _, _, targets in table]
+        # Probabilidad del primer giro por origen (el segundo es el complemento)
+        self.first_turn = np.array([probs[0] / (probs[0] + probs[1]) for _, _, _, probs, _ in table])
+        self.block = None
+        self.t = 0
+
+    def _draw_block(self):
+        counts = self.rng.poisson(self.rates, size=(self.horizon, len(self.rates)))
+        origin = np.repeat(np.tile(np.arange(len(self.rates)), self.horizon), counts.ravel())
+        first = self.rng.random(len(origin)) < self.first_turn[origin]
+        pick = self.rng.random(len(origin))
+        arrivals = []
+        for o, f, u in zip(origin.tolist(), first.tolist(), pick.tolist()):
+            name = self.origins[o]
+            turn = self.turn_options[o][0 if f else 1]
+            target = None
+            if turn != 'S':
+                targets = self.targets[o]
+                target = targets[min(int(u * len(targets)), len(targets) - 1)]
+            arrivals.append((name, turn, target))
+        offsets = np.concatenate(([0], np.cumsum(counts.sum(axis=1)))).tolist()
+        self.block = (arrivals, offsets)
+        self.t = 0
+
+    def tick(self):
+        if self.block is None or self.t >= self.horizon:
+            self._draw_block()
+        arrivals, offsets = self.block
+        out = arrivals[offsets[self.t]:offsets[self.t + 1]]
+        self.t += 1
+        return out
+
+
+def make_arrivals(p, rng, network=None):
+    """Fuente de arribos según ``p.arrivals``: 'schedule' (Generator del modelo) o 'legacy'"""
+    kind = getattr(p, 'arrivals', 'schedule')
+    if kind == 'schedule':
+        return ArrivalSchedule(p, rng, network=network)
+    if kind == 'legacy':
+        return LegacyArrivals(p, network)
+    raise ValueError(f"Fuente de arribos desconocida: {kind}")
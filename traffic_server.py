@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+from collections import deque
+
+from traffic_client import STREAM_HEADER, FRAME_PREFIX
+from traffic_recorder import DeltaEncoder, KEYFRAME_EVERY
+
+
+class HubRecorder:
+    """Grabador que entrega cada paso al hub en lugar de guardarlo"""
+
+    columnar = False
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def write(self, frame):
+        self.count += 1
+        self.hub.publish(frame)
+
+    def close(self):
+        pass
+
+    def to_json(self):
+        raise RuntimeError("El servidor de simulación no conserva los pasos")
+
+    def table(self):
+        raise RuntimeError("El servidor de simulación no conserva los pasos: no hay tabla de pasos")
+
+
+class Viewer:
+    """Cola acotada de frames pendientes para un visor conectado"""
+
+    def __init__(self, writer, name, queue_size):
+        self.writer = writer
+        self.name = name
+        self.queue_size = queue_size
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.synced = False     # False: esperando un keyframe (recién conectado o tras descartar)
+        self.closing = False
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, data, keyframe):
+        if not self.synced:
+            if not keyframe:
+                self.dropped += 1
+                return
+            self.synced = True
+        if len(self.pending) >= self.queue_size:
+            # Consumidor lento: un delta suelto no sirve sin los anteriores, así que se
+            # descarta toda la cola y el visor se resincroniza con el próximo keyframe
+            self.dropped += len(self.pending) + 1
+            self.pending.clear()
+            self.synced = keyframe
+            if not keyframe:
+                return
+        self.pending.append(data)
+        self.ready.set()
+
+    def close(self):
+        """Encolar el frame de fin de stream; el visor se cierra al vaciar la cola"""
+        self.pending.append(FRAME_PREFIX.pack(0))
+        self.closing = True
+        self.ready.set()
+
+
+class SimulationHub:
+    """Corre ThreeTIntersectionModel sin parar y difunde cada paso a todos los visores.
+
+    Cada paso se codifica una sola vez (keyframes + deltas) y se encola en cada visor con una
+    cola acotada; un visor lento pierde frames sin frenar a la simulación ni a los demás. Un
+    anillo con los pasos desde el último keyframe permite que quien se conecta tarde empiece
+    a reproducir de inmediato.
+    """
+
+    def __init__(self, params, keyframe_every=KEYFRAME_EVERY, queue_size=200, tick_interval=0.1, loop=True):
+        self.params = dict(params)
+        self.keyframe_every = keyframe_every
+        # La cola debe poder contener al menos un keyframe con sus deltas
+        self.queue_size = max(int(queue_size), keyframe_every)
+        self.tick_interval = tick_interval
+        self.loop = loop
+        self.viewers = set()
+        self.pumps = set()
+        self.ring = deque(maxlen=keyframe_every)   # frames desde el último keyframe
+        self.encoder = DeltaEncoder(keyframe_every)
+        self.model = None
+        self.episodes = 0
+        self.frames = 0
+
+    def publish(self, frame):
+        msg = self.encoder.encode(frame)
+        payload = json.dumps(msg, separators=(',', ':')).encode('utf-8')
+        data = FRAME_PREFIX.pack(len(payload)) + payload
+        keyframe = not msg.get('delta')
+        if keyframe:
+            self.ring.clear()
+        self.ring.append(data)
+        self.frames += 1
+        for viewer in self.viewers:
+            viewer.offer(data, keyframe)
+
+    def add_viewer(self, writer, name):
+        viewer = Viewer(writer, name, self.queue_size)
+        # Ponerse al día desde el último keyframe (no cuenta contra la cola)
+        if self.ring:
+            viewer.pending.extend(self.ring)
+            viewer.synced = True
+            viewer.ready.set()
+        self.viewers.add(viewer)
+        print(f"Visor conectado: {name} ({len(self.viewers)} en total)")
+        return viewer
+
+    async def _pump(self, viewer):
+        """Enviar los frames pendientes de un visor; drain() aplica la contrapresión del socket"""
+        self.pumps.add(asyncio.current_task())
+        try:
+            viewer.writer.write(STREAM_HEADER)
+            while not (viewer.closing and not viewer.pending):
+                await viewer.ready.wait()
+                while viewer.pending:
+                    data = viewer.pending.popleft()
+                    viewer.writer.write(data)
+                    await viewer.writer.drain()
+                    viewer.sent += 1
+                viewer.ready.clear()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            self.pumps.discard(asyncio.current_task())
+            viewer.writer.close()
+            print(f"Visor desconectado: {viewer.name} (enviados {viewer.sent}, descartados {viewer.dropped})")
+
+    async def handle_viewer(self, reader, writer):
+        """Callback de asyncio.start_server: un visor que se conecta al hub"""
+        name = '%s:%s' % writer.get_extra_info('peername')[:2]
+        await self._pump(self.add_viewer(writer, name))
+
+    async def connect_unity(self, host='127.0.0.1', port=1101):
+        """Conectarse a un TCPIPServerAsync de Unity (que escucha) y tratarlo como un visor más"""
+        reader, writer = await asyncio.open_connection(host, port)
+        greeting = await reader.read(4096)
+        print("Recibido del servidor Unity:", greeting.decode("ascii", errors="replace"))
+        return asyncio.create_task(self._pump(self.add_viewer(writer, f"unity {host}:{port}")))
+
+    async def run_model(self):
+        """Ejecutar episodios del modelo paso a paso, cediendo el loop entre pasos"""
+        from traffic_sim_json import ThreeTIntersectionModel
+        while True:
+            p = dict(self.params, recorder=HubRecorder(self))
+            if 'seed' in p:
+                p['seed'] = p['seed'] + self.episodes
+            self.encoder = DeltaEncoder(self.keyframe_every)   # cada episodio abre con un keyframe
+            self.model = ThreeTIntersectionModel(p)
+            self.model.sim_setup()
+            while self.model.running:
+                self.model.sim_step()
+                await asyncio.sleep(self.tick_interval)
+            self.model.end()
+            self.episodes += 1
+            print(f"Episodio {self.episodes} completado: {self.model.metrics['throughput']} autos")
+            if not self.loop:
+                return
+
+    async def shutdown(self, timeout=5.0):
+        """Cerrar todos los visores después de enviarles lo pendiente y el fin de stream"""
+        for viewer in list(self.viewers):
+            viewer.close()
+        if self.pumps:
+            await asyncio.wait(list(self.pumps), timeout=timeout)
+
+    def stats(self):
+        return {
+            'episodes': self.episodes,
+            'frames': self.frames,
+            'viewers': {v.name: {'sent': v.sent, 'dropped': v.dropped, 'pending': len(v.pending)}
+                        for v in self.viewers},
+        }
+
+
+async def serve(params, host='127.0.0.1', port=1102, unity=(), **hub_kwargs):
+    """Servir la simulación a visores en host:port (y opcionalmente empujarla a Unity)"""
+    hub = SimulationHub(params, **hub_kwargs)
+    server = await asyncio.start_server(hub.handle_viewer, host, port)
+    print(f"Servidor de simulación escuchando en {host}:{port}")
+    for unity_host, unity_port in unity:
+        await hub.connect_unity(unity_host, unity_port)
+    async with server:
+        await hub.run_model()
+        await hub.shutdown()
+    return hub
+
+
+if __name__ == "__main__":
+    from traffic_sim_json import params
+
+    parser = argparse.ArgumentParser(description="Servidor de simulación con múltiples visores")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1102)
+    parser.add_argument('--unity', action='append', default=[], metavar='HOST:PORT',
+                        help='TCPIPServerAsync de Unity al que empujar el stream (repetible)')
+    parser.add_argument('--tick', type=float, default=0.1, help='segundos entre pasos')
+    parser.add_argument('--keyframe-every', type=int, default=KEYFRAME_EVERY)
+    parser.add_argument('--queue', type=int, default=200, help='frames pendientes por visor')
+    parser.add_argument('--once', action='store_true', help='un solo episodio en lugar de repetir')
+    args = parser.parse_args()
+
+    unity = [(h, int(p)) for h, p in (u.rsplit(':', 1) for u in args.unity)]
+    asyncio.run(serve(params, args.host, args.port, unity, keyframe_every=args.keyframe_every,
+                      queue_size=args.queue, tick_interval=args.tick, loop=not args.once))
@@ -0,0 +1,282 @@
+import numpy as np
+
+# Sub-fases como enteros; el orden es el del ciclo (verde -> ámbar -> todo rojo -> verde)
+SUBS = ('G', 'Y', 'AR')
+G, Y, AR = range(len(SUBS))
+MAIN_PHASE, SIDE_PHASE = 0, 1
+POLICIES = ('fixed', 'adaptive', 'max_pressure')
+
+# Orden de restricción de los estados de luz (R=0, AR=1, Y=2, G=3) por sub-fase; la calle
+# principal muestra el más restrictivo
+SUB_RANK = np.array([3, 2, 1])
+RANK_NAMES = ('R', 'AR', 'Y', 'G')
+
+
+class SignalController:
+    """Semáforos de todas las intersecciones con ``'control': 'signal'`` como arreglos enteros.
+
+    Cada intersección tiene fase (0 = calle principal en verde, 1 = calle lateral), sub-fase
+    (``SUBS``) y ticks en la sub-fase; ``step`` las avanza todas juntas con operaciones por lote.
+    Políticas (``p.policy``):
+
+    - ``'fixed'``: verdes de ``green_main``/``green_side`` ticks, luego ámbar y todo rojo.
+    - ``'adaptive'``: dentro de [gmin, gmax] extiende el verde mientras la cola servida supere a
+      la detenida por al menos ``theta``.
+    - ``'max_pressure'``: dentro de [gmin, gmax] extiende el verde mientras la presión de su
+      fase sea la mayor. La presión es por intersección: la cola de las aproximaciones que atiende
+      la fase menos la de los tramos adonde descarga (ver ``pressure``).
+
+    Cada intersección tiene dos cabezas, la de su calle principal (código ``2*i``) y la de su
+    lateral (``2*i + 1``); cada auto obedece la cabeza de la stopline donde está (ver
+    ``RouteTable``). ``'adaptive'`` usa las colas de ``model.queues_by_dir()`` (por origen, de
+    toda la red); ``'max_pressure'``, las de ``model.signal_counts()`` (por cabeza).
+    """
+
+    def __init__(self, model, green_main, green_side, yellow, all_red):
+        self.model = model
+        p = model.p
+        self.g_main, self.g_side = int(green_main), int(green_side)
+        self.y, self.ar = int(yellow), int(all_red)
+        self.policy = getattr(p, 'policy', 'fixed')
+        if self.policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {self.policy} (opciones: {POLICIES})")
+        self.gmin = np.array([getattr(p, 'gmin_main', 10), getattr(p, 'gmin_side', 8)])
+        self.gmax = np.array([getattr(p, 'gmax_main', 40), getattr(p, 'gmax_side', 25)])
+        self.green = np.array([self.g_main, self.g_side])
+        self.theta = getattr(p, 'theta', 3)
+
+        network = model.network
+        self.origins = network.origins
+        # Una fila por intersección con semáforo, identificada por el origen de su calle lateral
+        self.ids = tuple(node.origin for node in network.signalized)
+        n = len(self.ids)
+        self.phase = np.zeros(n, dtype=np.int8)
+        self.sub = np.zeros(n, dtype=np.int8)
+        self.t_in = np.zeros(n, dtype=np.int32)
+
+        # Aproximaciones que atiende cada fase para 'adaptive': la principal, main_E y main_W
+        # (sus colas son de toda la calle); la lateral, su propio origen
+        code = network.origin_code
+        self.main_codes = [code['main_E'], code['main_W']]
+        self.side_codes = np.array([code[o] for o in self.ids], dtype=np.intp)
+        # Los autos que van al oeste por la calle principal tienen origen main_E
+        self.westbound = code['main_E']
+
+        # Para max_pressure: semáforos ordenados por x a lo largo de la calle principal; los autos
+        # que cruzan uno llegan a la cola del vecino
+        xs = np.array([node.x for node in network.signalized], dtype=float)
+        self.order = np.argsort(xs, kind='stable')
+        # Fracción de la lateral que dobla a la izquierda (hacia el oeste) y a la derecha (este)
+        turn = np.array([[node.p_left, node.p_right] for node in network.signalized], dtype=float).reshape(-1, 2)
+        self.side_split = turn / np.maximum(turn.sum(axis=1, keepdims=True), 1e-12)
+
+        self.timeline = []      # Timeline for analysis
+
+        # Instantáneas versionadas: lights() y not_green() no se reconstruyen en cada llamada
+        self.version = 0
+        self._lights, self._lights_version = None, -1
+        self._not_green, self._not_green_version = None, -1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lights(self):
+        """Estado de luces por dirección; se reconstruye solo cuando cambia una fase o sub-fase"""
+        if self._lights_version != self.version:
+            self._lights = self._build_lights()
+            self._lights_version = self.version
+        return self._lights
+
+    def _build_lights(self):
+        # Todas las direcciones en verde salvo las calles con semáforo, que controla su intersección
+        L = {o: 'G' for o in self.origins}
+        side = np.where(self.phase == SIDE_PHASE, SUB_RANK[self.sub], 0)
+        L.update(zip(self.ids, (RANK_NAMES[r] for r in side.tolist())))
+        if len(self.ids):
+            # Vista resumida para frames y Unity: la calle principal muestra el estado más
+            # restrictivo de sus cabezas (cada auto obedece la de su intersección, ver not_green)
+            main = np.where(self.phase == MAIN_PHASE, SUB_RANK[self.sub], 0).min()
+            L['main_E'] = L['main_W'] = RANK_NAMES[main]
+        return L
+
+    def not_green(self):
+        """Arreglo bool por cabeza (``2*i`` principal, ``2*i + 1`` lateral): True si no está en
+        verde; se reconstruye solo cuando cambia una fase o sub-fase"""
+        if self._not_green_version != self.version:
+            green = self.sub == G
+            out = np.empty(2 * len(self.ids), dtype=bool)
+            out[0::2] = ~(green & (self.phase == MAIN_PHASE))
+            out[1::2] = ~(green & (self.phase == SIDE_PHASE))
+            self._not_green, self._not_green_version = out, self.version
+        return self._not_green
+
+    @property
+    def green_dirs(self):
+        green = self.sub == G
+        green_set = set(o for o, g in zip(self.ids, green & (self.phase == SIDE_PHASE)) if g)
+        if (green & (self.phase == MAIN_PHASE)).any():
+            green_set.update(['main_E', 'main_W'])
+        return green_set
+
+    def queue_pressure(self, queues=None):
+        """Colas por intersección y fase, (n, 2), con las colas actuales (o las dadas, por origen).
+
+        La fase principal atiende main_E y main_W de toda la calle; es lo que usa 'adaptive'.
+        """
+        if queues is None:
+            queues = self.model.queues_by_dir()
+        q = np.array([queues.get(o, 0) for o in self.origins])
+        main = np.full(len(self.ids), q[self.main_codes].sum())
+        return np.column_stack([main, q[self.side_codes]])
+
+    def counts(self, head, origin):
+        """Autos detenidos por intersección, (n, 3): en su cabeza principal hacia el oeste y
+        hacia el este, y en su lateral.
+
+        Recibe la cabeza donde espera cada auto detenido (-1 si no es un semáforo) y su código de
+        origen (los de ``model.stopped_cars()``). Las cuentas se pueden sumar entre partes de la red.
+        """
+        n = len(self.ids)
+        head = np.asarray(head, dtype=np.intp)
+        at = head >= 0
+        # Columna: 0 = principal al oeste, 1 = principal al este, 2 = lateral
+        col = np.where(head % 2 == 1, 2, np.where(np.asarray(origin) == self.westbound, 0, 1))
+        idx = (head // 2) * 3 + col
+        return np.bincount(idx[at], minlength=3 * n).reshape(n, 3).astype(np.int64)
+
+    def pressure(self, counts=None):
+        """Presión max-pressure por intersección y fase, (n, 2), con las cuentas de ``counts``
+        (o (K, n, 2) con las cuentas de K réplicas, ver ``SignalBatch``).
+
+        Fase principal: autos detenidos en la cabeza principal de la intersección, en los dos
+        sentidos, menos los que esperan en la siguiente que cruzarán (la vecina al oeste para los
+        que van al oeste y la vecina al este para los que van al este); pasado el último semáforo
+        la calle sale de la red y no acumula cola. Fase lateral: su cola menos la de esas mismas
+        colas ponderada por la fracción que dobla a cada lado.
+        """
+        if counts is None:
+            counts = self.model.signal_counts()
+        c = np.asarray(counts, dtype=float)
+        # En orden por x: el tramo siguiente al oeste es el de i-1, al este el de i+1
+        west, east = c[..., self.order, 0], c[..., self.order, 1]
+        edge = np.zeros(west.shape[:-1] + (1,))
+        down_west = np.concatenate([edge, west[..., :-1]], axis=-1)
+        down_east = np.concatenate([east[..., 1:], edge], axis=-1)
+        main = np.empty(west.shape)
+        main[..., self.order] = west + east - down_west - down_east
+        split = self.side_split
+        back_west, back_east = np.empty(west.shape), np.empty(west.shape)
+        back_west[..., self.order], back_east[..., self.order] = down_west, down_east
+        side = c[..., 2] - split[:, 0] * back_west - split[:, 1] * back_east
+        return np.stack([main, side], axis=-1)
+
+    def advance(self, phase, sub, t_in, pressure=None):
+        """Un tick de las sub-fases dadas, en el lugar: arreglos (n,) de este controlador o
+        (K, n) de K réplicas, con la presión de cada fase (n, 2) o (K, n, 2) si la política no es
+        'fixed'. Devuelve qué intersecciones cambiaron de sub-fase."""
+        # Fin de la sub-fase según el plan fijo
+        limit = np.where(sub == G, self.green[phase], np.where(sub == Y, self.y, self.ar))
+        switch = t_in >= limit
+
+        if self.policy != 'fixed':
+            # En verde decide la política: respetar gmin/gmax y, entre ambos, extender o cambiar
+            green = sub == G
+            at = phase[..., None].astype(np.intp)
+            served = np.take_along_axis(pressure, at, axis=-1)[..., 0]
+            waiting = np.take_along_axis(pressure, 1 - at, axis=-1)[..., 0]
+            if self.policy == 'adaptive':
+                extend = served >= waiting + self.theta
+            else:
+                extend = served >= waiting
+            decide = np.where(t_in < self.gmin[phase], False, (t_in >= self.gmax[phase]) | ~extend)
+            switch = np.where(green, decide, switch)
+
+        # G -> Y -> AR -> G; al salir de todo rojo se cambia de fase
+        flip = switch & (sub == AR)
+        phase[...] = np.where(flip, 1 - phase, phase)
+        sub[...] = np.where(switch, (sub + 1) % len(SUBS), sub)
+        t_in[...] = np.where(switch, 0, t_in + 1)
+        return switch
+
+    def step(self):
+        # Log opcional
+        self.timeline.append((self.model.t, self.lights()))
+        if not len(self.ids):
+            return
+
+        pressure = None
+        if self.policy == 'adaptive':
+            pressure = self.queue_pressure()
+        elif self.policy == 'max_pressure':
+            pressure = self.pressure()
+        if self.advance(self.phase, self.sub, self.t_in, pressure).any():
+            self.version += 1
+
+
+class SignalBatch:
+    """Los semáforos de K réplicas de la misma red (``traffic_ensemble``) como un solo controlador.
+
+    Fase, sub-fase y ticks en la sub-fase de todas las réplicas están en arreglos (K, n) y
+    ``step`` los avanza con una sola llamada a ``SignalController.advance``. El ``phase``/``sub``/
+    ``t_in`` del controlador de cada réplica es su fila de esos arreglos (una vista), así que
+    ``lights()``, las métricas y el timeline de cada modelo siguen leyendo su propio controlador.
+    Las colas salen del motor compartido: ``engine.rep_queues`` para 'adaptive' y los autos
+    detenidos de cada réplica para 'max_pressure'.
+    """
+
+    def __init__(self, controllers, engine):
+        self.ctrls = list(controllers)
+        self.engine = engine
+        first = self.first = self.ctrls[0]
+        self.phase = np.stack([c.phase for c in self.ctrls])
+        self.sub = np.stack([c.sub for c in self.ctrls])
+        self.t_in = np.stack([c.t_in for c in self.ctrls])
+        for r, c in enumerate(self.ctrls):
+            c.phase, c.sub, c.t_in = self.phase[r], self.sub[r], self.t_in[r]
+        self.version = 0
+        self._not_green, self._not_green_version = None, -1
+        self.n = len(first)
+
+    def queue_pressure(self):
+        """Colas por réplica, intersección y fase, (K, n, 2), como ``SignalController.queue_pressure``"""
+        q = self.engine.rep_queues
+        first = self.first
+        main = np.broadcast_to(q[:, first.main_codes].sum(axis=1)[:, None], (len(q), self.n))
+        return np.stack([main, q[:, first.side_codes]], axis=-1)
+
+    def counts(self):
+        """Autos detenidos por réplica e intersección, (K, n, 3), como ``SignalController.counts``"""
+        rep, head, origin = self.engine.stopped_reps()
+        n, k = self.n, len(self.ctrls)
+        at = head >= 0
+        col = np.where(head % 2 == 1, 2, np.where(origin == self.first.westbound, 0, 1))
+        idx = (rep * n + head // 2) * 3 + col
+        return np.bincount(idx[at], minlength=k * n * 3).reshape(k, n, 3).astype(np.int64)
+
+    def step(self):
+        for c in self.ctrls:
+            c.timeline.append((c.model.t, c.lights()))
+        if not self.n:
+            return
+
+        pressure = None
+        if self.first.policy == 'adaptive':
+            pressure = self.queue_pressure()
+        elif self.first.policy == 'max_pressure':
+            pressure = self.first.pressure(self.counts())
+        switch = self.first.advance(self.phase, self.sub, self.t_in, pressure)
+        changed = np.flatnonzero(switch.any(axis=1))
+        for r in changed.tolist():
+            self.ctrls[r].version += 1
+        if len(changed):
+            self.version += 1
+
+    def not_green(self):
+        """``SignalController.not_green()`` de cada réplica, (K, 2n)"""
+        if self._not_green_version != self.version:
+            green = self.sub == G
+            out = np.empty((len(self.ctrls), 2 * self.n), dtype=bool)
+            out[:, 0::2] = ~(green & (self.phase == MAIN_PHASE))
+            out[:, 1::2] = ~(green & (self.phase == SIDE_PHASE))
+            self._not_green, self._not_green_version = out, self.version
+        return self._not_green
@@ -1,10 +1,19 @@
 import agentpy as ap
 import numpy as np
 import json
+import os
 import socket
 import time
-import matplotlib.pyplot as plt
-import pandas as pd
+from traffic_engine import VectorCarEngine, TURN_CODE, STATE_CODE, NO_TARGET
+from traffic_index import LaneIndex, MainStreetIndex
+from traffic_recorder import MemoryRecorder, TripRecorder, FrameColumns, FrameTable, Trajectory, make_recorder, KEYFRAME_EVERY
+from traffic_schedule import make_arrivals
+from traffic_metrics import OnlineMetrics
+from traffic_profile import PhaseProfiler, instrument_cars, write_profile_report
+from traffic_routes import RouteTable
+from traffic_network import make_network
+from traffic_signals import SignalController
+from traffic_checkpoint import snapshot, restore, restore_into, fork
 
 # Parameters for three T-intersections: north center, south left, south right
 params = {
@@ -53,7 +62,8 @@ params = {
     'p_south_left': 0.5,      # Turn left to west
     'p_south_right': 0.5,     # Turn right to east
 
-    # Política: 'adaptive' para control dinámico
+    # Política: 'adaptive' para control dinámico, 'fixed' (plan fijo) o 'max_pressure'
+    # (ver traffic_signals.py)
     'policy': 'adaptive',
 
     # Ventanas de verde optimizadas
@@ -61,278 +71,98 @@ params = {
     'gmin_side': 8, 'gmax_side': 25,
 
     # Umbral de cola
-    'theta': 3
+    'theta': 3,
+
+    # Arribos: 'schedule' (pre-muestreados con el Generator del modelo, reproducibles con 'seed')
+    # o 'legacy' (sorteos por auto con el RNG global de NumPy, como antes)
+    'arrivals': 'schedule',
+
+    # Motor de autos: 'agents' (un ap.Agent por auto) o 'vector' (arreglos NumPy por lote)
+    'engine': 'agents',
+
+    # Grabación de pasos: 'memory' (movement_data), 'null' (solo métricas), 'ndjson' (a disco,
+    # un paso por línea), 'binary' (columnas de ancho fijo a disco) o 'unity' (frame por paso a Unity)
+    # 'columns' guarda los pasos como columnas NumPy en memoria (análisis sin pasar por JSON)
+    'recorder': 'memory',
+    'frames_path': 'three_t_intersection_data.ndjson',
+    'traj_path': 'three_t_intersection_data.traj',    # con 'recorder': 'binary' (columnas + memmap)
+    'frame_buffer': 64,    # pasos en memoria antes de escribir
+    'flush_every': 256,    # pasos entre flush del archivo
+    'unity_host': '127.0.0.1',
+    'unity_port': 1101,
+    'stream_keep': False,  # con 'unity': conservar también los pasos en memoria
+    'delta_frames': False, # con 'ndjson'/'unity': keyframes + deltas en lugar de pasos completos
+    'keyframe_every': KEYFRAME_EVERY,  # pasos entre keyframes completos
+
+    # Registros de viaje: una fila por auto al llegar a su meta (combinar con 'recorder': 'null'
+    # para estudios de capacidad largos; get_summary_stats sale de estos registros)
+    'trips': False,
+    'trips_path': 'three_t_intersection_trips.csv',
+
+    # Métricas en línea: serie de colas, cuantiles de espera, throughput por intersección y
+    # duración de fases, actualizados en cada paso sin necesidad de grabar los pasos
+    'online_metrics': True,
+
+    # Perfil por fase de cada tick (barato, puede quedar activo); 'profile_detail' agrega
+    # sub-fases dentro del avance de autos (headway, conflictos, índices) con más costo
+    'profile': True,
+    'profile_detail': False,
+
+    # Red vial: None = las tres intersecciones en T definidas arriba; si no, ruta a un JSON o
+    # dict con geometría, tasas e intersecciones (ver three_t_network.json y traffic_network.py)
+    'network': None
 }
 
-class ThreeTIntersectionSignals(ap.Agent):
-    """Control para tres intersecciones en T: norte centro, sur izquierda, sur derecha"""
-
-    def setup(self, green_main, green_side, yellow, all_red):
-        self.g_main, self.g_side = int(green_main), int(green_side)
-        self.y, self.ar = int(yellow), int(all_red)
-        
-        # Solo la intersección derecha tiene semáforos
-        self.intersections = {
-            'south_right': {'phase': 0, 'sub': 'G', 't_in': 0}  # Solo intersección sur derecha
-        }
-        
-        self.timeline = []      # Timeline for analysis
-
-    def lights(self):
-        # Define all directions - only right intersection has lights
-        L = {
-            'main_E': 'G', 'main_W': 'G',  # Main road - controlled by right intersection
-            'north_center': 'G', 'south_left': 'G',  # North and south_left - always green
-            'south_right': 'R'  # South right - controlled by right intersection
-        }
-        
-        # Only control the right intersection
-        for intersection_id, state in self.intersections.items():
-            if intersection_id == 'south_right':
-                if state['phase'] == 0:  # Main road green
-                    L['main_E'] = L['main_W'] = state['sub']
-                    L['south_right'] = 'R'  # South road red
-                else:  # Vertical road green
-                    L['south_right'] = state['sub']
-                    L['main_E'] = L['main_W'] = 'R'  # Main road red
-            
-        return L
-
-    @property
-    def green_dirs(self):
-        green_set = set()
-        for intersection_id, state in self.intersections.items():
-            if state['sub'] != 'G': continue
-            if state['phase'] == 0:
-                green_set.update(['main_E', 'main_W'])
-            else:
-                green_set.add(intersection_id)
-        return green_set
-
-    def step(self):
-        # Log opcional
-        self.timeline.append((self.model.t, self.lights()))
-
-        # Control each intersection independently
-        for intersection_id, state in self.intersections.items():
-            # Atajos de tiempos
-            if state['phase'] == 0:    # Main road
-                gmin, gmax = self.model.p.gmin_main, self.model.p.gmax_main
-            else:                      # Vertical road
-                gmin, gmax = self.model.p.gmin_side, self.model.p.gmax_side
-
-            # Política adaptativa durante 'G'
-            if state['sub'] == 'G' and getattr(self.model.p, 'policy', 'fixed') == 'adaptive':
-                # colas por grupo verde vs. rojo
-                qs = self.model.queues_by_dir()
-                if state['phase'] == 0:
-                    q_green = qs['main_E'] + qs['main_W']
-                    q_red = qs.get(intersection_id, 0)
-                else:
-                    q_green = qs.get(intersection_id, 0)
-                    q_red = qs['main_E'] + qs['main_W']
-
-                # Reglas: respetar gmin/gmax; si gmin cumplido, decide extender o cambiar
-                if state['t_in'] < gmin:
-                    state['t_in'] += 1
-                elif state['t_in'] >= gmax:
-                    state['sub'], state['t_in'] = 'Y', 0
-                elif q_green >= q_red + self.model.p.theta:
-                    # Extiende verde
-                    state['t_in'] += 1
-                else:
-                    # Cambia a amarillo
-                    state['sub'], state['t_in'] = 'Y', 0
-                continue  # importante: no caigas al plan fijo
-
-            # --- Plan fijo ---
-            if state['phase'] == 0:  # Main road phase
-                if state['sub'] == 'G' and state['t_in'] >= self.g_main: 
-                    state['sub'], state['t_in'] = 'Y', 0
-                elif state['sub'] == 'Y' and state['t_in'] >= self.y: 
-                    state['sub'], state['t_in'] = 'AR', 0
-                elif state['sub'] == 'AR' and state['t_in'] >= self.ar: 
-                    state['phase'], state['sub'], state['t_in'] = 1, 'G', 0
-                else: 
-                    state['t_in'] += 1
-            else:  # Vertical road phase
-                if state['sub'] == 'G' and state['t_in'] >= self.g_side: 
-                    state['sub'], state['t_in'] = 'Y', 0
-                elif state['sub'] == 'Y' and state['t_in'] >= self.y: 
-                    state['sub'], state['t_in'] = 'AR', 0
-                elif state['sub'] == 'AR' and state['t_in'] >= self.ar: 
-                    state['phase'], state['sub'], state['t_in'] = 0, 'G', 0
-                else: 
-                    state['t_in'] += 1
 
 class Car(ap.Agent):
     """Vehículo para tres intersecciones en T: norte centro, sur izquierda, sur derecha"""
 
-    def setup(self, origin):
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        # Mantener los contadores de cola del modelo al entrar/salir de 'stop'
+        # (el origen no cambia mientras el auto está detenido)
+        prev = getattr(self, '_state', None)
+        if prev != value:
+            if prev == 'stop':
+                self.model.queue_counts[self.origin] -= 1
+            elif value == 'stop':
+                self.model.queue_counts[self.origin] += 1
+        self._state = value
+
+    def setup(self, origin, turn, target=None):
         self.wait = 0           # segundos acumulados detenido
         self.origin = origin    # 'main_E', 'main_W', 'north_center', 'south_left', 'south_right'
         self.original_origin = origin  # Keep track of original origin for coloring
         self.state = 'approach' # 'stop','go','done'
         self.v = self.model.p.v_free
-        L_main, L_vertical, w = self.model.p.L_main, self.model.p.L_vertical, self.model.p.w
-        R = self.model.p.intersection_radius
-        off = w/2
 
-        self.turn = None        # 'L', 'R', or 'S' (for straight)
         self.turned = False     # bandera para no girar más de una vez
+        self.stop_head = -1     # cabeza de semáforo donde está detenido, o -1
         self.car_id = f"{origin}_{self.model.t}_{len(self.model.cars)}"  # Unique ID
-        self.target_intersection = None  # Which intersection to use for turns
-
-        # Configuración basada en carriles reales para tres intersecciones en T
-        if origin == 'main_E':  # From East on main road
-            self.pos = np.array([ +L_main, w/4 ])  # Lado izquierdo del carril (va hacia oeste)
-            self.dir = np.array([ -1, 0 ])  # Hacia el oeste
-            # Stopline at south_right intersection (where traffic lights are)
-            x_south_right = self.model.p.intersection_south_right_x
-            self.stopline = np.array([ x_south_right + R/2, 0 ])
-            # Desde main road East solo puede ir a norte (der) o continuar recto
-            p_straight = getattr(self.model.p, 'p_main_east_straight', 0.6)
-            p_to_north = getattr(self.model.p, 'p_main_east_to_north', 0.4)
-            choice = np.random.choice(['S', 'R'], p=[p_straight, p_to_north])
-            self.turn = choice
-            # Goals basados en carriles reales
-            if self.turn == 'S':  # Straight to West
-                self.goal = np.array([ -L_main, 0 ])
-            else:  # Right to north road
-                self.target_intersection = 'north'
-                x_pos = self.model.p.intersection_north_x
-                self.goal = np.array([ x_pos, +L_vertical ])
-
-        elif origin == 'main_W':  # From West on main road
-            self.pos = np.array([ -L_main, -w/4 ])  # Lado derecho del carril (va hacia este)
-            self.dir = np.array([ +1, 0 ])  # Hacia el este
-            # Stopline at south_right intersection (where traffic lights are)
-            x_south_right = self.model.p.intersection_south_right_x
-            self.stopline = np.array([ x_south_right - R/2, 0 ])
-            # Desde main road West solo puede ir a sur o continuar recto
-            p_straight = getattr(self.model.p, 'p_main_west_straight', 0.6)
-            p_to_south = getattr(self.model.p, 'p_main_west_to_south', 0.4)
-            choice = np.random.choice(['S', 'L'], p=[p_straight, p_to_south])
-            self.turn = choice
-            # Goals basados en carriles reales
-            if self.turn == 'S':  # Straight to East
-                self.goal = np.array([ +L_main, 0 ])
-            else:  # Left to south roads
-                # Choose which south intersection to turn at
-                self.target_intersection = np.random.choice(['south_left', 'south_right'], p=[0.5, 0.5])
-                x_pos = self.model.p[f'intersection_{self.target_intersection}_x']
-                # Set stopline at the chosen intersection
-                self.stopline = np.array([ x_pos - R/2, 0 ])
-                # Goal should be aligned with the south street's left lane (where west cars should go)
-                self.goal = np.array([ x_pos - w/4, -L_vertical ])
-
-        elif origin == 'north_center':  # From North on vertical road (centro)
-            x_pos = self.model.p.intersection_north_x
-            # Desde norte solo puede ir izquierda (oeste) o derecha (este)
-            p_left = getattr(self.model.p, 'p_north_left', 0.5)
-            p_right = getattr(self.model.p, 'p_north_right', 0.5)
-            choice = np.random.choice(['L', 'R'], p=[p_left, p_right])
-            self.turn = choice
-            
-            # Posicionamiento: norte SOLO usa carril izquierdo - el derecho es para tráfico del oeste
-            # Todos los autos del norte spawn en el carril izquierdo (x_pos - w/4)
-            self.pos = np.array([ x_pos - w/4, +L_vertical + 10 ])  # Solo carril izquierdo
-                
-            self.dir = np.array([ 0, -1 ])  # Hacia el sur (hacia la calle principal)
-            # North cars need to stop for incoming main street traffic
-            self.stopline = np.array([ x_pos, +R/2 ])  # Stop before entering main street
-            self.target_intersection = 'north'
-            
-            # Goals basados en carriles reales
-            if self.turn == 'L':  # Left turn (oeste)
-                self.goal = np.array([ -L_main, 0 ])
-            else:  # Right turn (este)
-                self.goal = np.array([ +L_main, 0 ])
-
-        elif origin == 'south_left':  # From South on vertical road (izquierda)
-            x_pos = self.model.p.intersection_south_left_x
-            # Desde sur izquierda solo puede ir izquierda o derecha
-            p_left = getattr(self.model.p, 'p_south_left', 0.5)
-            p_right = getattr(self.model.p, 'p_south_right', 0.5)
-            choice = np.random.choice(['L', 'R'], p=[p_left, p_right])
-            self.turn = choice
-            
-            # Posicionamiento: sur SOLO usa carril derecho - el izquierdo es para tráfico del este
-            # Todos los autos del sur spawn en el carril derecho (x_pos + w/4)
-            self.pos = np.array([ x_pos + w/4, -L_vertical - 10 ])  # Solo carril derecho
-                
-            self.dir = np.array([ 0, +1 ])  # Hacia el norte (hacia la calle principal)
-            # South_left cars need to stop for incoming main street traffic
-            self.stopline = np.array([ x_pos, -R/2 ])  # Stop before entering main street
-            self.target_intersection = 'south_left'
-            
-            # Goals basados en carriles reales - CORREGIDO para seguir carriles correctos
-            if self.turn == 'L':  # Left turn (oeste) - va al carril derecho de la calle principal (y > 0)
-                self.goal = np.array([ -L_main, w/4 ])  # Carril derecho (top lane)
-            else:  # Right turn (este) - va al carril izquierdo de la calle principal (y < 0)
-                self.goal = np.array([ +L_main, -w/4 ])  # Carril izquierdo (bottom lane)
-
-        else:  # origin == 'south_right' (From South on vertical road - derecha)
-            x_pos = self.model.p.intersection_south_right_x
-            # Desde sur derecha solo puede ir izquierda o derecha
-            p_left = getattr(self.model.p, 'p_south_left', 0.5)
-            p_right = getattr(self.model.p, 'p_south_right', 0.5)
-            choice = np.random.choice(['L', 'R'], p=[p_left, p_right])
-            self.turn = choice
-            
-            # Posicionamiento: sur SOLO usa carril derecho - el izquierdo es para tráfico del este
-            # Todos los autos del sur spawn en el carril derecho (x_pos + w/4)
-            self.pos = np.array([ x_pos + w/4, -L_vertical - 10 ])  # Solo carril derecho
-                
-            self.dir = np.array([ 0, +1 ])  # Hacia el norte (hacia la calle principal)
-            self.stopline = np.array([ x_pos, -R/2 ])  # Much closer to intersection
-            self.target_intersection = 'south_right'
-            
-            # Goals basados en carriles reales - CORREGIDO para seguir carriles correctos
-            if self.turn == 'L':  # Left turn (oeste) - va al carril derecho de la calle principal (y > 0)
-                self.goal = np.array([ -L_main, w/4 ])  # Carril derecho (top lane)
-            else:  # Right turn (este) - va al carril izquierdo de la calle principal (y < 0)
-                self.goal = np.array([ +L_main, -w/4 ])  # Carril izquierdo (bottom lane)
+        self.serial = self.model.n_spawned  # Orden global de aparición (formato binario)
+        self.spawn_t = self.model.t         # Tick de aparición (registro de viaje)
+
+        # Geometría de la ruta (origen, giro, intersección) compilada en model.routes
+        self.route = self.model.routes.lookup(origin, turn, target)
+        self.route_id = self.route.id
+        self.turn = self.route.turn                            # 'L', 'R', or 'S' (for straight)
+        self.target_intersection = self.route.target           # Which intersection to use for turns
+        self.pos = self.route.pos.copy()
+        self.dir = self.route.dir
+        self.stopline = self.route.stopline
+        self.goal = self.route.goal
 
     def dist_to(self, p):
         return np.linalg.norm(self.pos - p)
     
-    def _check_incoming_main_street_traffic(self):
+    def _check_incoming_main_street_traffic(self, leg):
         """Check if there's incoming traffic on the main street that would conflict with this car's path"""
-        # Get intersection position
-        if self.origin == 'north_center':
-            intersection_x = self.model.p.intersection_north_x
-        elif self.origin == 'south_left':
-            intersection_x = self.model.p.intersection_south_left_x
-        else:
-            return False  # Not applicable for other origins
-        
-        # Check for cars on main street approaching this intersection
-        for other_car in self.model.cars:
-            if other_car is self or other_car.state == 'done':
-                continue
-            
-            # Check if other car is on main street (y close to 0)
-            if abs(other_car.pos[1]) < 2.0:  # On main street
-                # Check if other car is approaching this intersection
-                if self.origin == 'north_center':
-                    # North car turning left/right - check for east/west bound traffic
-                    if (other_car.origin == 'main_E' and other_car.pos[0] > intersection_x - 15 and 
-                        other_car.pos[0] < intersection_x + 5):  # East bound approaching
-                        return True
-                    elif (other_car.origin == 'main_W' and other_car.pos[0] < intersection_x + 15 and 
-                          other_car.pos[0] > intersection_x - 5):  # West bound approaching
-                        return True
-                elif self.origin == 'south_left':
-                    # South_left car turning left/right - check for east/west bound traffic
-                    if (other_car.origin == 'main_E' and other_car.pos[0] > intersection_x - 15 and 
-                        other_car.pos[0] < intersection_x + 5):  # East bound approaching
-                        return True
-                    elif (other_car.origin == 'main_W' and other_car.pos[0] < intersection_x + 15 and 
-                          other_car.pos[0] > intersection_x - 5):  # West bound approaching
-                        return True
-        
-        return False
+        # Cars on main street approaching this intersection (shared per-tick occupancy index)
+        return self.model.main_street.incoming(leg.yield_x)
 
     def step(self):
         if self.state == 'done':
@@ -341,6 +171,9 @@ class Car(ap.Agent):
         # Si llegó a la meta, termina
         if self.dist_to(self.goal) < 8.0:
             self.state = 'done'
+            self.model.lanes.discard(self)
+            self.model.main_street.discard(self)
+            self.model.retire(self)
             return
 
         # Zona de decisión cerca de la stopline - distancia apropiada para pasos cortos
@@ -349,16 +182,19 @@ class Car(ap.Agent):
 
         # Check if car should stop
         should_stop = False
+        route = self.route
+        leg = route.legs[self.turned]
         
-        # Reglas de luz - south_right y main road cars verifican semáforos
-        if self.origin in ['south_right', 'main_E', 'main_W']:
-            lights = self.model.ctrl.lights()
-            light_state = lights.get(self.origin, 'G')
-            if near and light_state != 'G':
+        # Reglas de luz: cada auto obedece la cabeza de la stopline donde está
+        self.stop_head = -1
+        if leg.stops:
+            red = leg.red_stop(self.pos, self.model.ctrl.not_green())
+            if red is not None:
+                self.stop_head = red
                 should_stop = True
-        elif self.origin in ['north_center', 'south_left']:
+        elif leg.yield_x is not None:
             # North y south_left cars check for incoming main street traffic
-            if near and self._check_incoming_main_street_traffic():
+            if near and self._check_incoming_main_street_traffic(leg):
                 should_stop = True
         
         if should_stop:
@@ -379,199 +215,36 @@ class Car(ap.Agent):
             elif gap < self.model.p.headway * 1.2:  # Gradual speed reduction
                 vmax = self.v * (gap - self.model.p.headway * 0.8) / (self.model.p.headway * 0.4)
 
-        # --- Lógica de giro mejorada que respeta carriles para tres intersecciones en T ---
-        if not self.turned and self.target_intersection is not None:
-            # Check if we're near the target intersection center
-            if self.target_intersection == 'north':
-                target_x = self.model.p.intersection_north_x
-                center_pos = np.array([target_x, 0])
-            elif self.target_intersection == 'south_left':
-                target_x = self.model.p.intersection_south_left_x
-                center_pos = np.array([target_x, 0])
-            else:  # south_right
-                target_x = self.model.p.intersection_south_right_x
-                center_pos = np.array([target_x, 0])
-            
-            center_dist = np.linalg.norm(self.pos - center_pos)
-            
-            # Ajustar distancia de giro según el origen y destino - improved to prevent glitches
-            turn_distance = self.model.p.intersection_radius * 0.8  # Slightly reduced base distance
-            
-            if self.origin in ['south_left', 'south_right']:
-                # Los autos del sur deben estar muy cerca de y=0 antes de girar
-                if abs(self.pos[1]) < 5.0:  # Muy cerca de la calle central
-                    turn_distance = 12.0  # Permitir giro desde más lejos
-                else:
-                    turn_distance = 3.0  # Muy cerca para otros casos
-            elif self.origin == 'main_W' and self.turn == 'R':
-                # West cars turning right to north - turn closer to intersection
-                turn_distance = 3.0  # Más cerca de la intersección
-            elif self.origin == 'north_center' and self.turn == 'L':
-                # North cars turning left to west - turn closer to intersection but not too close
-                turn_distance = 6.0  # Reduced for smoother turns
-            elif self.origin == 'north_center' and self.turn == 'R':
-                # North cars turning right to east - turn closer to intersection but not too close
-                turn_distance = 6.0  # Reduced for smoother turns
-            elif self.origin in ['main_E', 'main_W'] and self.turn in ['L', 'R']:
-                # Otros autos de main road que van a girar
-                turn_distance = 3.0  # Distancia moderada
-            
+        # --- Giro en la intersección destino (constantes de la ruta) ---
+        if not self.turned and route.center is not None:
+            center_dist = np.linalg.norm(self.pos - route.center)
+            # Los autos del sur giran desde más lejos una vez que están sobre la calle principal
+            turn_distance = route.turn_distance_main if abs(self.pos[1]) < 5.0 else route.turn_distance
             if center_dist < turn_distance:
-                # Perform the turn based on the turn type and intersection
-                if self.turn == 'L':  # Left turn
-                    if self.origin == 'main_E':  # East to South roads (removed)
-                        self.dir = np.array([ 0, -1 ])
-                    elif self.origin == 'main_W':  # West to South roads
-                        self.dir = np.array([ 0, -1 ])
-                        # After left turn from west, position in the south street's left lane
-                        # South streets: right lane (x_pos + w/4) for south cars, left lane (x_pos - w/4) for west cars
-                        if self.target_intersection == 'south_left':
-                            x_pos = self.model.p.intersection_south_left_x
-                        else:  # south_right
-                            x_pos = self.model.p.intersection_south_right_x
-                        self.pos[0] = x_pos - self.model.p.w/4  # Left lane of south street
-                    elif self.origin == 'north_center':  # North to West
-                        self.dir = np.array([ -1, 0 ])
-                        # After left turn from north, position in right lane (top lane, y > 0)
-                        self.pos[1] = self.model.p.w/4
-                    elif self.origin in ['south_left', 'south_right']:  # South to West
-                        self.dir = np.array([ -1, 0 ])
-                        # After left turn from south, position in right lane (top lane, y > 0)
-                        self.pos[1] = self.model.p.w/4
-                        
-                elif self.turn == 'R':  # Right turn
-                    if self.origin == 'main_E':  # East to North road
-                        self.dir = np.array([ 0, +1 ])
-                    elif self.origin == 'main_W':  # West to South roads (removed)
-                        self.dir = np.array([ 0, -1 ])
-                    elif self.origin == 'north_center':  # North to East
-                        self.dir = np.array([ +1, 0 ])
-                        # After right turn from north, position in left lane (bottom lane, y < 0)
-                        self.pos[1] = -self.model.p.w/4
-                    elif self.origin in ['south_left', 'south_right']:  # South to East
-                        self.dir = np.array([ +1, 0 ])
-                        # After right turn from south, position in left lane (bottom lane, y < 0)
-                        self.pos[1] = -self.model.p.w/4
-                        
-                elif self.turn == 'S':  # Straight movement
-                    if self.origin == 'south_right':  # South right straight to north
-                        self.dir = np.array([ 0, +1 ])  # Continue north
-                        
-                # For straight movement, direction remains the same
+                if route.turn_dir is not None:
+                    self.dir = route.turn_dir
+                if route.snap is not None:
+                    # Carril de destino después del giro
+                    self.pos[route.snap[0]] = route.snap[1]
                 self.turned = True
-                
                 # Update origin after turn to maintain correct lane following
-                if self.origin == 'main_E' and self.turn == 'L':
-                    # Now coming from south
-                    if self.target_intersection == 'south_left':
-                        self.origin = 'south_left'
-                    else:
-                        self.origin = 'south_right'
-                elif self.origin == 'main_W' and self.turn == 'L':
-                    # Now coming from south (west cars turning left to south streets)
-                    if self.target_intersection == 'south_left':
-                        self.origin = 'south_left'
-                    else:
-                        self.origin = 'south_right'
-                elif self.origin == 'main_W' and self.turn == 'R':
-                    # Now coming from north
-                    self.origin = 'north_center'
-                elif self.origin == 'north_center':
-                    # North cars turning into main road
-                    if self.turn == 'L':  # Left turn to west
-                        self.origin = 'main_W'
-                    elif self.turn == 'R':  # Right turn to east
-                        self.origin = 'main_E'
+                leg = route.legs[1]
+                self.origin = leg.origin
         
         # --- Lógica para seguir las calles correctamente ---
         # Solo aplicar restricciones de carril si el auto no está cerca de una intersección
-        near_intersection = False
-        
-        # Verificar si está cerca de alguna intersección
-        for intersection_id in ['north', 'south_left', 'south_right']:
-            if intersection_id == 'north':
-                target_x = self.model.p.intersection_north_x
-                center_pos = np.array([target_x, 0])
-            elif intersection_id == 'south_left':
-                target_x = self.model.p.intersection_south_left_x
-                center_pos = np.array([target_x, 0])
-            else:  # south_right
-                target_x = self.model.p.intersection_south_right_x
-                center_pos = np.array([target_x, 0])
-            
-            if np.linalg.norm(self.pos - center_pos) < self.model.p.intersection_radius + 5:
-                near_intersection = True
-                break
+        near_intersection = self.model.routes.near_intersection(self.pos)
         
         # Solo aplicar restricciones de carril si NO está cerca de una intersección
         if not near_intersection:
-            w = self.model.p.w  # Obtener ancho de carril desde parámetros
-            
-            # Si el auto está en la calle principal, debe mantenerse en su lado correcto
-            if abs(self.pos[1]) < 2.0:  # En la calle principal
-                # Cars that have turned from south should maintain their correct lanes
-                if self.turned and self.origin in ['south_left', 'south_right']:
-                    if self.turn == 'L':  # Left turn from south - should be in right lane (top lane, y > 0)
-                        # Gradual lane correction to prevent jumping
-                        target_y = w/4
-                        if abs(self.pos[1] - target_y) > 0.5:  # Only correct if significantly off
-                            self.pos[1] = target_y
-                    elif self.turn == 'R':  # Right turn from south - should be in left lane (bottom lane, y < 0)
-                        # Gradual lane correction to prevent jumping
-                        target_y = -w/4
-                        if abs(self.pos[1] - target_y) > 0.5:  # Only correct if significantly off
-                            self.pos[1] = target_y
-                elif self.origin == 'main_E' and self.turn == 'S':
-                    # Mantener en lado izquierdo del carril (va hacia oeste)
-                    target_y = w/4
-                    if abs(self.pos[1] - target_y) > 0.5:
-                        self.pos[1] = target_y
-                elif self.origin == 'main_W' and self.turn == 'S':
-                    # Mantener en lado derecho del carril (va hacia este)
-                    target_y = -w/4
-                    if abs(self.pos[1] - target_y) > 0.5:
-                        self.pos[1] = target_y
-                elif self.turn in ['L', 'R'] and not self.turned:
-                    # Aún no ha llegado a la intersección, mantener en su lado
-                    if self.origin == 'main_E':
-                        target_y = w/4  # Lado izquierdo (va hacia oeste)
-                        if abs(self.pos[1] - target_y) > 0.5:
-                            self.pos[1] = target_y
-                    elif self.origin == 'main_W':
-                        target_y = -w/4  # Lado derecho (va hacia este)
-                        if abs(self.pos[1] - target_y) > 0.5:
-                            self.pos[1] = target_y
-            
-            # Si el auto está en una calle vertical, debe mantenerse en su lado correcto
-            elif self.origin == 'north_center':
-                # Norte SOLO usa carril izquierdo - el derecho es para tráfico del oeste
-                target_x = self.model.p.intersection_north_x - w/4
+            if abs(self.pos[1]) < 2.0:  # En la calle principal: mantenerse en su lado
+                target_y = leg.main_y
+                if target_y is not None and abs(self.pos[1] - target_y) > 0.5:  # Only correct if significantly off
+                    self.pos[1] = target_y
+            elif leg.street_x is not None:  # En una calle vertical: mantenerse en su carril
+                target_x = leg.street_x
                 if abs(self.pos[0] - target_x) > 0.5:
                     self.pos[0] = target_x
-            elif self.origin == 'south_left':
-                # Check if this car came from west (should use left lane) or from south (should use right lane)
-                if hasattr(self, 'original_origin') and self.original_origin == 'main_W':
-                    # West cars turning to south_left use left lane
-                    target_x = self.model.p.intersection_south_left_x - w/4
-                    if abs(self.pos[0] - target_x) > 0.5:
-                        self.pos[0] = target_x
-                else:
-                    # South cars use right lane
-                    target_x = self.model.p.intersection_south_left_x + w/4
-                    if abs(self.pos[0] - target_x) > 0.5:
-                        self.pos[0] = target_x
-            elif self.origin == 'south_right':
-                # Check if this car came from west (should use left lane) or from south (should use right lane)
-                if hasattr(self, 'original_origin') and self.original_origin == 'main_W':
-                    # West cars turning to south_right use left lane
-                    target_x = self.model.p.intersection_south_right_x - w/4
-                    if abs(self.pos[0] - target_x) > 0.5:
-                        self.pos[0] = target_x
-                else:
-                    # South cars use right lane
-                    target_x = self.model.p.intersection_south_right_x + w/4
-                    if abs(self.pos[0] - target_x) > 0.5:
-                        self.pos[0] = target_x
 
         # Avanzar con movimiento suave y consistente
         dt = 1.0  # Use consistent 1-second timestep to match simulation
@@ -581,14 +254,33 @@ class Car(ap.Agent):
             vmax = min_speed
         
         self.pos = self.pos + self.dir * vmax * dt
+        self.model.lanes.move(self)
+        self.model.main_street.move(self)
 
 class ThreeTIntersectionModel(ap.Model):
 
-    def setup(self):
+    def setup(self, checkpoint=None):
         p = self.p
-        self.ctrl = ThreeTIntersectionSignals(self, p.green_main, p.green_side, p.yellow, p.all_red)
+        # Red vial (intersecciones, tasas y probabilidades) descrita por datos
+        self.network = make_network(p)
+        origins = self.network.origins
+        self.ctrl = SignalController(self, p.green_main, p.green_side, p.yellow, p.all_red)
         self.cars = ap.AgentList(self, 0, Car)
-        self.spawn_counts = {d:0 for d in ['main_E', 'main_W', 'north_center', 'south_left', 'south_right']}
+        # Rutas (aparición, giro, carriles) compiladas una vez a partir de la red
+        self.routes = RouteTable(self.network)
+        # Motor vectorizado opcional: la flota vive en arreglos en lugar de self.cars
+        self.fleet = VectorCarEngine(self) if getattr(p, 'engine', 'agents') == 'vector' else None
+        # Índice de carriles para buscar el líder sin recorrer toda la flota
+        self.lanes = LaneIndex(p.w)
+        # Ocupación de la calle principal para los cruces sin semáforo
+        self.main_street = MainStreetIndex()
+        self.spawn_counts = {d:0 for d in origins}
+        self.n_spawned = 0
+        self.finished = []      # autos que terminaron en el tick actual (se retiran al final)
+        # Arribos y giros pre-muestreados con el Generator del modelo (semilla: p.seed)
+        self.arrivals = make_arrivals(p, self.nprandom, self.network)
+        # Autos detenidos por dirección, actualizados por Car.state al cambiar de estado
+        self.queue_counts = {d:0 for d in origins}
         # Log para análisis
         self.log = []
         self.t = 0  # reloj simple para corridas sin animación
@@ -596,96 +288,177 @@ class ThreeTIntersectionModel(ap.Model):
             'throughput': 0,
             'delay_sum': 0,
             'delay_count': 0,
-            'qmax': {'main_E': 0, 'main_W': 0, 'north_center': 0, 'south_left': 0, 'south_right': 0}
+            'qmax': {d: 0 for d in origins}
         }
-        # Store movement data for JSON export
-        self.movement_data = []
+        # Store movement data for JSON export (en memoria o en streaming a disco)
+        self.recorder = make_recorder(p, self.network)
+        kept = getattr(self.recorder, 'sink', None)
+        kept = self.recorder if kept is None else kept
+        self.movement_data = kept.frames if isinstance(kept, MemoryRecorder) else None
+        # Registros de viaje (opcionales), escritos por bloques a CSV
+        self.trips = (TripRecorder(getattr(p, 'trips_path', None), network=self.network)
+                      if getattr(p, 'trips', False) else None)
+        self.online = (OnlineMetrics(getattr(p, 'steps', 600), origins=origins, intersections=self.network.ids)
+                       if getattr(p, 'online_metrics', True) else None)
+        # Tiempos por fase de step()
+        self.profiler = PhaseProfiler() if getattr(p, 'profile', True) else None
+        if self.profiler is not None and getattr(p, 'profile_detail', False):
+            instrument_cars(self.profiler, self)
+        # Continuar desde un checkpoint (ver traffic_checkpoint.py)
+        if checkpoint is not None:
+            restore_into(self, checkpoint)
+
+    def checkpoint(self, path=None):
+        """Estado completo al final del tick actual; con ``path`` también se guarda en disco"""
+        state = snapshot(self)
+        if path is not None:
+            state.save(path)
+        return state
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint, **overrides):
+        """Modelo que continúa desde un checkpoint (objeto o ruta); ``run()`` sigue hasta ``steps``"""
+        return restore(checkpoint, **overrides)
+
+    def fork(self, *scenarios):
+        """Un modelo por dict de overrides, todos desde el estado actual (p. ej. otra política)"""
+        return fork(self, scenarios)
 
     def headway_ahead(self, me):
-        """Líder en el mismo carril y sentido, si existe - improved to prevent sticking."""
-        # Find cars in the same lane and direction
-        same_lane_cars = []
-        w = self.p.w
-        
-        for c in self.cars:
-            if c is me or c.state == 'done':
-                continue
-                
-            # Check if car is going in the same direction
-            if np.allclose(c.dir, me.dir, atol=0.1):
-                # Determine lane distance based on road orientation
-                if abs(me.dir[0]) > 0.5:  # Moving horizontally (main street)
-                    lane_distance = abs(c.pos[1] - me.pos[1])  # Y-coordinate difference
-                else:  # Moving vertically (north/south streets)
-                    lane_distance = abs(c.pos[0] - me.pos[0])  # X-coordinate difference
-                
-                # More lenient lane detection to prevent false positives
-                if lane_distance < w * 0.7:  # Increased tolerance for lane detection
-                    same_lane_cars.append(c)
-        
-        if not same_lane_cars:
-            return None
-            
-        # Find the closest car ahead in the same direction
-        ahead = []
-        for c in same_lane_cars:
-            v = c.pos - me.pos
-            proj = np.dot(v, me.dir)
-            # Only consider cars that are significantly ahead to avoid micro-stopping
-            if proj > 2.0:  # Minimum distance ahead
-                ahead.append((proj, c))
-        
-        if not ahead:
-            return None
-            
-        return min(ahead, key=lambda x: x[0])[1]
-
-    def spawn_poisson(self, origin, lam):
-        k = np.random.poisson(lam)
-        for _ in range(k):
-            self.cars.append(Car(self, origin=origin))
+        """Líder en el mismo carril y sentido, si existe (vecino adelante en el índice de carriles)."""
+        return self.lanes.leader(me)
+
+    def spawn_arrivals(self):
+        """Crear los autos que el calendario de arribos asigna a este tick"""
+        for origin, turn, target in self.arrivals.tick():
+            if self.fleet is not None:
+                self.fleet.spawn(origin, turn, target)
+            else:
+                self.cars.append(Car(self, origin=origin, turn=turn, target=target))
             self.spawn_counts[origin]+=1
+            self.n_spawned += 1
 
     def queues_by_dir(self):
-        qs = {'main_E': 0, 'main_W': 0, 'north_center': 0, 'south_left': 0, 'south_right': 0}
-        for c in self.cars:
-            if c.state == 'stop':
-                qs[c.origin] += 1
-        return qs
+        if self.fleet is not None:
+            return dict(self.fleet.queues)
+        return dict(self.queue_counts)
+
+    def stopped_cars(self):
+        """(cabeza de semáforo, código de origen) de los autos detenidos, como arreglos"""
+        if self.fleet is not None:
+            return self.fleet.stopped()
+        cars = [c for c in self.cars if c.state == 'stop']
+        code = self.network.origin_code
+        return (np.array([c.stop_head for c in cars], dtype=np.intp),
+                np.array([code[c.origin] for c in cars], dtype=np.int64))
+
+    def signal_counts(self):
+        """Colas por semáforo que usa la política 'max_pressure' (ver SignalController.counts)"""
+        return self.ctrl.counts(*self.stopped_cars())
 
     def step(self):
+        self.begin_tick()
+        self.advance_cars()
+        self.end_tick()
+
+    # Un tick en tres partes para que traffic_ensemble avance los autos de varias réplicas juntos
+    def begin_tick(self):
+        """Arribos y señales"""
+        prof = self.profiler
+        if prof is not None:
+            prof.start()
+
         # 1) arribos - spawn vehicles from all directions
-        self.spawn_poisson('main_E', self.p.lambda_main_east)
-        self.spawn_poisson('main_W', self.p.lambda_main_west)
-        self.spawn_poisson('north_center', self.p.lambda_north_center)
-        self.spawn_poisson('south_left', self.p.lambda_south_left)
-        self.spawn_poisson('south_right', self.p.lambda_south_right)
+        self.spawn_arrivals()
+        if prof is not None:
+            prof.mark('spawn')
 
         # 2) señales
         self.ctrl.step()
+        if prof is not None:
+            prof.mark('signals')
 
+    def advance_cars(self):
         # 3) autos
-        self.cars.step()
+        prof = self.profiler
+        if self.fleet is not None:
+            self.fleet.step(self.ctrl.not_green())
+        else:
+            self.lanes.rebuild(self.cars)
+            self.main_street.rebuild(self.cars)
+            if prof is not None:
+                prof.mark('index')
+            self.cars.step()
+        if prof is not None:
+            prof.mark('cars')
+
+    def end_tick(self):
+        """Métricas, grabación del paso y limpieza de autos terminados"""
+        prof = self.profiler
 
         # --- métricas por paso ---
         qs = self.queues_by_dir()
         for d in qs:
             self.metrics['qmax'][d] = max(self.metrics['qmax'][d], qs[d])
 
-        # contabilidad de 'done' y delays asociados
-        done = [c for c in self.cars if c.state == 'done']
-        self.metrics['throughput'] += len(done)
-        for c in done:
-            self.metrics['delay_sum'] += c.wait
-            self.metrics['delay_count'] += 1
+        # contabilidad de 'done' y delays asociados (los agentes la hacen en retire())
+        if self.fleet is not None and len(self.fleet.finished_waits):
+            waits = self.fleet.finished_waits
+            self.metrics['throughput'] += len(waits)
+            self.metrics['delay_sum'] += int(waits.sum())
+            self.metrics['delay_count'] += len(waits)
+
+        lights = self.ctrl.lights()
+        finished = None
+        if self.online is not None or self.trips is not None:
+            finished = self.finished_columns()
+        if self.online is not None:
+            self.online.update(self.t, qs, lights, finished)
+        if prof is not None:
+            prof.mark('metrics')
 
         # Capture movement data for this timestep
-        timestep_data = {
-            'timestep': self.t,
-            'traffic_lights': self.ctrl.lights(),
-            'cars': []
-        }
-        
+        if getattr(self.recorder, 'discard', False):
+            self.recorder.write(None)
+        elif self.recorder.columnar:
+            self.recorder.write_columns(self.t, lights, self.frame_columns())
+        else:
+            self.recorder.write({
+                'timestep': self.t,
+                'traffic_lights': lights,
+                'cars': self.frame_cars()
+            })
+
+        # Registros de viaje de los autos que terminaron en este tick
+        if self.trips is not None:
+            self.trips.write(finished)
+        if prof is not None:
+            prof.mark('capture')
+
+        # 4) limpieza de autos terminados: en el lugar y solo si alguno terminó en este tick.
+        # Se conserva el orden de la lista porque Car.step es secuencial (y es el orden del JSON).
+        if self.fleet is not None:
+            self.fleet.retire()
+        elif self.finished:
+            for car in self.finished:
+                self.cars.remove(car)
+            self.finished.clear()
+        if prof is not None:
+            prof.mark('cleanup')
+        self.t += 1
+
+    def retire(self, car):
+        """Contabilizar un auto que llegó a su meta (throughput y delay al momento de terminar)"""
+        self.metrics['throughput'] += 1
+        self.metrics['delay_sum'] += car.wait
+        self.metrics['delay_count'] += 1
+        self.finished.append(car)
+
+    def frame_cars(self):
+        """Autos activos en el formato de exportación JSON"""
+        if self.fleet is not None:
+            return self.fleet.frame_cars()
+        cars = []
         for car in self.cars:
             if car.state != 'done':
                 car_data = {
@@ -700,28 +473,97 @@ class ThreeTIntersectionModel(ap.Model):
                     'target_intersection': car.target_intersection,
                     'wait_time': car.wait
                 }
-                timestep_data['cars'].append(car_data)
-        
-        self.movement_data.append(timestep_data)
+                cars.append(car_data)
+        return cars
+
+    def frame_columns(self):
+        """Autos activos como columnas codificadas (formato binario)"""
+        if self.fleet is not None:
+            return self.fleet.columns()
+        cars = [c for c in self.cars if c.state != 'done']
+        origin_code, intersection_code = self.network.origin_code, self.network.intersection_code
+        return {
+            'car': [c.serial for c in cars],
+            'id': [c.car_id for c in cars],
+            'x': [c.pos[0] for c in cars], 'y': [c.pos[1] for c in cars],
+            'dx': [c.dir[0] for c in cars], 'dy': [c.dir[1] for c in cars],
+            'state': [STATE_CODE[c.state] for c in cars],
+            'origin': [origin_code[c.origin] for c in cars],
+            'original_origin': [origin_code[c.original_origin] for c in cars],
+            'turn': [TURN_CODE[c.turn] for c in cars],
+            'target_intersection': [NO_TARGET if c.target_intersection is None
+                                    else intersection_code[c.target_intersection] for c in cars],
+            'turned': [c.turned for c in cars],
+            'wait': [c.wait for c in cars],
+        }
 
-        # 4) limpieza de autos terminados
-        self.cars = ap.AgentList(self, [c for c in self.cars if c.state != 'done'], Car)
-        self.t += 1
+    def finished_columns(self):
+        """Autos que terminaron en este tick como columnas codificadas (registros de viaje)"""
+        if self.fleet is not None:
+            cols = self.fleet.finished_columns()
+        else:
+            cars = self.finished
+            origin_code, intersection_code = self.network.origin_code, self.network.intersection_code
+            cols = {
+                'car_id': [c.car_id for c in cars],
+                'original_origin': [origin_code[c.original_origin] for c in cars],
+                'origin': [origin_code[c.origin] for c in cars],
+                'turn': [TURN_CODE[c.turn] for c in cars],
+                'target_intersection': [NO_TARGET if c.target_intersection is None
+                                        else intersection_code[c.target_intersection] for c in cars],
+                'spawn_t': [c.spawn_t for c in cars],
+                'wait': [c.wait for c in cars],
+            }
+        cols['exit_t'] = np.full(len(cols['car_id']), self.t, dtype=np.int64)
+        return cols
+
+    def end(self):
+        # Vaciar el buffer del grabador al terminar la corrida
+        self.recorder.close()
+        if self.trips is not None:
+            self.trips.close()
 
     def get_movement_json(self):
         """Return the movement data as JSON string"""
-        return json.dumps(self.movement_data, indent=2)
+        return self.recorder.to_json()
+
+    def frame_table(self):
+        """Pasos grabados como columnas (FrameTable o Trajectory), sin serializar a JSON"""
+        return self.recorder.table()
+
+    def dataframe(self):
+        """Pasos grabados como DataFrame: una fila por auto y paso"""
+        return self.frame_table().dataframe()
     
     def get_summary_stats(self):
-        """Return summary statistics"""
-        avg_delay = self.metrics['delay_sum'] / max(self.metrics['delay_count'], 1)
-        return {
+        """Return summary statistics (from the trip records when 'trips' is enabled)"""
+        if self.trips is not None:
+            trips = self.trips.summary()
+            throughput, avg_delay = trips['total_cars_processed'], trips['average_delay']
+        else:
+            throughput = self.metrics['throughput']
+            avg_delay = self.metrics['delay_sum'] / max(self.metrics['delay_count'], 1)
+        stats = {
             'total_timesteps': self.t,
-            'total_cars_processed': self.metrics['throughput'],
+            'total_cars_processed': throughput,
             'average_delay': avg_delay,
             'max_queues': self.metrics['qmax'],
             'spawn_counts': self.spawn_counts
         }
+        if self.online is not None:
+            online = self.online.summary()
+            stats['delay_quantiles'] = {k: online['delay'][k] for k in ('p50', 'p95', 'p99')}
+            stats['throughput_by_intersection'] = online['throughput_by_intersection']
+        return stats
+
+def run_headless(overrides=None, display=False):
+    """Corrida solo de métricas: sin grabar pasos ni importar matplotlib/pandas; devuelve el resumen"""
+    p = params.copy()
+    p.update(overrides or {})
+    p['recorder'] = 'null'
+    model = ThreeTIntersectionModel(p)
+    model.run(display=display)
+    return model.get_summary_stats()
 
 def run_simulation_and_export_json():
     """Ejecutar la simulación de tres intersecciones en T y exportar resultados como JSON"""
@@ -732,7 +574,7 @@ def run_simulation_and_export_json():
     model = ThreeTIntersectionModel(params)
     model.run()
     
-    print(f"Simulación completada. Generados {len(model.movement_data)} pasos de tiempo")
+    print(f"Simulación completada. Generados {len(model.recorder)} pasos de tiempo")
     print(f"Total de autos procesados: {model.metrics['throughput']}")
     print(f"Colas máximas por dirección: {model.metrics['qmax']}")
     
@@ -748,13 +590,129 @@ def run_simulation_and_export_json():
     # Guardar estadísticas resumidas
     with open('three_t_intersection_stats.json', 'w') as f:
         json.dump(summary_stats, f, indent=2)
+    write_profile_report(model)
     
     print("Datos guardados en:")
     print("- three_t_intersection_data.json (datos de movimiento)")
     print("- three_t_intersection_stats.json (estadísticas resumidas)")
+    if model.profiler is not None:
+        print("- three_t_intersection_profile.json (tiempos por fase)")
     
     return json_data, summary_stats
 
+def run_simulation_and_stream_json(frames_path='three_t_intersection_data.ndjson', delta_frames=False):
+    """Ejecutar la simulación escribiendo cada paso a disco (NDJSON) mientras se produce"""
+    print("Iniciando simulación de tres intersecciones en T (streaming a disco)...")
+    
+    stream_params = params.copy()
+    stream_params['recorder'] = 'ndjson'
+    stream_params['frames_path'] = frames_path
+    stream_params['delta_frames'] = delta_frames
+    model = ThreeTIntersectionModel(stream_params)
+    model.run()
+    
+    print(f"Simulación completada. Generados {len(model.recorder)} pasos de tiempo")
+    print(f"Total de autos procesados: {model.metrics['throughput']}")
+    
+    summary_stats = model.get_summary_stats()
+    with open('three_t_intersection_stats.json', 'w') as f:
+        json.dump(summary_stats, f, indent=2)
+    write_profile_report(model)
+    
+    print("Datos guardados en:")
+    print(f"- {frames_path} (un paso de tiempo por línea)")
+    print("- three_t_intersection_stats.json (estadísticas resumidas)")
+    if model.profiler is not None:
+        print("- three_t_intersection_profile.json (tiempos por fase)")
+    
+    return frames_path, summary_stats
+
+def run_simulation_and_export_binary(traj_path='three_t_intersection_data.traj'):
+    """Ejecutar la simulación y exportar trayectorias en formato binario columnar (memmap)"""
+    print("Iniciando simulación de tres intersecciones en T (exportación binaria)...")
+    
+    binary_params = params.copy()
+    binary_params['recorder'] = 'binary'
+    binary_params['traj_path'] = traj_path
+    model = ThreeTIntersectionModel(binary_params)
+    model.run()
+    
+    print(f"Simulación completada. Generados {len(model.recorder)} pasos de tiempo")
+    print(f"Total de autos procesados: {model.metrics['throughput']}")
+    
+    summary_stats = model.get_summary_stats()
+    with open('three_t_intersection_stats.json', 'w') as f:
+        json.dump(summary_stats, f, indent=2)
+    write_profile_report(model)
+    
+    print("Datos guardados en:")
+    print(f"- {traj_path}/ ({model.recorder.bytes_written} bytes, leer con traffic_recorder.Trajectory)")
+    print("- three_t_intersection_stats.json (estadísticas resumidas)")
+    if model.profiler is not None:
+        print("- three_t_intersection_profile.json (tiempos por fase)")
+    
+    return traj_path, summary_stats
+
+def run_simulation_and_export_trips(trips_path='three_t_intersection_trips.csv', steps=None):
+    """Ejecutar la simulación guardando solo un registro por auto (sin trayectorias)"""
+    print("Iniciando simulación de tres intersecciones en T (registros de viaje)...")
+    
+    trip_params = params.copy()
+    trip_params['recorder'] = 'null'
+    trip_params['trips'] = True
+    trip_params['trips_path'] = trips_path
+    if steps is not None:
+        trip_params['steps'] = steps
+    model = ThreeTIntersectionModel(trip_params)
+    model.run()
+    
+    print(f"Simulación completada. {len(model.trips)} viajes registrados")
+    
+    summary_stats = model.get_summary_stats()
+    with open('three_t_intersection_stats.json', 'w') as f:
+        json.dump(summary_stats, f, indent=2)
+    write_profile_report(model)
+    
+    print("Datos guardados en:")
+    print(f"- {trips_path} (un registro por auto)")
+    print("- three_t_intersection_stats.json (estadísticas resumidas)")
+    if model.profiler is not None:
+        print("- three_t_intersection_profile.json (tiempos por fase)")
+    
+    return trips_path, summary_stats
+
+def run_simulation_and_stream_to_unity(host='127.0.0.1', port=1101, delta_frames=True):
+    """Ejecutar la simulación enviando cada paso a Unity en cuanto se calcula"""
+    print("Iniciando simulación de tres intersecciones en T (stream en vivo a Unity)...")
+    
+    stream_params = params.copy()
+    stream_params['recorder'] = 'unity'
+    stream_params['unity_host'] = host
+    stream_params['unity_port'] = port
+    stream_params['delta_frames'] = delta_frames
+    model = None
+    try:
+        model = ThreeTIntersectionModel(stream_params)
+        model.run()
+    except Exception as e:
+        print(f"Error enviando a Unity: {e}")
+        return None
+    finally:
+        # Aunque la corrida falle a medias, Unity recibe el fin de stream y el socket se cierra
+        recorder = getattr(model, 'recorder', None)
+        sock = getattr(recorder, 'sock', None)
+        if sock is not None:
+            try:
+                recorder.close()
+            except OSError:
+                pass
+            sock.close()
+    
+    print(f"Simulación completada. Enviados {len(model.recorder)} pasos de tiempo ({model.recorder.bytes_sent} bytes)")
+    print(f"Total de autos procesados: {model.metrics['throughput']}")
+    
+    return model.get_summary_stats()
+
 def run_simulation_and_send_to_unity():
     """Ejecutar la simulación de tráfico compleja y enviar resultados a Unity"""
     print("Iniciando simulación de intersección compleja...")
@@ -764,7 +722,7 @@ def run_simulation_and_send_to_unity():
     model = ThreeTIntersectionModel(params)
     model.run()
     
-    print(f"Simulación completada. Generados {len(model.movement_data)} pasos de tiempo")
+    print(f"Simulación completada. Generados {len(model.recorder)} pasos de tiempo")
     print(f"Total de autos procesados: {model.metrics['throughput']}")
     print(f"Colas máximas por dirección: {model.metrics['qmax']}")
     
@@ -782,14 +740,14 @@ def run_simulation_and_send_to_unity():
         print("Recibido del servidor Unity:", from_server.decode("ascii"))
         
         # Enviar confirmación
-        s.send(b"Three T-intersection simulation data ready")
+        s.sendall(b"Three T-intersection simulation data ready")
         
         # Enviar datos JSON
         print("Enviando datos de movimiento a Unity...")
-        s.send(json_data.encode('utf-8'))
+        s.sendall(json_data.encode('utf-8'))
         
         # Enviar marcador de fin
-        s.send(b"$")
+        s.sendall(b"$")
         
         print("¡Datos enviados exitosamente!")
         s.close()
@@ -814,7 +772,7 @@ def run_comparison_analysis():
     adaptive_params['policy'] = 'adaptive'
     adaptive_model = ThreeTIntersectionModel(adaptive_params)
     adaptive_model.run()
-    adaptive_data = adaptive_model.get_movement_json()
+    adaptive_data = adaptive_model.frame_table()
     adaptive_stats = adaptive_model.get_summary_stats()
     
     # Run fixed simulation
@@ -823,7 +781,7 @@ def run_comparison_analysis():
     fixed_params['policy'] = 'fixed'
     fixed_model = ThreeTIntersectionModel(fixed_params)
     fixed_model.run()
-    fixed_data = fixed_model.get_movement_json()
+    fixed_data = fixed_model.frame_table()
     fixed_stats = fixed_model.get_summary_stats()
     
     # Generate comparison graphs
@@ -833,6 +791,7 @@ def run_comparison_analysis():
 
 def generate_comparison_graphs(adaptive_data, fixed_data, adaptive_stats, fixed_stats):
     """Generate line trend graphs comparing adaptive vs fixed heuristics"""
+    import matplotlib.pyplot as plt     # solo al generar reportes (modo headless no lo importa)
     
     # Parse data for analysis
     adaptive_df = parse_simulation_data(adaptive_data)
@@ -906,48 +865,37 @@ def generate_comparison_graphs(adaptive_data, fixed_data, adaptive_stats, fixed_
     # Generate detailed analysis report
     generate_analysis_report(adaptive_stats, fixed_stats)
 
+def _as_table(data):
+    """Pasos en columnas a partir de un modelo, un grabador, una tabla, una ruta .traj o texto JSON"""
+    if isinstance(data, FrameColumns):
+        return data
+    if hasattr(data, 'frame_table'):    # ThreeTIntersectionModel
+        return data.frame_table()
+    if hasattr(data, 'table'):          # grabador
+        return data.table()
+    if isinstance(data, str) and not data.lstrip().startswith('[') and os.path.isdir(data):
+        return Trajectory(data)
+    # Texto JSON: una sola pasada para armar las columnas
+    return FrameTable.from_frames(json.loads(data))
+
 def parse_simulation_data(json_data):
-    """Parse simulation JSON data into DataFrame for analysis"""
-    data = json.loads(json_data)
-    
-    timesteps = []
-    total_cars = []
-    queue_data = {direction: [] for direction in ['main_E', 'main_W', 'north_center', 'south_left', 'south_right']}
-    
-    for timestep in data:
-        timesteps.append(timestep['timestep'])
-        total_cars.append(len(timestep['cars']))
-        
-        # Count cars by direction (approximate queue lengths)
-        for direction in queue_data.keys():
-            count = sum(1 for car in timestep['cars'] if car.get('origin') == direction)
-            queue_data[direction].append(count)
-    
-    df = pd.DataFrame({
-        'timestep': timesteps,
-        'total_cars': total_cars,
-        **queue_data
+    """Parse simulation data (model, recorder, frame table, binary trajectory or JSON) into DataFrame"""
+    import pandas as pd
+    table = _as_table(json_data)
+    # Conteos por paso y origen con un solo bincount sobre las columnas
+    counts = table.counts_by('origin')
+    return pd.DataFrame({
+        'timestep': np.asarray(table.timesteps),
+        'total_cars': table.cars_per_tick(),
+        **{direction: counts[:, k] for k, direction in enumerate(table.codes['origin'])}
     })
-    
-    return df
 
 def count_light_changes(json_data):
     """Count traffic light state changes over time"""
-    data = json.loads(json_data)
-    changes = []
-    prev_states = None
-    
-    for timestep in data:
-        current_states = timestep['traffic_lights']
-        if prev_states is not None:
-            change_count = sum(1 for light in current_states 
-                             if current_states[light] != prev_states.get(light, 'G'))
-            changes.append(change_count)
-        else:
-            changes.append(0)
-        prev_states = current_states
-    
-    return changes
+    lights = np.asarray(_as_table(json_data).lights)
+    if len(lights) == 0:
+        return []
+    return [0] + (lights[1:] != lights[:-1]).sum(axis=1).tolist()
 
 def generate_analysis_report(adaptive_stats, fixed_stats):
     """Generate a detailed analysis report comparing both heuristics"""
@@ -997,6 +945,27 @@ Queue lengths are {'reduced' if adaptive_stats.get('max_queues', 0) < fixed_stat
     print(report)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulación de tres intersecciones en T")
+    parser.add_argument('--headless', action='store_true',
+                        help='solo métricas: sin grabar pasos, sin gráficas ni JSON de movimiento')
+    parser.add_argument('--steps', type=int)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--policy', choices=['adaptive', 'fixed', 'max_pressure'])
+    parser.add_argument('--engine', choices=['agents', 'vector'])
+    parser.add_argument('--stats-out', default='three_t_intersection_stats.json')
+    args = parser.parse_args()
+    overrides = {k: v for k, v in (('steps', args.steps), ('seed', args.seed),
+                                   ('policy', args.policy), ('engine', args.engine)) if v is not None}
+    params.update(overrides)
+
+    if args.headless:
+        summary_stats = run_headless()
+        with open(args.stats_out, 'w') as f:
+            json.dump(summary_stats, f, indent=2)
+        print(json.dumps(summary_stats, indent=2))
+        raise SystemExit(0)
+
     # Run comparison analysis
     run_comparison_analysis()
     
@@ -1005,3 +974,5 @@ if __name__ == "__main__":
     
     # Uncomment the line below if you want to also send to Unity
     # run_simulation_and_send_to_unity()
+    # o, para que Unity empiece a reproducir desde el primer paso:
+    # run_simulation_and_stream_to_unity()
@@ -0,0 +1,127 @@
+import argparse
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats as _scipy_stats
+except ImportError:     # scipy es opcional: sin él se usa la normal para el intervalo
+    _scipy_stats = None
+
+# Métricas por corrida que se agregan con media e intervalo de confianza; además una columna
+# ``qmax_<origen>`` por cada origen de la red (las direcciones salen del resumen de la corrida)
+METRICS = ['throughput', 'average_delay', 'qmax']
+
+
+def expand_grid(grid):
+    """Lista de overrides de ``params``: producto cartesiano de un dict de listas, o la lista tal cual"""
+    if isinstance(grid, dict):
+        keys = list(grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    return [dict(g) for g in grid]
+
+
+def run_replication(job):
+    """Una corrida sin grabar pasos; devuelve solo el resumen (se ejecuta en el proceso hijo)"""
+    from traffic_sim_json import run_headless, params
+
+    config, overrides, seed, base = job
+    p = dict(params if base is None else base)
+    p.update(overrides)
+    p['seed'] = seed        # Generator del modelo: calendario de arribos reproducible
+    np.random.seed(seed)    # solo lo usa 'arrivals': 'legacy'
+    stats = run_headless(p)
+    row = {
+        'config': config,
+        'seed': seed,
+        'throughput': stats['total_cars_processed'],
+        'average_delay': stats['average_delay'],
+        'qmax': max(stats['max_queues'].values()),
+    }
+    row.update({f'qmax_{d}': q for d, q in stats['max_queues'].items()})
+    return row
+
+
+def confidence_interval(values, confidence=0.95):
+    """(media, semiancho) del intervalo t de Student para la media"""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(values.mean()) if n else math.nan
+    if n < 2:
+        return mean, math.nan
+    q = 0.5 + confidence / 2
+    if _scipy_stats is not None:
+        crit = float(_scipy_stats.t.ppf(q, n - 1))
+    else:
+        from statistics import NormalDist
+        crit = NormalDist().inv_cdf(q)
+    return mean, crit * float(values.std(ddof=1)) / math.sqrt(n)
+
+
+def run_sweep(grid, seeds=10, base=None, processes=None, first_seed=0, confidence=0.95):
+    """Correr cada configuración de ``grid`` con ``seeds`` semillas en un pool de procesos.
+
+    Todas las configuraciones usan las mismas semillas (números aleatorios comunes), así que
+    las diferencias entre configuraciones no dependen de la muestra. Devuelve
+    ``(resumen, corridas)``: un DataFrame por configuración con media, semiancho del intervalo
+    (``*_ci``) y desviación de cada métrica, y otro con una fila por corrida.
+    """
+    configs = expand_grid(grid)
+    seed_list = list(range(first_seed, first_seed + seeds)) if isinstance(seeds, int) else list(seeds)
+    jobs = [(i, overrides, seed, base) for i, overrides in enumerate(configs) for seed in seed_list]
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        rows = [run_replication(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(1, len(jobs) // (processes * 4))
+            rows = list(pool.map(run_replication, jobs, chunksize=chunksize))
+
+    runs = pd.DataFrame(rows)
+    metrics = METRICS + [c for c in runs.columns if c.startswith('qmax_')]
+    summary = []
+    for i, overrides in enumerate(configs):
+        group = runs[runs['config'] == i]
+        entry = dict(overrides, n=len(group))
+        for metric in metrics:
+            mean, half = confidence_interval(group[metric], confidence)
+            entry[metric] = mean
+            entry[f'{metric}_ci'] = half
+            entry[f'{metric}_std'] = float(group[metric].std(ddof=1)) if len(group) > 1 else math.nan
+        summary.append(entry)
+    return pd.DataFrame(summary), runs
+
+
+def compare_policies(seeds=20, processes=None, base=None):
+    """Adaptativa vs fija con varias semillas (versión replicada de run_comparison_analysis)"""
+    summary, runs = run_sweep({'policy': ['adaptive', 'fixed']}, seeds=seeds, base=base, processes=processes)
+    # Diferencia pareada por semilla: mismo tráfico con cada política
+    paired = runs.pivot(index='seed', columns='config', values=['throughput', 'average_delay'])
+    for metric in ('throughput', 'average_delay'):
+        diff = paired[metric][0] - paired[metric][1]
+        mean, half = confidence_interval(diff)
+        print(f"{metric}: adaptive - fixed = {mean:.2f} ± {half:.2f}")
+    return summary, runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de parámetros con réplicas en paralelo")
+    parser.add_argument('--grid', default='{"policy": ["adaptive", "fixed"]}',
+                        help='JSON: {"parámetro": [valores, ...]} o lista de overrides')
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    summary, runs = run_sweep(json.loads(args.grid), seeds=args.seeds, processes=args.processes)
+    pd.set_option('display.width', 160)
+    print(summary[[c for c in summary.columns if not c.endswith('_std')]].to_string(index=False))
+    summary.to_csv(args.out, index=False)
+    runs.to_csv(args.out.replace('.csv', '_runs.csv'), index=False)
+    print(f"Resultados guardados en {args.out}")